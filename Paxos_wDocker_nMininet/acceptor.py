@@ -16,7 +16,10 @@ import os
 import sys
 import time
 
+import heapq  # timers of the reactor
 import random # for random numbers
+import socket # for our default name
+import itertools  # to order timers due at the same time
 
 import argparse   # argument parser
 
@@ -24,6 +27,34 @@ import zmq                   # ZeroMQ library
 import json                  # json
 import pickle                # serialization
 
+from zmq.utils.monitor import recv_monitor_message  # to wait for our connections
+
+from paxos_wal import Paxos_WAL  # write-ahead log of our promises and accepts
+from paxos_workload import Paxos_Workload  # generated proposal numbers instead of user input
+from paxos_wire import Paxos_Wire  # JSON or binary messages
+from paxos_metrics import Paxos_Metrics, Paxos_Null_Metrics  # instrumentation
+
+
+# ----------------------------------------------------------------------------------------------------
+# The state of one single decree round of the acceptor
+#
+# In round reset mode the acceptor may have several of these open at the same time,
+# just like the proposer has several proposals
+#
+class Paxos_Round ():
+    """ The round class """
+
+    #################################################################
+    # constructor
+    #################################################################
+    def __init__ (self, round, prop_num):
+        self.round = round                  # round id carried in all its messages
+        self.prop_num = prop_num            # holds the proposal number we have
+        self.prop_val = None                # holds the value being proposed/accepted
+        self.id = None                      # ID we receive in the round
+        self.phase = "propose"              # message we wait for: propose, accept or done
+        self.arrived = None                 # phase whose message arrived and waits for its artificial delay
+
 
 # ----------------------------------------------------------------------------------------------------
 # The Paxos Acceptor
@@ -41,8 +72,39 @@ class Paxos_Acceptor ():
         self.delay = args.delay            # artificially inserted max delay
         self.timeout = args.timeout     # max allowed delay to receive any message from proposer
         self.iters = args.iters               # number of iterations
+        self.round_reset = args.round_reset   # keep the sockets between iterations
+        self.concurrency = args.concurrency   # max number of rounds open at the same time in round reset mode
+        self.rounds = {}                      # round id -> its state, for the open rounds in round reset mode
+        self.timers = []                      # heap of (due time, seq, func, args)
+        self.timer_seq = itertools.count ()   # breaks ties between timers due at the same time
+        self.round = 0                        # current iteration, carried in all messages
         self.prop_num = None              # holds the proposal number we have
         self.prop_val = None                 # holds the value being proposed/accepted
+        self.mode = args.mode               # single decree or multi paxos
+        self.name = args.name               # unique name we report to the proposer
+        if (self.name is None):
+            self.name = socket.gethostname () + ":" + str (os.getpid ())
+
+        # Multi Paxos state. Ballots are [round, proposer id] pairs
+        self.promised = [0, 0]              # highest ballot we promised
+        self.accepted = {}                  # slot -> (ballot, value) we accepted
+        self.low = 0                        # low-water mark: every slot below it is decided
+        self.pruned = 0                     # low-water mark when we last dropped the slots below it
+        self.prune_every = args.snapshot_every  # slots the mark moves between prunes without a log
+        self.workload = None                # where our proposal numbers come from if not from the user
+        if (args.generate):
+            self.workload = Paxos_Workload (0, 0, args.competitors, args.seed)
+        self.wal = None                     # write-ahead log, if we keep our state on disk
+        if (args.wal_dir is not None):
+            self.wal = Paxos_WAL (args.wal_dir, args.snapshot_every)
+        self.wire = Paxos_Wire (args.wire_format)  # how our messages go on the wire
+        self.lease = args.lease / 1000      # secs of the leases we grant, 0 for no leases
+        self.lease_ballot = None            # ballot of the leader holding our lease
+        self.lease_expiry = 0               # until when we promise nobody else
+        self.clock = time.time              # current time; the simulator substitutes its virtual clock
+        self.metrics = Paxos_Null_Metrics ()  # what we measure; nothing unless asked to
+        if (args.metrics is not None):
+            self.metrics = Paxos_Metrics (args.metrics, args.metrics_every, lambda: self.clock ())
 
         self.timed_out = False             # did not receive msg within the full timeout
         self.proposer_stale = False         # Proposer's proposal number is old
@@ -70,13 +132,15 @@ class Paxos_Acceptor ():
             self.poller = zmq.Poller ()
             
             # Socket to send and receive messages. Note, we use the ZMQ divide-conquer
-            # pattern using PUSH and PULL
+            # pattern using PUSH and PULL for what we send to the proposer. The proposer
+            # sends to us over its ROUTER sockets, addressing us by the name we give our
+            # DEALER sockets as routing id.
             #
             #           This is our protocol
             # base port + 0 to push "I am up" message to proposer
-            # base port + 1 to pull propose message from proposer
+            # base port + 1 to receive propose message from proposer (DEALER)
             # base port + 2 to push promise result to proposer
-            # base port + 3 to pull accept message from proposer
+            # base port + 3 to receive accept message from proposer (DEALER)
             # base port + 4 to push learn message to proposer
 
             # first, the barrier message to proposer (PUSH)
@@ -89,10 +153,12 @@ class Paxos_Acceptor ():
             print("For acceptor->proposer up PUSH, bind addr is: ", bind_addr)
             self.sender4barrier.connect (bind_addr)
 
-            # next, the propose message (PULL)
-            self.rcv4propose = context.socket (zmq.PULL)
+            # next, the propose message (DEALER)
+            self.rcv4propose = context.socket (zmq.DEALER)
             # set high water mark to ensure messages gets received.
             self.rcv4propose.setsockopt (zmq.RCVHWM, 0)
+            self.rcv4propose.setsockopt (zmq.ROUTING_ID, self.name.encode ())
+            propose_monitor = self.rcv4propose.get_monitor_socket (zmq.EVENT_HANDSHAKE_SUCCEEDED)
             bind_addr = "tcp://" + self.ipaddr + ":" + str (self.baseport+1)
             print("For proposer->acceptor propose message, bind addr is: ", bind_addr)
             self.rcv4propose.connect  (bind_addr)
@@ -107,10 +173,12 @@ class Paxos_Acceptor ():
             print("For acceptor->proposer promise PUSH, bind addr is: ", bind_addr)
             self.sender4promise.connect (bind_addr)
 
-            # next, the accept message (PULL)
-            self.rcv4accept = context.socket (zmq.PULL)
+            # next, the accept message (DEALER)
+            self.rcv4accept = context.socket (zmq.DEALER)
             # set high water mark to ensure messages gets received.
             self.rcv4accept.setsockopt (zmq.RCVHWM, 0)
+            self.rcv4accept.setsockopt (zmq.ROUTING_ID, self.name.encode ())
+            accept_monitor = self.rcv4accept.get_monitor_socket (zmq.EVENT_HANDSHAKE_SUCCEEDED)
             bind_addr = "tcp://" + self.ipaddr + ":" + str (self.baseport+3)
             print("For proposer->acceptor accept message, bind addr is: ", bind_addr)
             self.rcv4accept.connect  (bind_addr)
@@ -125,10 +193,28 @@ class Paxos_Acceptor ():
             print("For acceptor->proposer promise PUSH, bind addr is: ", bind_addr)
             self.sender4learn.connect (bind_addr)
 
+            # the proposer can only address us once it knows our DEALER sockets,
+            # so we do not say we are up before that
+            self.wait_for_handshake (self.rcv4propose, propose_monitor)
+            self.wait_for_handshake (self.rcv4accept, accept_monitor)
+
         except:
             print("Unexpected error in init_server:", sys.exc_info()[0])
             raise
 
+    # -----------------------------------------------------------------------
+    # Wait until the socket has completed its handshake with the proposer
+    def wait_for_handshake (self, sock, monitor):
+        """Wait for the connection of a DEALER socket"""
+
+        # the monitor was attached before the connect, so we cannot miss the event
+        if (monitor.poll (self.timeout*1000)):  # timeout is in seconds so we convert to msec
+            recv_monitor_message (monitor)
+        else:
+            print ("Acceptor::wait_for_handshake: proposer not reachable yet, continuing anyway")
+        sock.disable_monitor ()
+        monitor.close (linger=0)
+
     # -----------------------------------------------------------------------
     # reset data structures for the next iteration
     def reset_acceptor (self):
@@ -154,6 +240,18 @@ class Paxos_Acceptor ():
         self.rcv4accept.close (linger=0)
         self.sender4learn.close (linger=0)
 
+        self.reset_round ()
+
+    # -----------------------------------------------------------------------
+    # reset only the per round data structures for the next iteration
+    #
+    # The ZMQ context, sockets and poller stay as they are, and we move on to
+    # the next round id so that requests of this round arriving late get discarded
+    def reset_round (self):
+        """reset per round state"""
+        print ("Acceptor::reset_round")
+
+        self.round += 1
         self.prop_num = None
         self.prop_val = None
 
@@ -163,20 +261,26 @@ class Paxos_Acceptor ():
         self.msgs['propose'] = []
         self.msgs['accept'] = []
 
+        # and whatever the reactor left over
+        self.rounds = {}
+        self.timers = []
+
         
     ###################################################################
     # This method sends acceptor up message to proposer
     ###################################################################
-    def send_acceptor_up_msg (self):
+    def send_acceptor_up_msg (self, round=None):
         "create the json object for acceptor up message to be sent to proposer"
 
         try:
             print ("Acceptor::send_acceptor_up_msg")
             up_msg = {
-                'status': 'up'
+                'round': self.round if round is None else round,
+                'status': 'up',
+                'name': self.name
             }
             # now send this to our proposer
-            self.sender4barrier.send_json (up_msg)
+            self.sender4barrier.send (self.wire.encode (up_msg))
             
         except:
             print("Unexpected error in send_acceptor_up_msg:", sys.exc_info()[0])
@@ -191,7 +295,9 @@ class Paxos_Acceptor ():
         try:
             print ("Acceptor::send_promise_msg")
             promise_msg = {
+                'round': self.round,
                 'id': self.id,
+                'name': self.name,
                 'prop_num': self.prop_num
             }
 
@@ -201,7 +307,7 @@ class Paxos_Acceptor ():
             time.sleep (delay)  # in secs
             
             # now send this to our proposer
-            self.sender4promise.send_json (promise_msg)
+            self.sender4promise.send (self.wire.encode (promise_msg))
             
         except:
             print("Unexpected error in send_promise_msg:", sys.exc_info()[0])
@@ -216,7 +322,9 @@ class Paxos_Acceptor ():
         try:
             print ("Acceptor::send_learn_msg")
             learn_msg = {
+                'round': self.round,
                 'id': self.id,
+                'name': self.name,
                 'prop_num': self.prop_num,
                 'prop_val': self.prop_val
             }
@@ -227,7 +335,7 @@ class Paxos_Acceptor ():
             time.sleep (delay)  # in secs
             
             # now send this to our proposer
-            self.sender4learn.send_json (learn_msg)
+            self.sender4learn.send (self.wire.encode (learn_msg))
             
         except:
             print("Unexpected error in send_learn_msg:", sys.exc_info()[0])
@@ -262,10 +370,16 @@ class Paxos_Acceptor ():
             if (self.rcv4propose not in events):
                 # break the loop
                 print ("Acceptor::rcv_and_process_propose_msg: timer expired, returning")
+                self.metrics.count ("timeouts")
                 self.timed_out = True
                 break
         
-            msg = self.rcv4propose.recv_json ()
+            msg = self.wire.decode (self.rcv4propose.recv ())
+            if (msg['round'] < self.round):
+                print ("Acceptor::rcv_and_process_propose_msg: discarding propose msg from round {} in round {}".format (msg['round'], self.round))
+                self.metrics.count ("stale")
+                continue
+
             self.id = msg['id']
             if (self.prop_num >= msg['num']):
                 print ("====Acceptor: our prop num ({}) is equal or greater than that of proposer ({})====".format (self.prop_num, msg['num']))
@@ -307,10 +421,16 @@ class Paxos_Acceptor ():
             if (self.rcv4accept not in events):
                 # break the loop
                 print ("Acceptor::rcv_and_process_accept_msg: timer expired, returning")
+                self.metrics.count ("timeouts")
                 self.timed_out = True
                 break
         
-            msg = self.rcv4accept.recv_json ()
+            msg = self.wire.decode (self.rcv4accept.recv ())
+            if (msg['round'] < self.round):
+                print ("Acceptor::rcv_and_process_accept_msg: discarding accept msg from round {} in round {}".format (msg['round'], self.round))
+                self.metrics.count ("stale")
+                continue
+
             self.prop_num = msg['num']
             self.prop_val = msg['val']
 
@@ -331,8 +451,12 @@ class Paxos_Acceptor ():
         """ Start the Paxos single decree consensus """
 
         try:
-            # ask the user to decide on a proposer number
-            self.prop_num = input ("Select some proposal number between 1 and 10: ")
+            if (self.workload is not None):
+                # the highest number we already saw from the competing proposers
+                self.prop_num = self.workload.acceptor_prop_num (self.round, self.name)
+            else:
+                # ask the user to decide on a proposer number
+                self.prop_num = self.ask_prop_num ()
             
             # inform our proposer that we are up
             self.send_acceptor_up_msg ()
@@ -373,6 +497,419 @@ class Paxos_Acceptor ():
             print("Unexpected error in single_decree_consensus method:", sys.exc_info()[0])
             raise
 
+    ###################################################################
+    # Reactor: run func (*args) after delay secs
+    ###################################################################
+    def call_later (self, delay, func, *args):
+        """ schedule a timer """
+
+        heapq.heappush (self.timers, (self.clock () + delay, next (self.timer_seq), func, args))
+
+    ###################################################################
+    # Ask the user for a proposal number until we get one in range
+    #
+    # Anything else would be refused by the binary wire format later on
+    ###################################################################
+    def ask_prop_num (self):
+        """ read a proposal number from the user """
+
+        while True:
+            try:
+                prop_num = int (input ("Select some proposal number between 1 and 10: "))
+                if (1 <= prop_num <= 10):
+                    return prop_num
+            except ValueError:
+                pass
+            print ("Please enter a whole number between 1 and 10")
+
+    ###################################################################
+    # Reactor: open the next round and tell the proposer we are up for it
+    ###################################################################
+    def open_round (self):
+        """ start the next round """
+
+        try:
+            if (self.workload is not None):
+                # the highest number we already saw from the competing proposers
+                prop_num = self.workload.acceptor_prop_num (self.round, self.name)
+            else:
+                # ask the user to decide on a proposer number
+                prop_num = self.ask_prop_num ()
+
+            rnd = Paxos_Round (self.round, prop_num)
+            self.round += 1
+            self.rounds[rnd.round] = rnd
+            print ("Acceptor::open_round - round {}".format (rnd.round))
+
+            self.send_acceptor_up_msg (rnd.round)
+            self.call_later (self.timeout, self.round_expired, rnd, "propose")
+
+        except:
+            print("Unexpected error in open_round:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Reactor: a message was received; the artificial delay to read it
+    # becomes a timer before we look at it
+    ###################################################################
+    def receive (self, op, msg):
+        """ hand the message to dispatch after the artificial delay """
+
+        # it arrived in time, so the deadline of the phase no longer applies
+        rnd = self.rounds.get (msg['round'])
+        if (rnd is not None and rnd.phase == op):
+            rnd.arrived = op
+
+        delay = random.randint (0, self.delay)
+        print ("Inserting an artificial delay of {} sec before receiving {} msg".format (delay, op))
+        self.call_later (delay, self.dispatch, op, msg)
+
+    ###################################################################
+    # Reactor: handle a propose or accept message in its round
+    ###################################################################
+    def dispatch (self, op, msg):
+        """ process the message for its round """
+
+        try:
+            rnd = self.rounds.get (msg['round'])
+            if (rnd is None or rnd.phase != op):
+                print ("Acceptor::dispatch: discarding {} msg of round {}".format (op, msg['round']))
+                self.metrics.count ("stale")
+                return
+
+            if (op == "propose"):
+                rnd.id = msg['id']
+                stale = rnd.prop_num >= msg['num']
+                if (stale):
+                    print ("====Acceptor: our prop num ({}) is equal or greater than that of proposer ({})====".format (rnd.prop_num, msg['num']))
+                else:
+                    print ("====Acceptor: our prop num ({}) is less than that of proposer ({})====".format (rnd.prop_num, msg['num']))
+
+                # send the promise even if our number is higher than that of the proposer
+                promise_msg = {
+                    'round': rnd.round,
+                    'id': rnd.id,
+                    'name': self.name,
+                    'prop_num': rnd.prop_num
+                }
+                delay = random.randint (0, self.delay)
+                print ("Inserting an artificial delay of {} secs before sending promise msg".format (delay))
+                self.call_later (delay, self.sender4promise.send, self.wire.encode (promise_msg))
+
+                if (stale):
+                    # the proposer is not going to send us an accept
+                    print ("Proposer with proposal number: {} is stale".format (rnd.prop_num))
+                    self.finish_round (rnd)
+                else:
+                    rnd.phase = "accept"
+                    self.call_later (delay + self.timeout, self.round_expired, rnd, "accept")
+                return
+
+            rnd.prop_num = msg['num']
+            rnd.prop_val = msg['val']
+            print ("===== Acceptor::dispatch: round {}, prop num = {}, prop_val = {} ====".format (rnd.round, rnd.prop_num, rnd.prop_val))
+
+            learn_msg = {
+                'round': rnd.round,
+                'id': rnd.id,
+                'name': self.name,
+                'prop_num': rnd.prop_num,
+                'prop_val': rnd.prop_val
+            }
+            delay = random.randint (0, self.delay)
+            print ("Inserting an artificial delay of {} secs before sending learn msg".format (delay))
+            self.call_later (delay, self.sender4learn.send, self.wire.encode (learn_msg))
+            self.finish_round (rnd)
+
+        except:
+            print("Unexpected error in dispatch:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Reactor: nothing arrived for the round within the timeout
+    ###################################################################
+    def round_expired (self, rnd, phase):
+        """ give up on the round """
+
+        if (rnd.phase == phase and rnd.arrived != phase):
+            print ("Acceptor::round_expired: giving up waiting for {} msg of round {}".format (phase, rnd.round))
+            self.metrics.count ("timeouts")
+            self.finish_round (rnd)
+
+    ###################################################################
+    # Reactor: the round is over, one way or the other
+    ###################################################################
+    def finish_round (self, rnd):
+        """ retire the round """
+
+        rnd.phase = "done"
+        del self.rounds[rnd.round]
+        self.finished += 1
+
+    ###################################################################
+    # Reactor: run the given number of single decree rounds
+    #
+    # One poller watches both receiving sockets. Up to concurrency rounds
+    # are open at the same time and every message finds its round by the
+    # round id it carries. The artificial delays and the timeouts are
+    # timers, so nothing ever sleeps and the other rounds keep going.
+    ###################################################################
+    def run_reactor (self, num_rounds):
+        """ event loop for the single decree rounds """
+
+        try:
+            receivers = {self.rcv4propose: "propose", self.rcv4accept: "accept"}
+            for receiver in receivers:
+                self.poller.register (receiver, zmq.POLLIN)
+
+            started = 0
+            self.finished = 0
+            while (self.finished < num_rounds):
+                while (started < num_rounds and len (self.rounds) < self.concurrency):
+                    self.open_round ()
+                    started += 1
+
+                # sleep in the poller until a message arrives or the next timer is due
+                timeout = None
+                if (self.timers):
+                    timeout = max (0, (self.timers[0][0] - self.clock ()) * 1000)  # msec
+                events = dict (self.poller.poll (timeout))
+
+                for receiver, op in receivers.items ():
+                    if (receiver in events):
+                        self.drain (receiver, lambda msg, op=op: self.receive (op, msg), None, [])
+
+                while (self.timers and self.timers[0][0] <= self.clock ()):
+                    _, _, func, args = heapq.heappop (self.timers)
+                    func (*args)
+
+                self.metrics.tick ()
+
+            # the last promises and learns may still be waiting for their delay; the
+            # deadlines of the rounds are of no interest anymore since all are finished
+            while (self.timers):
+                due, _, func, args = heapq.heappop (self.timers)
+                if (func != self.round_expired):
+                    time.sleep (max (0, due - self.clock ()))
+                    func (*args)
+
+            for receiver in receivers:
+                self.poller.unregister (receiver)
+
+        except:
+            print("Unexpected error in run_reactor:", sys.exc_info()[0])
+            raise
+
+    ###########################################################
+    # Multi Paxos: handle a prepare for all slots from the given one onwards
+    #
+    # We promise the ballot unless we already promised a higher one, and
+    # report everything we accepted in those slots so that the new leader
+    # can propose it again. Returns the reply for the proposer, which must
+    # not leave before the log is committed, or None if we ignore it since
+    # another proposer holds our lease.
+    ###########################################################
+    def handle_prepare (self, msg):
+        """ process a prepare message """
+
+        self.metrics.count ("prepares")
+        if (self.clock () < self.lease_expiry and (self.lease_ballot is None or msg['ballot'][1] != self.lease_ballot[1])):
+            # the leader relies on us not to elect anybody else yet; the prepare
+            # is retried once it times out
+            print ("Acceptor::handle_prepare: ignoring ballot {} while our lease is held by ballot {}".format (msg['ballot'], self.lease_ballot))
+            self.metrics.count ("ignored")
+            return None
+
+        if (msg['ballot'] < self.promised):
+            self.metrics.count ("rejections")
+            return {'name': self.name, 'ballot': msg['ballot'], 'ok': False, 'promised': self.promised}
+
+        if (self.wal is not None and msg['ballot'] > self.promised):
+            self.wal.append_promise (msg['ballot'])
+        self.promised = msg['ballot']
+        self.grant_lease (msg['ballot'])
+        accepted = [[slot, ballot, val] for slot, (ballot, val) in self.accepted.items () if slot >= msg['slot']]
+        # the mark up to which we dropped slots tells the new leader not to take them
+        # for empty ones; the slots above it we still report
+        return {'name': self.name, 'ballot': msg['ballot'], 'ok': True, 'accepted': accepted, 'low': self.pruned}
+
+    ###########################################################
+    # Multi Paxos: handle an accept for one slot
+    #
+    # Returns the reply for the proposer, which must not leave before the
+    # log is committed.
+    ###########################################################
+    def handle_accept (self, msg):
+        """ process an accept message """
+
+        # whoever sent it knew the slots below the mark are decided, even if its ballot is old
+        self.low = max (self.low, msg['low'])
+
+        if ('beat' in msg):
+            return self.handle_heartbeat (msg)
+
+        self.metrics.count ("accepts")
+        if (msg['ballot'] < self.promised):
+            self.metrics.count ("rejections")
+            return {'name': self.name, 'ballot': msg['ballot'], 'slot': msg['slot'], 'ok': False, 'promised': self.promised}
+
+        if (self.wal is not None):
+            self.wal.append_accept (msg['slot'], msg['ballot'], msg['val'])
+        self.promised = msg['ballot']
+        self.accepted[msg['slot']] = (msg['ballot'], msg['val'])
+        self.grant_lease (msg['ballot'])
+        return {'name': self.name, 'ballot': msg['ballot'], 'slot': msg['slot'], 'ok': True}
+
+    ###########################################################
+    # Multi Paxos: handle a heartbeat of the leader
+    #
+    # It only renews the lease, so there is nothing to log.
+    ###########################################################
+    def handle_heartbeat (self, msg):
+        """ process a heartbeat message """
+
+        self.metrics.count ("heartbeats")
+        if (msg['ballot'] < self.promised):
+            self.metrics.count ("rejections")
+            return {'name': self.name, 'ballot': msg['ballot'], 'beat': msg['beat'], 'ok': False, 'promised': self.promised}
+
+        self.grant_lease (msg['ballot'])
+        return {'name': self.name, 'ballot': msg['ballot'], 'beat': msg['beat'], 'ok': True}
+
+    ###########################################################
+    # Multi Paxos: grant (or renew) the lease of a leader
+    #
+    # Until the lease runs out we promise no other proposer. The leader
+    # counts its lease from when it sent the request, before we got it, so
+    # it always runs out there first.
+    ###########################################################
+    def grant_lease (self, ballot):
+        """ lease for the leader of the ballot """
+
+        if (self.lease):
+            self.lease_ballot = ballot
+            self.lease_expiry = self.clock () + self.lease
+
+    ###########################################################
+    # Multi Paxos: handle everything that is queued on a socket
+    #
+    # The replies are collected rather than sent right away so that a
+    # single commit of the log covers all of them.
+    ###########################################################
+    def drain (self, receiver, handler, sender, replies):
+        """ hand every queued message to the handler and keep its reply """
+
+        while True:
+            try:
+                msg = self.wire.decode (receiver.recv (zmq.NOBLOCK))
+            except zmq.Again:
+                return
+            reply = handler (msg)
+            if (reply is not None):
+                replies.append ((sender, reply))
+
+    ###########################################################
+    # Multi Paxos: make our state durable and then send the replies
+    ###########################################################
+    def send_replies (self, replies):
+        """ group commit the log and reply """
+
+        if (self.wal is not None):
+            # one fsync for every promise and accept of this batch
+            start_time = self.clock ()
+            self.wal.commit ()
+            self.metrics.phase ("commit", start_time)
+            if (self.wal.need_snapshot ()):
+                self.prune ()
+                self.wal.snapshot (self.promised, self.accepted, self.pruned)
+        elif (self.low - self.pruned >= 2 * self.prune_every):
+            self.prune ()
+
+        for sender, reply in replies:
+            sender.send (self.wire.encode (reply))
+
+    ###########################################################
+    # Multi Paxos: drop the slots well below the low-water mark
+    #
+    # They are decided, so neither our memory nor the snapshot has to hold
+    # them anymore. We keep the last prune_every decided ones though: a
+    # proposer that was leader until recently reports those to recognize
+    # which of its values made it into the log when it is elected again.
+    ###########################################################
+    def prune (self):
+        """ forget the decided slots """
+
+        self.pruned = max (self.pruned, self.low - self.prune_every)
+        self.accepted = {slot: entry for slot, entry in self.accepted.items () if slot >= self.pruned}
+
+    ###########################################################
+    # Multi Paxos: recover our state from the write-ahead log
+    ###########################################################
+    def recover (self):
+        """ load the snapshot and replay the log """
+
+        start_time = time.time ()
+        self.promised, self.accepted, self.pruned = self.wal.recover ()
+        self.low = self.pruned
+        print ("Acceptor::recover: promised ballot {}, {} slots accepted from slot {} on, recovered in {:.1f} msec".format (self.promised, len (self.accepted), self.pruned, (time.time () - start_time) * 1000))
+
+        if (self.lease and self.promised != [0, 0]):
+            # we do not know whose lease we granted before the crash, so we promise
+            # nobody until any such lease has run out
+            self.lease_ballot = None
+            self.lease_expiry = self.clock () + self.lease
+
+    ############################################################
+    # Run Multi Paxos over one set of long-lived sockets
+    #
+    # We serve prepares and accepts for any slot until the proposer has
+    # been quiet for the whole timeout. While idle we repeat our up message
+    # every second so that a proposer starting later (e.g., a new leader
+    # after the old one died) also learns about us.
+    ############################################################
+    def run_multi_paxos (self):
+        """Run the Multi Paxos consensus"""
+
+        try:
+            if (self.wal is not None):
+                print("Acceptor::run_multi_paxos - recover from the write-ahead log")
+                self.recover ()
+
+            print("Acceptor::run_multi_paxos - initialize acceptor")
+            self.init_acceptor ()
+            self.poller.register (self.rcv4propose, zmq.POLLIN)
+            self.poller.register (self.rcv4accept, zmq.POLLIN)
+
+            self.send_acceptor_up_msg ()
+
+            last_request = time.time ()
+            while True:
+                events = dict (self.poller.poll (1000))  # msec
+                self.metrics.tick ()
+                if (not events):
+                    if (time.time () - last_request > self.timeout):
+                        print ("Acceptor::run_multi_paxos: no request within the timeout, {} slots accepted".format (len (self.accepted)))
+                        break
+                    self.send_acceptor_up_msg ()
+                    continue
+
+                last_request = time.time ()
+
+                replies = []
+                if (self.rcv4propose in events):
+                    self.drain (self.rcv4propose, self.handle_prepare, self.sender4promise, replies)
+                if (self.rcv4accept in events):
+                    self.drain (self.rcv4accept, self.handle_accept, self.sender4learn, replies)
+                self.send_replies (replies)
+
+            print("Acceptor::run_multi_paxos - cleanup")
+            if (self.wal is not None):
+                self.wal.close ()
+            self.reset_acceptor ()
+        except:
+            print("Unexpected error in run_multi_paxos method:", sys.exc_info()[0])
+            raise
+
     ############################################################
     # Run the iterations of the Paxos consensus algorithm for the Acceptor role
     ############################################################
@@ -382,6 +919,19 @@ class Paxos_Acceptor ():
         try:
             ############  the real work starts now ###########
 
+            # in round reset mode the sockets are created once and outlive all the iterations,
+            # and the reactor runs all of them, up to concurrency at a time
+            if (self.round_reset):
+                print("Acceptor::run_paxos_iterations - initialize acceptor once")
+                self.init_acceptor ()
+
+                print("Acceptor::run_paxos_iterations - run all single decree rounds")
+                self.run_reactor (self.iters)
+
+                print("Acceptor::run_paxos_iterations - cleanup")
+                self.reset_acceptor ()
+                return
+
             for i in range (self.iters):
                 print ("****** Next iteration of Acceptor ************")
             
@@ -404,8 +954,8 @@ class Paxos_Acceptor ():
 ##################################
 # Command line parsing
 ##################################
-def parseCmdLineArgs ():
-    # parse the command line
+def parseCmdLineArgs (argv=None):
+    # parse the command line (or the given list of arguments, as the simulator does)
     parser = argparse.ArgumentParser ()
 
     # add optional arguments
@@ -414,9 +964,22 @@ def parseCmdLineArgs ():
     parser.add_argument ("-d", "--delay", type=int, default=5, help="Artificially inserted delay to mimic n/w conditions, default max 5 secs")
     parser.add_argument ("-t", "--timeout", type=int, default=20, help="Max time to wait for req from proposer, default 20 secs")
     parser.add_argument ("-i", "--iters", type=int, default=5, help="Number of iterations, default 5")
+    parser.add_argument ("-r", "--round_reset", action="store_true", help="Keep the sockets between single decree iterations and only reset the per round state")
+    parser.add_argument ("-c", "--concurrency", type=int, default=1, help="Max number of single decree rounds open at the same time in round reset mode, should match the proposer, default 1")
+    parser.add_argument ("-m", "--mode", choices=["single", "multi"], default="single", help="Single decree Paxos per iteration or Multi Paxos with a stable leader, default single")
+    parser.add_argument ("-n", "--name", default=None, help="Unique name of this acceptor, default hostname:pid")
+    parser.add_argument ("-g", "--generate", action="store_true", help="Take our proposal numbers from the workload below instead of asking the user")
+    parser.add_argument ("--competitors", type=int, default=0, help="Workload: number of competing proposers, must match the proposer, default 0")
+    parser.add_argument ("--seed", type=int, default=1, help="Workload: seed of the random numbers, must match the proposer, default 1")
+    parser.add_argument ("-w", "--wal_dir", default=None, help="Directory of the write-ahead log in multi mode, default none (state only in memory)")
+    parser.add_argument ("-s", "--snapshot_every", type=int, default=10000, help="Number of log records between snapshots, and without -w the number of decided slots between dropping them from memory, default 10000")
+    parser.add_argument ("-f", "--wire_format", choices=["json", "binary"], default="json", help="Encoding of the messages, must match the proposer, default json")
+    parser.add_argument ("-e", "--lease", type=float, default=0, help="Msec of the leader leases we grant in multi mode, must match the proposer, default 0 (no leases)")
+    parser.add_argument ("-x", "--metrics", default=None, help="File the counters and commit times are appended to, as CSV if it ends in .csv and JSON lines otherwise, default none")
+    parser.add_argument ("--metrics_every", type=float, default=1, help="Secs between snapshots of the metrics, default 1")
     
     # parse the args
-    args = parser.parse_args ()
+    args = parser.parse_args (argv)
 
     return args
     
@@ -438,8 +1001,15 @@ def main ():
     acceptor = Paxos_Acceptor (parsed_args)
 
     # start the iterations
-    print ("Paxos Acceptor Main: run the Paxos iterations")
-    acceptor.run_paxos_iterations ()
+    if (parsed_args.mode == "multi"):
+        print ("Paxos Acceptor Main: run multi paxos")
+        acceptor.run_multi_paxos ()
+    else:
+        print ("Paxos Acceptor Main: run the Paxos iterations")
+        acceptor.run_paxos_iterations ()
+
+    # the final snapshot of the metrics
+    acceptor.metrics.close ()
 
 #----------------------------------------------
 if __name__ == '__main__':
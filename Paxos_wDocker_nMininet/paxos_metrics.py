@@ -0,0 +1,203 @@
+#!/usr/bin/python
+#
+# Purpose: Latency and throughput instrumentation of the Paxos proposer and acceptors
+#
+# Vanderbilt University Computer Science
+# Author: Aniruddha Gokhale
+# Course: CS6381 Distributed Systems Principles
+# Created: Spring 2021
+#
+# We keep three kinds of measurements:
+#
+#   counters    e.g., proposals, decisions, defeats, timeouts and stale messages
+#   phases      histogram of the duration of every phase, from sending its messages
+#               until it completed (or, on the acceptor, of every group commit)
+#   responses   histogram per acceptor of the time it took to answer our messages
+#
+# The histograms have buckets of up to 2^-4 (62.5 usec) through 2^16 msec and one
+# unbounded bucket, and they also keep the count and the sum of their samples.
+#
+# Every so many secs (of whatever clock the owner uses, so virtual secs in the
+# simulator) the cumulative measurements are appended to a file: one JSON object per
+# line, or, if the file name ends in .csv, one row per counter and histogram bucket.
+#
+# When nothing is to be measured the owner holds a Paxos_Null_Metrics instead, whose
+# methods do nothing at all, so the instrumentation costs a method call.
+
+# system
+import os
+import sys
+
+import csv                   # for CSV snapshots
+import json                  # for JSON snapshots
+import bisect                # to find the bucket of a sample
+
+
+# ----------------------------------------------------------------------------------------------------
+# A histogram of durations
+#
+class Paxos_Histogram ():
+    """ The histogram class """
+
+    # upper bounds in msec of the buckets (the last one is unbounded)
+    buckets = [2 ** i for i in range (-4, 17)] + [float ("inf")]
+
+    def __init__ (self):
+        self.counts = [0] * len (Paxos_Histogram.buckets)   # samples per bucket
+        self.count = 0                                      # number of samples
+        self.sum = 0                                        # sum of the samples in msec
+
+    ###################################################################
+    # Add a sample in secs
+    ###################################################################
+    def add (self, secs):
+        """ count the sample in its bucket """
+
+        msec = secs * 1000
+        self.counts[bisect.bisect_left (Paxos_Histogram.buckets, msec)] += 1
+        self.count += 1
+        self.sum += msec
+
+    ###################################################################
+    # The histogram as a dictionary
+    ###################################################################
+    def snapshot (self):
+        """ for the JSON snapshot """
+
+        return {'count': self.count, 'sum_msec': round (self.sum, 3),
+                'buckets': {str (bound): count for bound, count in zip (Paxos_Histogram.buckets, self.counts) if count}}
+
+
+# ----------------------------------------------------------------------------------------------------
+# The Paxos metrics
+#
+class Paxos_Metrics ():
+    """ The metrics class """
+
+    # columns of our CSV file
+    fields = ["time", "metric", "name", "le_msec", "count", "sum_msec"]
+
+    #################################################################
+    # constructor
+    #################################################################
+    def __init__ (self, filename, every, clock):
+        self.filename = filename            # where the snapshots go
+        self.every = every                  # secs between snapshots
+        self.clock = clock                  # current time of our owner
+        self.counters = {}                  # name -> count
+        self.phases = {}                    # phase name -> histogram
+        self.responses = {}                 # acceptor name -> histogram
+        self.next_export = None             # when the next snapshot is due
+
+    ###################################################################
+    # Add n to a counter
+    ###################################################################
+    def count (self, name, n=1):
+        """ count an event """
+
+        self.counters[name] = self.counters.get (name, 0) + n
+
+    ###################################################################
+    # A phase that started at start is complete
+    ###################################################################
+    def phase (self, name, start):
+        """ record the duration of a phase """
+
+        if (name not in self.phases):
+            self.phases[name] = Paxos_Histogram ()
+        self.phases[name].add (self.clock () - start)
+
+    ###################################################################
+    # The acceptor answered a message we sent at start
+    ###################################################################
+    def response (self, acceptor, start):
+        """ record the response time of an acceptor """
+
+        if (acceptor not in self.responses):
+            self.responses[acceptor] = Paxos_Histogram ()
+        self.responses[acceptor].add (self.clock () - start)
+
+    ###################################################################
+    # Export a snapshot if one is due
+    ###################################################################
+    def tick (self):
+        """ called from the event loop of the owner """
+
+        now = self.clock ()
+        if (self.next_export is None):
+            self.next_export = now + self.every
+        elif (now >= self.next_export):
+            self.export ()
+            self.next_export = now + self.every
+
+    ###################################################################
+    # Everything we measured so far
+    ###################################################################
+    def snapshot (self):
+        """ the measurements as a dictionary """
+
+        return {'time': self.clock (),
+                'counters': dict (self.counters),
+                'phases': {name: hist.snapshot () for name, hist in self.phases.items ()},
+                'responses': {name: hist.snapshot () for name, hist in self.responses.items ()}}
+
+    ###################################################################
+    # Append a snapshot to our file
+    ###################################################################
+    def export (self):
+        """ write the snapshot """
+
+        try:
+            if (not self.filename.endswith (".csv")):
+                with open (self.filename, "a") as f:
+                    f.write (json.dumps (self.snapshot ()) + "\n")
+                return
+
+            now = self.clock ()
+            new_file = not os.path.exists (self.filename)
+            with open (self.filename, "a", newline="") as f:
+                writer = csv.DictWriter (f, fieldnames=Paxos_Metrics.fields)
+                if (new_file):
+                    writer.writeheader ()
+                for name, count in self.counters.items ():
+                    writer.writerow ({"time": now, "metric": "counter", "name": name, "count": count})
+                for metric, hists in (("phase", self.phases), ("response", self.responses)):
+                    for name, hist in hists.items ():
+                        for bound, count in zip (Paxos_Histogram.buckets, hist.counts):
+                            if (count):
+                                writer.writerow ({"time": now, "metric": metric, "name": name, "le_msec": bound,
+                                                  "count": count, "sum_msec": round (hist.sum, 3)})
+
+        except:
+            print("Unexpected error in Paxos_Metrics::export:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Final snapshot
+    ###################################################################
+    def close (self):
+        """ export what we have at the end """
+
+        self.export ()
+
+
+# ----------------------------------------------------------------------------------------------------
+# No metrics at all
+#
+class Paxos_Null_Metrics ():
+    """ The class measuring nothing """
+
+    def count (self, name, n=1):
+        pass
+
+    def phase (self, name, start):
+        pass
+
+    def response (self, acceptor, start):
+        pass
+
+    def tick (self):
+        pass
+
+    def close (self):
+        pass
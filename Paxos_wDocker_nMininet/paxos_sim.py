@@ -0,0 +1,387 @@
+#!/usr/bin/python
+#
+# Purpose: Deterministic in-process simulator of Multi Paxos
+#
+# Vanderbilt University Computer Science
+# Author: Aniruddha Gokhale
+# Course: CS6381 Distributed Systems Principles
+# Created: Spring 2021
+#
+# Runs the Multi Paxos logic of Paxos_Proposer and Paxos_Acceptor in one process, with
+# an in-memory network instead of ZeroMQ and a virtual clock instead of the real one,
+# so that thousands of slots are decided per second of real time no matter how slow
+# the simulated network is.
+#
+# The proposers and acceptors are the real classes, created from their own command
+# lines. We only swap their sockets for ours and their clock for our virtual one:
+#
+#   - a message one of them sends gets a delay drawn from the delay distribution (or is
+#     lost, or cut off by a partition) and is delivered when the virtual clock gets
+#     there, by calling handle_prepare/handle_accept on the acceptor or
+#     handle_promise/handle_accepted on the proposer
+#   - every 10 msec of virtual time each proposer does what its event loop does between
+#     polls: batching, timeouts, the window of accepts, heartbeats and reads
+#
+# All the randomness comes from one generator seeded with --seed, and events due at
+# the same time run in the order they were scheduled, so a run is repeated exactly
+# by using the same arguments.
+#
+# At the end we check safety: no two proposers decided different values in the same
+# slot, and every decided value is still accepted by a majority of the acceptors (or
+# was dropped by them after the leader told them it is decided).
+
+# system and time
+import os
+import sys
+import time
+
+import heapq                 # the events
+import random                # for random numbers
+import argparse              # argument parser
+import itertools             # to number the events
+import contextlib            # to silence the Paxos prints
+
+from proposer import Paxos_Proposer, parseCmdLineArgs as proposer_args
+from acceptor import Paxos_Acceptor, parseCmdLineArgs as acceptor_args
+from paxos_metrics import Paxos_Metrics  # per proposer metrics
+
+
+# ----------------------------------------------------------------------------------------------------
+# One end of a simulated connection, in place of a ZMQ socket
+#
+class Sim_Socket ():
+    """ The simulated socket class """
+
+    def __init__ (self, sim, src, channel):
+        self.sim = sim                  # the simulator carrying our messages
+        self.src = src                  # name of the node we belong to
+        self.channel = channel          # propose, promise, accept or learn
+        self.dst = None                 # where send goes to
+
+    ###################################################################
+    # ROUTER style send of the proposer: [acceptor name, message]
+    ###################################################################
+    def send_multipart (self, frames):
+        """ send to the named acceptor """
+
+        self.sim.send (self.src, frames[0].decode (), self.channel, frames[1])
+
+    ###################################################################
+    # PUSH style send of the acceptor to the proposer it is replying to
+    ###################################################################
+    def send (self, data):
+        """ send to our proposer """
+
+        self.sim.send (self.src, self.dst, self.channel, data)
+
+
+# ----------------------------------------------------------------------------------------------------
+# The Paxos simulator
+#
+class Paxos_Sim ():
+    """ The simulator class """
+
+    # virtual secs between the passes of the proposer event loops
+    tick = 0.01
+
+    #################################################################
+    # constructor
+    #################################################################
+    def __init__ (self, args):
+        self.rng = random.Random (args.seed)    # all our randomness
+        self.delay = args.delay / 1000          # mean delay of a message in secs
+        self.delay_dist = args.delay_dist       # fixed, uniform or exp
+        self.loss = args.loss                   # probability of losing a message
+        self.partition_every = args.partition_every     # secs between partitions, 0 for none
+        self.partition_length = args.partition_length   # secs a partition lasts
+        self.partition_size = args.partition_size       # number of nodes cut off
+        self.duration = args.duration           # max virtual secs of the run
+        self.verbose = args.verbose             # show the prints of the proposers and acceptors
+
+        self.now = 0.0                          # the virtual clock
+        self.events = []                        # heap of (due time, seq, func, args)
+        self.event_seq = itertools.count ()     # breaks ties between events due at the same time
+        self.isolated = set ()                  # nodes cut off by the current partition
+        self.sent = 0                           # messages sent
+        self.dropped = 0                        # messages lost or cut off
+        self.delivered = 0                      # messages handled
+
+        # the acceptors
+        self.acceptors = {}
+        for i in range (args.acceptors):
+            name = "acceptor{}".format (i+1)
+            acc = Paxos_Acceptor (acceptor_args (["-m", "multi", "-n", name, "-f", args.wire_format, "-e", str (args.lease),
+                                                  "-s", str (args.prune_every)]))
+            acc.clock = self.clock
+            acc.sender4promise = Sim_Socket (self, name, "promise")
+            acc.sender4learn = Sim_Socket (self, name, "learn")
+            self.acceptors[name] = acc
+
+        # the proposers, each with its own values to commit
+        self.proposers = {}
+        self.futures = {}
+        for i in range (args.proposers):
+            name = "proposer{}".format (i+1)
+            prop = Paxos_Proposer (proposer_args (["-m", "multi", "-n", str (i+1), "-q", str (args.acceptors),
+                                                   "-i", str (args.iters), "-w", str (args.window),
+                                                   "-b", str (args.batch_size), "-l", str (args.linger),
+                                                   "-t", str (args.timeout), "-f", args.wire_format, "-e", str (args.lease)]))
+            prop.clock = self.clock
+            if (args.metrics is not None):
+                # every proposer gets a file of its own, timed by the virtual clock
+                root, ext = os.path.splitext (args.metrics)
+                prop.metrics = Paxos_Metrics ("{}_{}{}".format (root, name, ext), args.metrics_every, self.clock)
+            prop.sender4propose = Sim_Socket (self, name, "propose")
+            prop.sender4accept = Sim_Socket (self, name, "accept")
+            # a list rather than a set, so that we send in the same order in every run
+            prop.acceptors = list (self.acceptors)
+            self.proposers[name] = prop
+            self.futures[name] = [prop.submit (val) for val in prop.gen_values ()]
+
+    ###################################################################
+    # The virtual clock
+    ###################################################################
+    def clock (self):
+        """ current virtual time """
+
+        return self.now
+
+    ###################################################################
+    # Run func (*args) after delay virtual secs
+    ###################################################################
+    def at (self, delay, func, *args):
+        """ schedule an event """
+
+        heapq.heappush (self.events, (self.now + delay, next (self.event_seq), func, args))
+
+    ###################################################################
+    # Delay of one message
+    ###################################################################
+    def draw_delay (self):
+        """ draw from the delay distribution """
+
+        if (self.delay_dist == "fixed"):
+            return self.delay
+        if (self.delay_dist == "uniform"):
+            return self.rng.uniform (0, 2 * self.delay)
+        return self.rng.expovariate (1 / self.delay) if self.delay > 0 else 0
+
+    ###################################################################
+    # The network: a message leaves src for dst
+    ###################################################################
+    def send (self, src, dst, channel, data):
+        """ deliver the message later, or lose it """
+
+        self.sent += 1
+        if ((src in self.isolated) != (dst in self.isolated) or self.rng.random () < self.loss):
+            self.dropped += 1
+            return
+        self.at (self.draw_delay (), self.deliver, src, dst, channel, data)
+
+    ###################################################################
+    # The network: a message arrives at dst
+    ###################################################################
+    def deliver (self, src, dst, channel, data):
+        """ hand the message to the handler of its channel """
+
+        if (channel in ("propose", "accept")):
+            acc = self.acceptors[dst]
+            msg = acc.wire.decode (data)
+            if (channel == "propose"):
+                reply, sender = acc.handle_prepare (msg), acc.sender4promise
+            else:
+                reply, sender = acc.handle_accept (msg), acc.sender4learn
+            if (reply is not None):
+                sender.dst = src
+                acc.send_replies ([(sender, reply)])
+        else:
+            prop = self.proposers[dst]
+            if (self.finished (dst)):
+                # it is done and gone
+                return
+            msg = prop.wire.decode (data)
+            if (channel == "promise"):
+                prop.handle_promise (msg)
+            else:
+                prop.handle_accepted (msg)
+            prop.housekeeping ()
+        self.delivered += 1
+
+    ###################################################################
+    # Whether all values of the proposer are in the log
+    ###################################################################
+    def finished (self, name):
+        """ check the futures of the proposer """
+
+        return self.proposers[name].num_learned >= len (self.futures[name])
+
+    ###################################################################
+    # A proposer starts with phase 1 and then runs its event loop
+    ###################################################################
+    def start_proposer (self, name):
+        """ start the proposer """
+
+        self.proposers[name].start_phase1 ()
+        self.run_proposer (name)
+
+    ###################################################################
+    # One pass of the event loop of a proposer
+    ###################################################################
+    def run_proposer (self, name):
+        """ batching, timeouts, window, heartbeats and reads """
+
+        if (self.finished (name)):
+            return
+        prop = self.proposers[name]
+        prop.collect_batches ()
+        prop.housekeeping ()
+        self.at (Paxos_Sim.tick, self.run_proposer, name)
+
+    ###################################################################
+    # Partitions come and go
+    ###################################################################
+    def start_partition (self):
+        """ cut off some nodes """
+
+        nodes = sorted (self.acceptors) + sorted (self.proposers)
+        self.isolated = set (self.rng.sample (nodes, min (self.partition_size, len (nodes))))
+        self.at (self.partition_length, self.end_partition)
+
+    def end_partition (self):
+        """ heal the partition """
+
+        self.isolated = set ()
+        self.at (self.partition_every, self.start_partition)
+
+    ###################################################################
+    # Run until every proposer has its values in the log, or out of time
+    ###################################################################
+    def run (self):
+        """ the simulation """
+
+        for name in self.proposers:
+            # the proposers do not start at the very same instant
+            self.at (self.rng.uniform (0, Paxos_Sim.tick), self.start_proposer, name)
+        if (self.partition_every > 0):
+            self.at (self.partition_every, self.start_partition)
+
+        while (self.events and not all (self.finished (name) for name in self.proposers)):
+            due, _, func, args = heapq.heappop (self.events)
+            if (due > self.duration):
+                break
+            self.now = due
+            func (*args)
+
+    ###################################################################
+    # Safety: whatever is decided stays decided, by everybody
+    #
+    # Returns the list of violations.
+    ###################################################################
+    def check_safety (self):
+        """ agreement between proposers and with the acceptors """
+
+        violations = []
+        chosen = {}
+        for name, prop in self.proposers.items ():
+            for slot, val in prop.log.items ():
+                if (slot in chosen and chosen[slot][1] != val):
+                    violations.append ("slot {}: {} decided {} but {} decided {}".format (slot, chosen[slot][0], chosen[slot][1], name, val))
+                chosen.setdefault (slot, (name, val))
+
+        majority = len (self.acceptors) // 2 + 1
+        for slot, (name, val) in chosen.items ():
+            holders = sum (1 for acc in self.acceptors.values () if (slot in acc.accepted and acc.accepted[slot][1] == val) or slot < acc.pruned)
+            if (holders < majority):
+                violations.append ("slot {}: {} decided {} but only {} acceptors hold it".format (slot, name, val, holders))
+
+        return violations
+
+    ###################################################################
+    # Print what happened
+    ###################################################################
+    def report (self, wall_time):
+        """ throughput and safety """
+
+        slots = {}
+        for prop in self.proposers.values ():
+            slots.update (prop.log)
+        values = {}
+        for val in slots.values ():
+            for v in (val or []):
+                values[v] = values.get (v, 0) + 1
+        learned = sum (prop.num_learned for prop in self.proposers.values ())
+        submitted = sum (len (futures) for futures in self.futures.values ())
+        violations = self.check_safety ()
+
+        print ("Paxos_Sim::report - {:.3f} virtual secs in {:.3f} real secs".format (self.now, wall_time))
+        print ("Paxos_Sim::report - {} of {} values learned in {} slots, {} values decided more than once".format (learned, submitted, len (slots), sum (1 for n in values.values () if n > 1)))
+        print ("Paxos_Sim::report - {:.1f} slots per real sec, {:.1f} slots per virtual sec".format (len (slots) / max (wall_time, 1e-9), len (slots) / max (self.now, 1e-9)))
+        print ("Paxos_Sim::report - {} messages sent, {} dropped, {} delivered".format (self.sent, self.dropped, self.delivered))
+        for name, prop in self.proposers.items ():
+            print ("Paxos_Sim::report - {}: ballot {}, leader {}, {} values learned".format (name, prop.ballot, prop.leader, prop.num_learned))
+        if (violations):
+            for violation in violations:
+                print ("Paxos_Sim::report - SAFETY VIOLATION {}".format (violation))
+        else:
+            print ("Paxos_Sim::report - safety holds")
+        return violations
+
+
+##################################
+# Command line parsing
+##################################
+def parseCmdLineArgs ():
+    # parse the command line
+    parser = argparse.ArgumentParser ()
+
+    # add optional arguments
+    parser.add_argument ("-a", "--acceptors", type=int, default=3, help="Number of acceptors, default 3")
+    parser.add_argument ("-n", "--proposers", type=int, default=1, help="Number of competing proposers, default 1")
+    parser.add_argument ("-i", "--iters", type=int, default=1000, help="Number of values each proposer commits, default 1000")
+    parser.add_argument ("-w", "--window", type=int, default=10, help="Max number of in-flight accepts per proposer, default 10")
+    parser.add_argument ("-b", "--batch_size", type=int, default=1, help="Max number of values in one slot, default 1")
+    parser.add_argument ("-l", "--linger", type=float, default=5, help="Max msec a value waits for its batch to fill up, default 5")
+    parser.add_argument ("-t", "--timeout", type=int, default=1, help="Timeout of the proposers in virtual sec, default 1")
+    parser.add_argument ("-e", "--lease", type=float, default=0, help="Msec of the leader leases, default 0 (no leases)")
+    parser.add_argument ("-f", "--wire_format", choices=["json", "binary"], default="json", help="Encoding of the messages, default json")
+    parser.add_argument ("-s", "--prune_every", type=int, default=100, help="Decided slots between the acceptors dropping them, default 100")
+    parser.add_argument ("--delay", type=float, default=1, help="Mean delay of a message in virtual msec, default 1")
+    parser.add_argument ("--delay_dist", choices=["fixed", "uniform", "exp"], default="exp", help="Distribution of the delays, default exp")
+    parser.add_argument ("--loss", type=float, default=0, help="Probability of losing a message, default 0")
+    parser.add_argument ("--partition_every", type=float, default=0, help="Virtual secs between partitions, default 0 (no partitions)")
+    parser.add_argument ("--partition_length", type=float, default=1, help="Virtual secs a partition lasts, default 1")
+    parser.add_argument ("--partition_size", type=int, default=1, help="Number of nodes (acceptors or proposers) cut off by a partition, default 1")
+    parser.add_argument ("--duration", type=float, default=600, help="Max virtual secs of the run, default 600")
+    parser.add_argument ("--seed", type=int, default=1, help="Seed of the random numbers, default 1")
+    parser.add_argument ("-x", "--metrics", default=None, help="Metrics file of the proposers, each gets its own with its name before the extension, default none")
+    parser.add_argument ("--metrics_every", type=float, default=1, help="Virtual secs between snapshots of the metrics, default 1")
+    parser.add_argument ("-v", "--verbose", action="store_true", help="Show the prints of the proposers and acceptors")
+
+    # parse the args
+    args = parser.parse_args ()
+
+    return args
+
+#------------------------------------------
+# main function
+def main ():
+    """ Main program """
+
+    args = parseCmdLineArgs ()
+    sim = Paxos_Sim (args)
+
+    start_time = time.time ()
+    if (args.verbose):
+        sim.run ()
+    else:
+        with open (os.devnull, "w") as devnull, contextlib.redirect_stdout (devnull):
+            sim.run ()
+    violations = sim.report (time.time () - start_time)
+    for prop in sim.proposers.values ():
+        prop.metrics.close ()
+
+    sys.exit (1 if violations else 0)
+
+#----------------------------------------------
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+#
+# Purpose: Write-ahead log for the state of a Paxos acceptor
+#
+# Vanderbilt University Computer Science
+# Author: Aniruddha Gokhale
+# Course: CS6381 Distributed Systems Principles
+# Created: Spring 2021
+#
+# An acceptor may only reply to a prepare or an accept once what it promised or
+# accepted is on disk, otherwise a restarted acceptor could break the promises it
+# made before the crash. We append one JSON line per promise or accept to the log,
+# and the acceptor makes a whole batch of them durable with a single fsync before it
+# sends any of the replies (group commit).
+#
+# Every so many records the complete state is written to a snapshot, after which
+# the log starts over. Recovery reads the snapshot and replays the (short) log.
+#
+# The leader tells the acceptors the low-water mark of the log, below which every
+# slot is decided. The acceptor drops those slots before it writes the snapshot,
+# so the snapshot only holds the slots still open. The mark goes into the snapshot
+# with them, since it stands for the slots that are no longer there.
+#
+# Record formats (one JSON object per line):
+#
+#   {"promised": ballot}                          a promise of ballot
+#   {"slot": slot, "ballot": ballot, "val": val}  an accept (which also promises ballot)
+#
+
+# system and time
+import os
+import sys
+
+import json                  # json
+
+
+# ----------------------------------------------------------------------------------------------------
+# The Paxos write-ahead log
+#
+class Paxos_WAL ():
+    """ The write-ahead log class """
+
+    #################################################################
+    # constructor
+    #################################################################
+    def __init__ (self, dirname, snapshot_every):
+        self.dirname = dirname                  # directory holding our files
+        self.snapshot_every = snapshot_every    # records between snapshots
+        self.log_file = os.path.join (dirname, "wal.log")
+        self.snapshot_file = os.path.join (dirname, "snapshot.json")
+        self.log = None                         # log file opened for appending
+        self.records = 0                        # records appended since the last snapshot
+        self.unsynced = 0                       # records appended since the last fsync
+
+        os.makedirs (dirname, exist_ok=True)
+
+    ###################################################################
+    # Recover the state from the snapshot and the log
+    #
+    # Returns the promised ballot, the dictionary of slot -> (ballot, value)
+    # and the low-water mark
+    ###################################################################
+    def recover (self):
+        """ rebuild the acceptor state """
+
+        try:
+            promised = [0, 0]
+            accepted = {}
+            low = 0
+
+            if (os.path.exists (self.snapshot_file)):
+                with open (self.snapshot_file) as f:
+                    snapshot = json.load (f)
+                promised = snapshot['promised']
+                low = snapshot.get ('low', 0)
+                for slot, ballot, val in snapshot['accepted']:
+                    accepted[slot] = (ballot, val)
+
+            self.records = 0
+            if (os.path.exists (self.log_file)):
+                good = 0        # bytes of the log up to the end of the last complete record
+                with open (self.log_file, "rb") as f:
+                    for line in f:
+                        try:
+                            if (not line.endswith (b"\n")):
+                                # the crash came before the newline, so the record is incomplete
+                                raise ValueError
+                            record = json.loads (line)
+                        except ValueError:
+                            # a record torn by the crash was never acknowledged, so we can drop it
+                            print ("Paxos_WAL::recover - ignoring torn record at the end of the log")
+                            break
+
+                        good += len (line)
+                        self.records += 1
+                        if ('slot' in record):
+                            # accepts of a slot only ever come with higher ballots
+                            if (record['slot'] not in accepted or record['ballot'] >= accepted[record['slot']][0]):
+                                accepted[record['slot']] = (record['ballot'], record['val'])
+                            promised = max (promised, record['ballot'])
+                        else:
+                            promised = max (promised, record['promised'])
+
+                # cut off the torn record before we append to the log, otherwise our next record
+                # would be glued to it and every later recovery would stop there
+                if (good < os.path.getsize (self.log_file)):
+                    with open (self.log_file, "r+b") as f:
+                        f.truncate (good)
+                        f.flush ()
+                        os.fsync (f.fileno ())
+
+            self.log = open (self.log_file, "a")
+            return promised, accepted, low
+
+        except:
+            print("Unexpected error in Paxos_WAL::recover:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Append a promise; it is durable only after the next commit
+    ###################################################################
+    def append_promise (self, ballot):
+        """ log a promise """
+
+        self.log.write (json.dumps ({'promised': ballot}) + "\n")
+        self.records += 1
+        self.unsynced += 1
+
+    ###################################################################
+    # Append an accept; it is durable only after the next commit
+    ###################################################################
+    def append_accept (self, slot, ballot, val):
+        """ log an accept """
+
+        self.log.write (json.dumps ({'slot': slot, 'ballot': ballot, 'val': val}) + "\n")
+        self.records += 1
+        self.unsynced += 1
+
+    ###################################################################
+    # Make everything appended so far durable with one fsync
+    ###################################################################
+    def commit (self):
+        """ group commit """
+
+        if (self.unsynced):
+            self.log.flush ()
+            os.fsync (self.log.fileno ())
+            self.unsynced = 0
+
+    ###################################################################
+    # Whether it is time for a snapshot
+    ###################################################################
+    def need_snapshot (self):
+        """ check the number of records in the log """
+
+        return self.records >= self.snapshot_every
+
+    ###################################################################
+    # Write the complete state to a new snapshot and empty the log
+    #
+    # The snapshot is written to a temporary file and renamed over the old
+    # one, so a crash leaves either the old or the new snapshot. Replaying
+    # the old log on top of the new snapshot is harmless.
+    ###################################################################
+    def snapshot (self, promised, accepted, low):
+        """ snapshot the acceptor state """
+
+        try:
+            tmp_file = self.snapshot_file + ".tmp"
+            with open (tmp_file, "w") as f:
+                json.dump ({'promised': promised,
+                            'low': low,
+                            'accepted': [[slot, ballot, val] for slot, (ballot, val) in accepted.items ()]}, f)
+                f.flush ()
+                os.fsync (f.fileno ())
+            os.replace (tmp_file, self.snapshot_file)
+
+            # the rename itself must be durable before we throw the log away
+            dir_fd = os.open (self.dirname, os.O_RDONLY)
+            os.fsync (dir_fd)
+            os.close (dir_fd)
+
+            self.log.close ()
+            self.log = open (self.log_file, "w")
+            self.records = 0
+            self.unsynced = 0
+
+        except:
+            print("Unexpected error in Paxos_WAL::snapshot:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Close the log
+    ###################################################################
+    def close (self):
+        """ commit and close """
+
+        self.commit ()
+        self.log.close ()
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+#
+# Purpose: Test of the recovery of the acceptor write-ahead log after a crash
+#
+# Vanderbilt University Computer Science
+# Author: Aniruddha Gokhale
+# Course: CS6381 Distributed Systems Principles
+# Created: Spring 2021
+#
+# We crash in the middle of writing a record, recover, append and commit more
+# records, and check that the next recovery finds all the committed ones. Runs
+# on its own or under pytest.
+
+# system
+import os
+import sys
+
+import tempfile              # scratch directory for the log
+
+from paxos_wal import Paxos_WAL  # what we test
+
+
+##################################
+# Crash with a torn record at the end of the log
+##################################
+def crash_mid_record (dirname, torn):
+    """ commit a promise, then tear the next record """
+
+    wal = Paxos_WAL (dirname, 1000)
+    wal.recover ()
+    wal.append_promise ([1, 1])
+    wal.commit ()
+    wal.log.write (torn)
+    wal.log.flush ()
+    wal.log.close ()   # the crash; nothing after the torn bytes made it to disk
+
+
+##################################
+# Records committed after a torn record survive the next recovery
+##################################
+def check_torn_record (torn):
+    """ crash, recover, append, commit and recover again """
+
+    with tempfile.TemporaryDirectory () as dirname:
+        crash_mid_record (dirname, torn)
+
+        wal = Paxos_WAL (dirname, 1000)
+        promised, accepted, _ = wal.recover ()
+        assert (promised == [1, 1] and accepted == {})
+
+        wal.append_promise ([7, 2])
+        wal.append_accept (3, [7, 2], "x")
+        wal.commit ()
+        wal.log.close ()   # crash again, this time after the commit
+
+        wal = Paxos_WAL (dirname, 1000)
+        promised, accepted, _ = wal.recover ()
+        assert (promised == [7, 2]), promised
+        assert (accepted == {3: ([7, 2], "x")}), accepted
+        wal.close ()
+
+        # all that is left in the log are the three complete records
+        with open (os.path.join (dirname, "wal.log")) as f:
+            assert (len (f.read ().splitlines ()) == 3)
+
+
+def test_torn_json ():
+    """ the crash cut a record in the middle """
+
+    check_torn_record ('{"slot": 5, "ballot": [2')
+
+
+def test_missing_newline ():
+    """ the crash cut off only the newline of a complete record """
+
+    check_torn_record ('{"promised": [9, 9]}')
+
+
+##################################
+# The low-water mark survives in the snapshot with the slots above it
+##################################
+def test_snapshot_low ():
+    """ snapshot a pruned state and recover it """
+
+    with tempfile.TemporaryDirectory () as dirname:
+        wal = Paxos_WAL (dirname, 1000)
+        wal.recover ()
+        wal.snapshot ([3, 1], {7: ([3, 1], "y")}, 5)
+        wal.append_accept (8, [3, 1], "z")
+        wal.close ()
+
+        wal = Paxos_WAL (dirname, 1000)
+        promised, accepted, low = wal.recover ()
+        assert (low == 5), low
+        assert (accepted == {7: ([3, 1], "y"), 8: ([3, 1], "z")}), accepted
+        wal.close ()
+
+
+#----------------------------------------------
+if __name__ == '__main__':
+    test_torn_json ()
+    test_missing_newline ()
+    test_snapshot_low ()
+    print ("paxos_wal_test: all tests passed")
+    sys.exit (0)
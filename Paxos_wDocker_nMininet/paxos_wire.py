@@ -0,0 +1,234 @@
+#!/usr/bin/python
+#
+# Purpose: Wire formats of the Paxos messages
+#
+# Vanderbilt University Computer Science
+# Author: Aniruddha Gokhale
+# Course: CS6381 Distributed Systems Principles
+# Created: Spring 2021
+#
+# The proposer and the acceptors exchange small dictionaries. They can go on the wire
+# either as JSON, like they always did, or in a compact binary format where every
+# kind of message has a fixed layout packed with struct:
+#
+#   version (1 byte) | type (1 byte) | fixed size fields | variable size fields
+#
+# The fixed size fields are the round, ids, proposal numbers, slots and ballots
+# (unsigned 32 bit integers, a ballot being two of them) and the ok flags (1 byte).
+# The variable size fields follow in the order of the layout:
+#
+#   string     2 byte length and the UTF-8 bytes (names)
+#   value      1 byte tag: 0 for None, 1 for a string as a 4 byte length and its
+#              bytes, 2 for a list of strings (a batch in multi mode) as a 4 byte
+#              count, the 4 byte length of all their bytes, the number of characters
+#              of every string (4 bytes each) and all the strings one after the other
+#   accepted   4 byte count, (slot, ballot) of every accepted slot (12 bytes each)
+#              and then the values of all of them
+#
+# Lists are packed with one struct call each rather than item by item. This keeps
+# the larger messages (promises reporting accepted slots, large batches) within
+# reach of json, but not ahead of it: they take about as many bytes either way and
+# cost more to encode and decode in binary, since the C implementation of json
+# builds the lists while we go over the slots and strings in Python (see
+# paxos_wire_bench.py). The binary format pays off for the small messages.
+#
+# The type of a message is known from its keys, so the callers hand us the same
+# dictionaries in both formats. The version byte lets a receiver refuse messages
+# of a layout it does not know instead of misreading them. Both sides must be
+# started with the same format. A message that has no layout, or a number that does
+# not fit its 32 bits (e.g. a negative one), is refused with a ValueError before
+# anything is packed.
+
+import json                  # json
+import struct                # binary layouts
+
+
+# version of the binary layouts below
+WIRE_VERSION = 2
+
+# range of the integer fields
+MAX_UINT = 2**32 - 1
+MAX_STRING = 2**16 - 1
+
+# ----------------------------------------------------------------------------------------------------
+# The Paxos wire format
+#
+class Paxos_Wire ():
+    """ The wire format class """
+
+    # type code: (fixed size fields, variable size fields), each as (key, kind) where the
+    # kinds are I (integer), b (ballot), ? (flag), s (string), v (value) and a (accepted)
+    layouts = {
+        # single decree
+        1: ((('round', 'I'),), (('status', 's'), ('name', 's'))),                                     # acceptor up
+        2: ((('round', 'I'), ('id', 'I'), ('num', 'I')), ()),                                          # propose
+        3: ((('round', 'I'), ('id', 'I'), ('prop_num', 'I')), (('name', 's'),)),                       # promise
+        4: ((('round', 'I'), ('num', 'I')), (('val', 'v'),)),                                          # accept
+        5: ((('round', 'I'), ('id', 'I'), ('prop_num', 'I')), (('name', 's'), ('prop_val', 'v'))),     # learn
+        # multi paxos
+        6: ((('ballot', 'b'), ('slot', 'I')), ()),                                                     # prepare
+        7: ((('ballot', 'b'), ('ok', '?'), ('low', 'I')), (('name', 's'), ('accepted', 'a'))),         # promise
+        8: ((('ballot', 'b'), ('ok', '?'), ('promised', 'b')), (('name', 's'),)),                      # prepare rejected
+        9: ((('ballot', 'b'), ('slot', 'I'), ('low', 'I')), (('val', 'v'),)),                          # accept
+        10: ((('ballot', 'b'), ('slot', 'I'), ('ok', '?')), (('name', 's'),)),                         # accepted
+        11: ((('ballot', 'b'), ('slot', 'I'), ('ok', '?'), ('promised', 'b')), (('name', 's'),)),      # accept rejected
+        12: ((('ballot', 'b'), ('beat', 'I'), ('low', 'I')), ()),                                      # heartbeat
+        13: ((('ballot', 'b'), ('beat', 'I'), ('ok', '?')), (('name', 's'),)),                         # heartbeat ack
+        14: ((('ballot', 'b'), ('beat', 'I'), ('ok', '?'), ('promised', 'b')), (('name', 's'),)),      # heartbeat rejected
+    }
+
+    header = struct.Struct ("!BB")
+    short_length = struct.Struct ("!H")
+    length = struct.Struct ("!I")
+    tag = struct.Struct ("!B")
+    string_value = struct.Struct ("!BI")
+    list_value = struct.Struct ("!BII")
+
+    #################################################################
+    # constructor
+    #################################################################
+    def __init__ (self, fmt):
+        self.fmt = fmt                  # json or binary
+
+        # type code of every set of keys, and the struct of the fixed size fields of every type
+        self.types = {}
+        self.fixed = {}
+        for code, (fixed, variable) in Paxos_Wire.layouts.items ():
+            self.types[frozenset (key for key, _ in fixed + variable)] = code
+            self.fixed[code] = struct.Struct ("!BB" + "".join ("II" if kind == 'b' else kind for _, kind in fixed))
+
+    ###################################################################
+    # Encode a message for the wire
+    ###################################################################
+    def encode (self, msg):
+        """ dictionary to bytes """
+
+        if (self.fmt == "json"):
+            return json.dumps (msg).encode ()
+
+        code = self.types.get (frozenset (msg))
+        if (code is None):
+            raise ValueError ("Paxos_Wire::encode - no binary layout for a message with keys {}".format (sorted (msg)))
+        fixed, variable = Paxos_Wire.layouts[code]
+
+        fields = [WIRE_VERSION, code]
+        for key, kind in fixed:
+            nums = msg[key] if kind == 'b' else (msg[key],)
+            if (kind != '?' and not all (0 <= x <= MAX_UINT for x in nums)):
+                raise ValueError ("Paxos_Wire::encode - {} = {} is out of the range 0 to {}".format (key, msg[key], MAX_UINT))
+            fields.extend (nums)
+
+        parts = [self.fixed[code].pack (*fields)]
+        for key, kind in variable:
+            if (kind == 's'):
+                b = msg[key].encode ()
+                if (len (b) > MAX_STRING):
+                    raise ValueError ("Paxos_Wire::encode - {} is longer than {} bytes".format (key, MAX_STRING))
+                parts.append (Paxos_Wire.short_length.pack (len (b)))
+                parts.append (b)
+            elif (kind == 'v'):
+                self.encode_value (parts, msg[key])
+            else:
+                accepted = msg[key]
+                if (not all (0 <= x <= MAX_UINT for slot, ballot, _ in accepted for x in (slot, ballot[0], ballot[1]))):
+                    raise ValueError ("Paxos_Wire::encode - a slot or ballot of {} is out of the range 0 to {}".format (key, MAX_UINT))
+                parts.append (Paxos_Wire.length.pack (len (accepted)))
+                parts.append (struct.pack ("!{}I".format (3 * len (accepted)),
+                                           *[x for slot, ballot, _ in accepted for x in (slot, ballot[0], ballot[1])]))
+                for _, _, val in accepted:
+                    self.encode_value (parts, val)
+
+        return b"".join (parts)
+
+    ###################################################################
+    # Decode a message from the wire
+    ###################################################################
+    def decode (self, data):
+        """ bytes to dictionary """
+
+        if (self.fmt == "json"):
+            return json.loads (data)
+
+        version, code = Paxos_Wire.header.unpack_from (data)
+        if (version != WIRE_VERSION):
+            raise ValueError ("Paxos_Wire::decode - version {} of the wire format is not supported".format (version))
+        fixed, variable = Paxos_Wire.layouts[code]
+
+        msg = {}
+        fields = self.fixed[code].unpack_from (data)
+        i = 2
+        for key, kind in fixed:
+            if (kind == 'b'):
+                msg[key] = [fields[i], fields[i+1]]
+                i += 2
+            else:
+                msg[key] = fields[i]
+                i += 1
+
+        offset = self.fixed[code].size
+        for key, kind in variable:
+            if (kind == 's'):
+                size, = Paxos_Wire.short_length.unpack_from (data, offset)
+                offset += Paxos_Wire.short_length.size
+                msg[key] = data[offset:offset+size].decode ()
+                offset += size
+            elif (kind == 'v'):
+                msg[key], offset = self.decode_value (data, offset)
+            else:
+                count, = Paxos_Wire.length.unpack_from (data, offset)
+                offset += Paxos_Wire.length.size
+                nums = struct.unpack_from ("!{}I".format (3 * count), data, offset)
+                offset += 12 * count
+                accepted = []
+                for j in range (count):
+                    val, offset = self.decode_value (data, offset)
+                    accepted.append ([nums[3*j], [nums[3*j+1], nums[3*j+2]], val])
+                msg[key] = accepted
+
+        return msg
+
+    ###################################################################
+    # Append a value: None, a string or a list of strings
+    ###################################################################
+    def encode_value (self, parts, val):
+        """ append a value """
+
+        if (val is None):
+            parts.append (Paxos_Wire.tag.pack (0))
+        elif (isinstance (val, str)):
+            b = val.encode ()
+            parts.append (Paxos_Wire.string_value.pack (1, len (b)))
+            parts.append (b)
+        else:
+            # the characters of all the strings go in one piece, and so do their lengths
+            b = "".join (val).encode ()
+            parts.append (Paxos_Wire.list_value.pack (2, len (val), len (b)))
+            parts.append (struct.pack ("!{}I".format (len (val)), *[len (s) for s in val]))
+            parts.append (b)
+
+    ###################################################################
+    # Read a value; returns it with the offset after it
+    ###################################################################
+    def decode_value (self, data, offset):
+        """ read a value """
+
+        tag, = Paxos_Wire.tag.unpack_from (data, offset)
+        if (tag == 0):
+            return None, offset + Paxos_Wire.tag.size
+
+        if (tag == 1):
+            _, size = Paxos_Wire.string_value.unpack_from (data, offset)
+            offset += Paxos_Wire.string_value.size
+            return data[offset:offset+size].decode (), offset + size
+
+        _, count, size = Paxos_Wire.list_value.unpack_from (data, offset)
+        offset += Paxos_Wire.list_value.size
+        lengths = struct.unpack_from ("!{}I".format (count), data, offset)
+        offset += 4 * count
+        chars = data[offset:offset+size].decode ()
+        val = []
+        pos = 0
+        for n in lengths:
+            val.append (chars[pos:pos+n])
+            pos += n
+        return val, offset + size
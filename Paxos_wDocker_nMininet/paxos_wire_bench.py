@@ -0,0 +1,117 @@
+#!/usr/bin/python
+#
+# Purpose: Microbenchmark of the wire formats of the Paxos messages
+#
+# Vanderbilt University Computer Science
+# Author: Aniruddha Gokhale
+# Course: CS6381 Distributed Systems Principles
+# Created: Spring 2021
+#
+# For every kind of message the proposer and the acceptors exchange we encode and
+# decode a typical instance many times, in JSON and in the binary format of
+# paxos_wire.py, and print the average cost per message in microseconds together
+# with the number of bytes it takes on the wire. The values are value_size characters
+# long, a multi mode accept carries a batch of batch_size of them, and a promise
+# reports accepted slots of the same kind.
+#
+# No sockets are involved, so this is only the cost of our side of the messaging.
+
+# time
+import time
+
+import argparse   # argument parser
+import csv        # for the results
+
+from paxos_wire import Paxos_Wire  # the wire formats we compare
+
+
+##################################
+# Typical instances of all our messages
+##################################
+def sample_msgs (value_size, batch_size, accepted):
+    """ one message of every kind """
+
+    val = "x" * value_size
+    batch = [val] * batch_size
+    name = "acceptor1:12345"
+    return {
+        "up": {'round': 7, 'status': 'up', 'name': name},
+        "propose": {'round': 7, 'id': 1, 'num': 5},
+        "promise": {'round': 7, 'id': 1, 'name': name, 'prop_num': 5},
+        "accept": {'round': 7, 'num': 5, 'val': val},
+        "learn": {'round': 7, 'id': 1, 'name': name, 'prop_num': 5, 'prop_val': val},
+        "multi_prepare": {'ballot': [3, 1], 'slot': 1000},
+        "multi_promise": {'name': name, 'ballot': [3, 1], 'ok': True, 'low': 990,
+                          'accepted': [[1000 + i, [2, 2], batch] for i in range (accepted)]},
+        "multi_accept": {'ballot': [3, 1], 'slot': 1000, 'val': batch, 'low': 990},
+        "multi_accepted": {'name': name, 'ballot': [3, 1], 'slot': 1000, 'ok': True},
+    }
+
+
+##################################
+# Time encode and decode of one message
+##################################
+def measure (wire, msg, iters):
+    """ returns usec per encode, usec per decode and bytes on the wire """
+
+    start = time.perf_counter ()
+    for i in range (iters):
+        data = wire.encode (msg)
+    encode_usec = (time.perf_counter () - start) * 1e6 / iters
+
+    start = time.perf_counter ()
+    for i in range (iters):
+        decoded = wire.decode (data)
+    decode_usec = (time.perf_counter () - start) * 1e6 / iters
+
+    # the benchmark is of no use if the format loses information
+    assert (decoded == msg)
+    return encode_usec, decode_usec, len (data)
+
+
+##################################
+# Command line parsing
+##################################
+def parseCmdLineArgs ():
+    # parse the command line
+    parser = argparse.ArgumentParser ()
+
+    # add optional arguments
+    parser.add_argument ("-i", "--iters", type=int, default=100000, help="Number of encodes and decodes per message, default 100000")
+    parser.add_argument ("-v", "--value_size", type=int, default=16, help="Number of characters per value, default 16")
+    parser.add_argument ("-b", "--batch_size", type=int, default=1, help="Number of values in a multi mode slot, default 1")
+    parser.add_argument ("-a", "--accepted", type=int, default=10, help="Number of accepted slots reported in a multi mode promise, default 10")
+    parser.add_argument ("-o", "--csv_file", default=None, help="CSV file for the results, default none")
+
+    # parse the args
+    args = parser.parse_args ()
+
+    return args
+
+#------------------------------------------
+# main function
+def main ():
+    """ Main program """
+
+    args = parseCmdLineArgs ()
+    msgs = sample_msgs (args.value_size, args.batch_size, args.accepted)
+    wires = {fmt: Paxos_Wire (fmt) for fmt in ["json", "binary"]}
+
+    rows = []
+    print ("{:16} {:>8} {:>12} {:>12} {:>8}".format ("message", "format", "encode usec", "decode usec", "bytes"))
+    for kind, msg in msgs.items ():
+        for fmt, wire in wires.items ():
+            encode_usec, decode_usec, size = measure (wire, msg, args.iters)
+            print ("{:16} {:>8} {:>12.2f} {:>12.2f} {:>8}".format (kind, fmt, encode_usec, decode_usec, size))
+            rows.append ({"message": kind, "format": fmt, "encode_usec": round (encode_usec, 3),
+                          "decode_usec": round (decode_usec, 3), "bytes": size})
+
+    if (args.csv_file is not None):
+        with open (args.csv_file, "w", newline="") as f:
+            writer = csv.DictWriter (f, fieldnames=["message", "format", "encode_usec", "decode_usec", "bytes"])
+            writer.writeheader ()
+            writer.writerows (rows)
+
+#----------------------------------------------
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,187 @@
+#!/usr/bin/python
+#
+# Purpose: Workload generator for the Paxos proposer and acceptors
+#
+# Vanderbilt University Computer Science
+# Author: Aniruddha Gokhale
+# Course: CS6381 Distributed Systems Principles
+# Created: Spring 2021
+#
+# Instead of typing in a proposal number and value for every round, the proposer and
+# the acceptors can take them from a workload. The workload is described by
+#
+#   rate         proposals (or values in multi mode) started per second, 0 for as fast
+#                as possible
+#   value_size   number of characters in every value
+#   competitors  number of other proposers competing with ours
+#   seed         seed of the random numbers; must be the same on all the hosts
+#
+# In every round our proposer and each competitor draw a proposal number between 1
+# and 10. The acceptors play the part of having already heard from the competitors:
+# each acceptor sees each competitor with probability 1/2 and starts the round with
+# the highest number it saw (0 if none). Since all random numbers derive from the seed
+# and the round, the proposer and the acceptors agree on the draws without talking.
+#
+# The proposer records the latency of every decision, and at the end writes the
+# latency histogram together with the decisions per second to a CSV file.
+
+# system and time
+import os
+import sys
+
+import csv                   # for the results
+import random                # for random numbers
+import string                # characters of the values
+
+
+# ----------------------------------------------------------------------------------------------------
+# The Paxos workload
+#
+class Paxos_Workload ():
+    """ The workload class """
+
+    # upper bounds in msec of the buckets of our latency histogram (the last one is unbounded)
+    buckets = [2 ** i for i in range (17)] + [float ("inf")]
+
+    # columns of our CSV file
+    fields = ["rate", "value_size", "competitors", "decisions", "defeats", "decisions_per_sec", "le_msec", "count"]
+
+    #################################################################
+    # constructor
+    #################################################################
+    def __init__ (self, rate, value_size, competitors, seed):
+        self.rate = rate                    # proposals per sec, 0 for as fast as possible
+        self.value_size = value_size        # characters per value
+        self.competitors = competitors      # number of competing proposers
+        self.seed = seed                    # seed shared by all hosts
+        self.next_start = None              # when the next proposal is due
+        self.first_start = None             # when the first proposal started
+        self.last_finish = None             # when the last decision was made
+        self.decisions = 0                  # proposals learned
+        self.defeats = 0                    # proposals defeated
+        self.histogram = [0] * len (Paxos_Workload.buckets)  # number of decisions per latency bucket
+
+    ###################################################################
+    # Random numbers for the given round (and whatever else distinguishes the draw)
+    ###################################################################
+    def round_rng (self, round, *extra):
+        """ seeded generator for one round """
+
+        return random.Random ("-".join (str (x) for x in (self.seed, round) + extra))
+
+    ###################################################################
+    # Proposal numbers of our proposer (first) and all the competitors
+    ###################################################################
+    def proposal_nums (self, round):
+        """ draw the proposal numbers of the round """
+
+        rng = self.round_rng (round)
+        return [rng.randint (1, 10) for i in range (self.competitors + 1)]
+
+    ###################################################################
+    # A value of value_size characters
+    ###################################################################
+    def value (self, round):
+        """ draw a value """
+
+        rng = self.round_rng (round, "val")
+        return "".join (rng.choices (string.ascii_letters, k=self.value_size))
+
+    ###################################################################
+    # Proposal number and value of our proposer in the round
+    ###################################################################
+    def proposal (self, round):
+        """ what our proposer proposes """
+
+        return self.proposal_nums (round)[0], self.value (round)
+
+    ###################################################################
+    # Highest proposal number the named acceptor saw from the competitors
+    ###################################################################
+    def acceptor_prop_num (self, round, name):
+        """ what the acceptor starts the round with """
+
+        rng = self.round_rng (round, name)
+        seen = [num for num in self.proposal_nums (round)[1:] if rng.random () < 0.5]
+        return max (seen, default=0)
+
+    ###################################################################
+    # Whether the next proposal may start now, according to the rate
+    ###################################################################
+    def ready (self, now):
+        """ pace the proposals """
+
+        if (self.first_start is None):
+            self.first_start = now
+            self.next_start = now
+
+        if (self.rate <= 0):
+            return True
+
+        if (now < self.next_start):
+            return False
+
+        self.next_start += 1 / self.rate
+        return True
+
+    ###################################################################
+    # Secs until the next proposal is due
+    ###################################################################
+    def wait_time (self, now):
+        """ time left until the next proposal """
+
+        if (self.rate <= 0 or self.next_start is None):
+            return 0
+        return max (0, self.next_start - now)
+
+    ###################################################################
+    # Record the outcome of one proposal
+    ###################################################################
+    def record (self, latency, learned, now):
+        """ add to the statistics """
+
+        self.last_finish = now
+        if (not learned):
+            self.defeats += 1
+            return
+
+        self.decisions += 1
+        msec = latency * 1000
+        for i, bound in enumerate (Paxos_Workload.buckets):
+            if (msec <= bound):
+                self.histogram[i] += 1
+                break
+
+    ###################################################################
+    # Decisions per second over the whole run
+    ###################################################################
+    def decisions_per_sec (self):
+        """ throughput """
+
+        if (self.first_start is None or self.last_finish is None or self.last_finish <= self.first_start):
+            return 0
+        return self.decisions / (self.last_finish - self.first_start)
+
+    ###################################################################
+    # Append the histogram to the CSV file, one row per bucket
+    ###################################################################
+    def write_csv (self, filename):
+        """ save the results """
+
+        try:
+            print ("Paxos_Workload::write_csv - {} decisions, {} defeats, {:.1f} decisions/sec".format (self.decisions, self.defeats, self.decisions_per_sec ()))
+
+            new_file = not os.path.exists (filename)
+            with open (filename, "a", newline="") as f:
+                writer = csv.DictWriter (f, fieldnames=Paxos_Workload.fields)
+                if (new_file):
+                    writer.writeheader ()
+                for bound, count in zip (Paxos_Workload.buckets, self.histogram):
+                    writer.writerow ({"rate": self.rate, "value_size": self.value_size, "competitors": self.competitors,
+                                      "decisions": self.decisions, "defeats": self.defeats,
+                                      "decisions_per_sec": round (self.decisions_per_sec (), 1),
+                                      "le_msec": bound, "count": count})
+
+        except:
+            print("Unexpected error in Paxos_Workload::write_csv:", sys.exc_info()[0])
+            raise
@@ -17,120 +17,48 @@ import sys
 import time
 
 import random  # for random numbers
+import heapq   # timers of the reactor
+import itertools  # to number the timers
 
 import argparse   # argument parser
 
 import zmq                   # ZeroMQ library
 import json                  # json
+import queue                 # values submitted by other threads
 
-from paxos_thread import Paxos_Thread  # for barrier synchronization and other operations
+from concurrent.futures import Future  # resolves when a submitted value is learned
 
-#---------------------------------------------------------------------------------------------
-# Thread function that implements barrier, a sink and timer
-#
-# This function is executed by a thread in parallel to the main program, where
-# the main program will block until all desired responses are received.
-#
-def thread_func (args):
-    """ Thread function to execute when proposer starts a parallel thread """
-
-    try:
-        # Before the proposer can start proposing, we need to make sure that
-        # our quorum of acceptors is ready.  So we have a barrier synchronization.
-        # Other scenarios include receiving promise and learn messages within
-        # the given timeout
-        #
-        # To do that, we start the ZeroMQ sink task. When the required number
-        # of responses are received, the thread terminates doing any processing
-        # that is needed. We may also terminate if the timer expires.  This is
-        # handled using the ZMQ Poller
-        
-        print("Paxos thread function starting with args: ", args)
-        proposer = args['proposer']   # should be the proposer object
-        timeout = args['timeout']
-
-        # get the appropriate socket based on what the operation is
-        print("Paxos thread function setting the right receiver")
-        if (args['op'] == "acceptor_up"):
-            receiver = proposer.rcv4barrier
-        elif (args['op'] == "promise"):
-            receiver = proposer.rcv4promise
-        elif (args['op'] == "learn"):
-            receiver = proposer.rcv4learn
-        else:
-            print("Unknown operation. Should be aborted")
-            receiver = None
-            raise
-
-        # Now register this receiver with the poller. The reason we are using a poller
-        # is because we want to also involve a timeout
-        print ("Paxos thread function registering the receiver")
-        proposer.poller.register (receiver, zmq.POLLIN)
-
-        # The logic here is that we wait until the required number of
-        # ACKs are received 
-        i = 0
-        elapsed_time = 0 # we need this because we need to keep reducing the timeout 
-
-        # continue trying to receive until condition is met or we run out of timeout
-        while (i < args['cond']):
-
-            # get current time
-            start_time = time.time ()  
-                
-            # deduct elapsed time from the timeout if it is not set to infinity
-            if (timeout is not None):
-                print ("Paxos thread function: waiting for propose or learn msg")
-                timeout = timeout - elapsed_time
-
-                # insert an artificial delay to read the message
-                delay = random.randint (0, proposer.delay)
-                print ("Inserting an artificial delay of {} sec before reading promise or learn msg".format (delay))
-                time.sleep (delay) # that many secs
-                
-                # poll the socket for incoming connections with the timeout
-                events = dict (proposer.poller.poll (timeout*1000))  # timeout is in seconds so we convert to msec
- 
-                # The incoming event better be on the socket we have enabled else
-                # it must be a timeout
-                if (receiver not in events):
-                    # break the loop
-                    print ("Paxos Thread: timer expired, returning")
-                    break
+from paxos_workload import Paxos_Workload  # generated proposals instead of user input
+from paxos_wire import Paxos_Wire  # JSON or binary messages
+from paxos_metrics import Paxos_Metrics, Paxos_Null_Metrics  # instrumentation
 
-            else:
-                print ("Paxos thread function: waiting for acceptor up signal")
-                events = dict (proposer.poller.poll ())  # for up msg, no timeout
-                # since there was no timeout, our receiver better be enabled
-                print ("Paxos thread function: assertion check")
-                assert (receiver in events)
+from collections import deque  # queue of values waiting for a log slot
 
 
-            # if everything goes according to plan, read the message
-            print ("Paxos thread func: receiving json message")
-            msg = receiver.recv_json ()
-            
-            print ("Paxos thread func: appending json message")
-            proposer.msgs [args['op']].append (msg)
+# ----------------------------------------------------------------------------------------------------
+# One single decree Paxos proposal
+#
+# The proposer may have several of these in progress at the same time, one per round
+#
+class Paxos_Proposal ():
+    """ The proposal class """
 
-            end_time = time.time ()
-            elapsed_time = end_time - start_time
-                           
-            # increment the number of acks received
-            i = i + 1
+    #################################################################
+    # constructor
+    #################################################################
+    def __init__ (self, round, prop_num, prop_val):
+        self.round = round                  # round id carried in all its messages
+        self.prop_num = prop_num            # holds the proposal number
+        self.prop_val = prop_val            # holds the value being proposed
+        self.phase = "acceptor_up"          # phase we are in: acceptor_up, promise, learn or done
+        self.num_responders = 0             # keeps track of how many responded
+        self.defeated = False               # whether our proposal is defeated or not
+        self.start_time = time.time ()      # for the latency of the decision
+        self.sent = {}                      # phase -> when we sent the messages of the phase
 
-        # Now unregister the receiver from the poller
-        print ("Paxos thread func: unregistering from the poller")
-        proposer.poller.unregister (receiver)
+        # stores the incoming messages
+        self.msgs = {'acceptor_up': [], 'promise': [], 'learn': []}    # received msgs
 
-        print ("Paxos thread exiting")
-
-        return
-    
-    except:
-        print("Unexpected error in paxos thread function: ", sys.exc_info()[0])
-        raise
-        
 
 # ----------------------------------------------------------------------------------------------------
 # The Paxos Proposer
@@ -138,6 +66,9 @@ def thread_func (args):
 class Paxos_Proposer ():
     """ The proposer class """
 
+    # fraction of a lease we give up to allow for the clocks of the acceptors running faster than ours
+    lease_drift = 0.1
+
     #################################################################
     # constructor
     #################################################################
@@ -147,10 +78,24 @@ class Paxos_Proposer ():
         self.timeout = args.timeout     # timeout used for each round
         self.delay = args.delay            # artificial delay
         self.iters = args.iters               # number of iterations
-        self.majority = None                # simple majority
-        self.num_responders = 0          # keeps track of how many responded
-        self.prop_num = None              # holds the proposal number
-        self.prop_val = None                 # holds the value being proposed
+        self.round_reset = args.round_reset   # keep the sockets between iterations
+        self.round = 0                        # next round id, carried in all messages
+        self.concurrency = args.concurrency   # max number of single decree proposals in progress
+        self.majority = int (self.quorum/2) + 1 # simple majority; handles both odd and even cases
+        self.mode = args.mode               # single decree or multi paxos
+        self.window = args.window           # max number of in-flight accepts in multi paxos
+        self.proposer_id = args.proposer_id   # breaks ties between ballots of different proposers
+        self.batch_size = args.batch_size   # max number of values in one slot in multi paxos
+        self.linger = args.linger / 1000    # max secs a value waits for its batch to fill up
+        self.lease = args.lease / 1000      # secs a leader lease lasts, 0 for no leases
+        self.workload = None                # where proposals come from if not from the user
+        if (args.generate):
+            self.workload = Paxos_Workload (args.rate, args.value_size, args.competitors, args.seed)
+        self.wire = Paxos_Wire (args.wire_format)  # how our messages go on the wire
+        self.clock = time.time              # current time; the simulator substitutes its virtual clock
+        self.metrics = Paxos_Null_Metrics ()  # what we measure; nothing unless asked to
+        if (args.metrics is not None):
+            self.metrics = Paxos_Metrics (args.metrics, args.metrics_every, lambda: self.clock ())
 
         self.error_cond = False            # some internal error
         
@@ -161,13 +106,39 @@ class Paxos_Proposer ():
         self.sender4accept = None             # used to send accept messages
         self.rcv4learn = None             # used to receive learn messages
 
-        # stores the incoming messages
-        self.msgs = {'acceptor_up': [], 'promise': [], 'learn': []}    # received msgs
-
-        self.defeated = None            # whether our proposal is defeated or not
-        
-        # an object we need for the arguments to send to our thread function
-        self.thr_obj_dict = {'acceptor_up': None, 'promise': None, 'learn': None}  
+        # reactor state for the single decree proposals
+        self.proposals = {}                 # round -> proposal in progress
+        self.early = {}                     # round -> messages that arrived before we started the round
+        self.timers = []                    # heap of (due time, seq, func, args)
+        self.timer_seq = itertools.count () # breaks ties between timers due at the same time
+        self.finished = 0                   # number of proposals done in this run of the reactor
+
+        # Multi Paxos state. A ballot is a [round, proposer id] pair so that ballots of
+        # different proposers never tie, and the log is a sequence of numbered slots
+        self.acceptors = set ()             # names of the acceptors that are up
+        self.ballot = [0, self.proposer_id]   # our current ballot
+        self.leader = False                 # whether a majority promised our ballot
+        self.phase1_start = None            # when we sent the prepare for our ballot
+        self.promises = {}                  # acceptor name -> promise for our ballot
+        self.log = {}                       # slot -> decided value
+        self.first_undecided = 0            # lowest slot not decided yet
+        self.next_slot = 0                  # next slot to assign a value to
+        self.inflight = {}                  # slot -> accept waiting for a majority
+        self.pending = deque ()             # (batch, futures) waiting for a slot
+        self.submitted = queue.Queue ()     # (value, future) submitted but not batched yet
+        self.batch = []                     # the batch being filled
+        self.batch_start = None             # when the first value of the batch arrived
+        self.num_learned = 0                # number of submitted values learned
+
+        # leader lease: every acceptor that replies ok to our ballot grants us a lease counted
+        # from when we sent it the request, and we hold the lease while a majority of them last
+        self.grants = {}                    # acceptor name -> send time of its latest grant
+        self.beats = {}                     # heartbeat seq -> when we sent it
+        self.beat_seq = itertools.count ()  # numbers our heartbeats
+        self.last_beat = 0                  # when we last sent accepts or a heartbeat
+        self.read_barrier = 0               # slots that must be decided before we serve reads
+        self.read_requests = queue.Queue () # (slot, future) of reads waiting for our lease
+        self.waiting_reads = []             # same, taken off the queue
         
     # -----------------------------------------------------------------------
     # Initialize the network connections and the barriers
@@ -175,12 +146,6 @@ class Paxos_Proposer ():
         """Initialize the networking part of the proposer"""
 
         try:
-            # compute the simple majority
-            self.majority = int (self.quorum/2) + 1 # handles both odd and even cases
-
-            # defeated status (start with non defeated)
-            self.defeated = False
-            
             # obtain the ZeroMQ context
             context = zmq.Context()
 
@@ -188,13 +153,15 @@ class Paxos_Proposer ():
             self.poller = zmq.Poller ()
             
             # Socket to send and receive messages. Note, we use the ZMQ divide-conquer
-            # pattern using PUSH and PULL
+            # pattern using PUSH and PULL for whatever the acceptors send us. What we send
+            # goes out on ROUTER sockets, so that it reaches exactly the acceptors we address
+            # by the name (ZMQ routing id) they gave their DEALER sockets.
             #
             #           This is our protocol
             # base port + 0 to pull "I am up" messages from acceptors
-            # base port + 1 to push propose messages to acceptors
+            # base port + 1 to route propose messages to acceptors
             # base port + 2 to pull promise results from acceptors
-            # base port + 3 to push accept messages to acceptors
+            # base port + 3 to route accept messages to acceptors
             # base port + 4 to pull learn messages from acceptors
 
             # first, the barrier messages from all our acceptors (PULL)
@@ -205,12 +172,15 @@ class Paxos_Proposer ():
             print("For acceptors up->proposer PULL, bind addr is: ", bind_addr)
             self.rcv4barrier.bind (bind_addr)
 
-            # next, the propose message (PUSH)
-            self.sender4propose = context.socket (zmq.PUSH)
+            # next, the propose message (ROUTER)
+            self.sender4propose = context.socket (zmq.ROUTER)
             # set high water mark and LINGER option to ensure messages
-            # get sent.
+            # get sent. Sending to an acceptor that is not connected is an error
+            # rather than a silent drop, and a reconnecting acceptor takes over its name
             self.sender4propose.setsockopt (zmq.LINGER, -1)
             self.sender4propose.setsockopt (zmq.SNDHWM, 0)
+            self.sender4propose.setsockopt (zmq.ROUTER_MANDATORY, 1)
+            self.sender4propose.setsockopt (zmq.ROUTER_HANDOVER, 1)
             bind_addr = "tcp://*:" + str (self.baseport+1)
             print("For proposer->acceptor propose message, bind addr is: ", bind_addr)
             self.sender4propose.bind  (bind_addr)
@@ -223,14 +193,15 @@ class Paxos_Proposer ():
             print("For acceptor promise->propose PULL, bind addr is: ", bind_addr)
             self.rcv4promise.bind (bind_addr)
 
-            # finally, the push of accept to acceptors
-            self.sender4accept = context.socket (zmq.PUSH)
-            # set high water mark and LINGER option to ensure messages
-            # get sent.
+            # finally, the routing of accept to acceptors
+            self.sender4accept = context.socket (zmq.ROUTER)
+            # same options as for the propose messages
             self.sender4accept.setsockopt (zmq.LINGER, -1)
             self.sender4accept.setsockopt (zmq.SNDHWM, 0)
+            self.sender4accept.setsockopt (zmq.ROUTER_MANDATORY, 1)
+            self.sender4accept.setsockopt (zmq.ROUTER_HANDOVER, 1)
             bind_addr = "tcp://*:" + str (self.baseport+3)
-            print("For proposer->acceptor accept PUSH, bind addr is: ", bind_addr)
+            print("For proposer->acceptor accept ROUTER, bind addr is: ", bind_addr)
             self.sender4accept.bind  (bind_addr)
 
             # next, the pull the learned value from all acceptors
@@ -272,75 +243,310 @@ class Paxos_Proposer ():
         self.rcv4learn.close (linger=0)
 
         # cleanup all our variables
-        self.num_responders = 0
-        self.msgs['acceptor_up'] = []
-        self.msgs['promise'] = []
-        self.msgs['learn'] = []
-        self.defeated = False
-        self.thr_obj_dict = {'acceptor_up': None, 'promise': None, 'learn': None}  
+        self.reset_round ()
 
     # -----------------------------------------------------------------------
-    # Create the thread-based barrier sink. 
-    def start_paxos_thread (self, op):
-        """Start a barrier thread to ensure all expected replies are received"""
+    # reset only the per round data structures for the next iteration
+    #
+    # The ZMQ context, sockets and poller stay as they are. Each proposal has its
+    # own state and round id, so we only drop what is left over from finished rounds
+    def reset_round (self):
+        """reset per round state"""
+        print ("Proposer::reset_round")
+
+        self.proposals = {}
+        self.early = {}
+        self.timers = []
+
+    ###################################################################
+    # Reactor: run func (*args) after delay secs
+    #
+    # The artificial network delays and the per phase deadlines are all
+    # timers, so nothing ever sleeps and the other proposals keep going
+    ###################################################################
+    def call_later (self, delay, func, *args):
+        """ schedule a timer """
+
+        heapq.heappush (self.timers, (self.clock () + delay, next (self.timer_seq), func, args))
+
+    ###################################################################
+    # Reactor: start the next single decree proposal
+    ###################################################################
+    def new_proposal (self):
+        """ create a proposal for the next round """
 
         try:
-            # The different operations that are possible are: (a) acceptor_up, (b) promise,
-            # and (c) learn
-            if (op == "acceptor_up"):
-                # need to receive response from these many workers
-                cond = self.quorum
-                timer = None
-            elif (op == "promise"):
-                # need to receive response from these many workers
-                cond = self.quorum
-                timer = self.timeout
-            elif (op == "learn"):
-                # need to receive response from these many workers
-                cond = self.quorum
-                timer = self.timeout
-                
+            if (self.workload is not None):
+                prop_num, prop_val = self.workload.proposal (self.round)
             else:
-                print ("bad op in starting paxos thread")
-                raise
-
-            # create the args to send to the thread
-            args = {'op': op, 'cond': cond, 'timeout': timer, 'proposer': self}
+                # obtain some inputs from the user
+                prop_num = self.ask_prop_num ()
             
-            # instantiate a thread obj and start the thread
-            print("Proposer::start_paxos_thread - invoke thread func with args: ", args)
-            self.thr_obj_dict[op] = Paxos_Thread (thread_func, args)
-            self.thr_obj_dict[op].start ()
+                # ask the proposer to decide on a proposal number
+                prop_val = input ("Select some value for the proposal: ")
+
+            proposal = Paxos_Proposal (self.round, prop_num, prop_val)
+            self.round += 1
+            self.proposals[proposal.round] = proposal
+            self.metrics.count ("proposals")
+            print ("^^^^^ Proposer::new_proposal - Start the Process for round {} ^^^^^".format (proposal.round))
+
+            # acceptors may have told us they are up before we got here
+            for op, msg in self.early.pop (proposal.round, []):
+                self.dispatch (op, msg)
 
         except:
-            print("Unexpected error in init_server:", sys.exc_info()[0])
+            print("Unexpected error in new_proposal:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Ask the user for a proposal number until we get one in range
+    #
+    # Anything else would be refused by the binary wire format later on
+    ###################################################################
+    def ask_prop_num (self):
+        """ read a proposal number from the user """
+
+        while True:
+            try:
+                prop_num = int (input ("Select some proposal number between 1 and 10: "))
+                if (1 <= prop_num <= 10):
+                    return prop_num
+            except ValueError:
+                pass
+            print ("Please enter a whole number between 1 and 10")
+
+    ###################################################################
+    # Reactor: a message was received on one of our sockets
+    #
+    # The artificial delay to read it becomes a timer before we look at it
+    ###################################################################
+    def receive (self, op, msg):
+        """ hand the message to dispatch after the artificial delay """
+
+        proposal = self.proposals.get (msg['round'])
+        if (proposal is not None and op in proposal.sent):
+            self.metrics.response (msg['name'], proposal.sent[op])
+
+        delay = random.randint (0, self.delay)
+        print ("Inserting an artificial delay of {} sec before reading {} msg".format (delay, op))
+        self.call_later (delay, self.dispatch, op, msg)
+
+    ###################################################################
+    # Reactor: hand a message to the proposal of its round
+    ###################################################################
+    def dispatch (self, op, msg):
+        """ collect the message for its proposal """
+
+        proposal = self.proposals.get (msg['round'])
+        if (proposal is None):
+            if (msg['round'] >= self.round):
+                # a round we have not started yet; keep it until we do
+                self.early.setdefault (msg['round'], []).append ((op, msg))
+            else:
+                # a late reply from an earlier round is of no use now
+                self.metrics.count ("stale")
+                print ("Proposer::dispatch: discarding {} message from finished round {}".format (op, msg['round']))
+            return
+
+        if (proposal.phase == "learn" and op == "promise" and msg['prop_num'] < proposal.prop_num):
+            # a straggler that promised after we moved on; it can still accept our value
+            self.call_later (random.randint (0, self.delay), self.send_accept_msg, proposal, [msg['name']])
+            return
+
+        if (proposal.phase != op):
+            # a straggler of a phase we already completed without it
+            self.metrics.count ("stale")
+            print ("Proposer::dispatch: discarding {} message in phase {} of round {}".format (op, proposal.phase, proposal.round))
+            return
+
+        proposal.msgs[op].append (msg)
+        if (self.phase_decided (proposal, op, msg)):
+            self.complete_phase (proposal)
+
+    ###################################################################
+    # Reactor: whether the outcome of the phase is known with this message
+    #
+    # We do not wait for the slowest acceptor. A majority of promises or
+    # learns is all we need, and a single promise with an equal or higher
+    # proposal number already means we lost. The barrier still waits for
+    # the whole quorum to be up.
+    ###################################################################
+    def phase_decided (self, proposal, op, msg):
+        """ check the completion condition of the phase """
+
+        if (op == "acceptor_up"):
+            return len (proposal.msgs[op]) >= self.quorum
+
+        if (op == "promise" and msg['prop_num'] >= proposal.prop_num):
+            return True
+
+        return len (proposal.msgs[op]) >= self.majority
+
+    ###################################################################
+    # Reactor: move the proposal into the next phase
+    #
+    # The message of the phase goes out after the artificial delay, and the
+    # phase has its own deadline counted from then.
+    ###################################################################
+    def start_phase (self, proposal, phase, sender):
+        """ send the message of the phase and arm its deadline """
+
+        delay = random.randint (0, self.delay)
+        print ("Inserting an artificial delay of {} sec to mimic n/w delay before sending the msg for the {} phase".format (delay, phase))
+        proposal.phase = phase
+        self.call_later (delay, sender, proposal)
+        self.call_later (delay + self.timeout, self.phase_expired, proposal, phase)
+
+    ###################################################################
+    # Reactor: the deadline of a phase passed
+    ###################################################################
+    def phase_expired (self, proposal, phase):
+        """ complete the phase with whatever we got """
+
+        if (proposal.phase == phase):
+            print ("Proposer::phase_expired: timer expired for {} phase of round {}".format (phase, proposal.round))
+            self.metrics.count ("timeouts")
+            self.complete_phase (proposal)
+
+    ###################################################################
+    # Reactor: all the expected messages of the phase are in, or its
+    # deadline passed
+    ###################################################################
+    def complete_phase (self, proposal):
+        """ process the messages of the phase and move on """
+
+        try:
+            # the barrier phase starts with the proposal, the others when we sent their messages
+            self.metrics.phase (proposal.phase, proposal.sent.get (proposal.phase, proposal.start_time))
+
+            if (proposal.phase == "acceptor_up"):
+                # all acceptors are up, so now send propose message
+                self.start_phase (proposal, "promise", self.send_propose_msg)
+
+            elif (proposal.phase == "promise"):
+                # process the received promise messages
+                self.process_promise_msgs (proposal)
+                if (proposal.defeated):
+                    self.finish_proposal (proposal)
+                else:
+                    # now send accept message
+                    self.start_phase (proposal, "learn", self.send_accept_msg)
+
+            elif (proposal.phase == "learn"):
+                # process the received learn messages
+                self.process_learn_msgs (proposal)
+                self.finish_proposal (proposal)
+
+        except:
+            print("Unexpected error in complete_phase:", sys.exc_info()[0])
             raise
 
+    ###################################################################
+    # Reactor: the proposal is done, one way or the other
+    ###################################################################
+    def finish_proposal (self, proposal):
+        """ retire the proposal """
+
+        if (proposal.defeated):
+            print ("Proposer with proposal number: {} and value: {} is defeated".format (proposal.prop_num, proposal.prop_val))
+        self.metrics.count ("defeats" if proposal.defeated else "decisions")
+        print ("^^^^^ Proposer::finish_proposal - End the Process for round {} ^^^^^".format (proposal.round))
+
+        proposal.phase = "done"
+        del self.proposals[proposal.round]
+        self.finished += 1
+
+        if (self.workload is not None):
+            now = self.clock ()
+            self.workload.record (now - proposal.start_time, not proposal.defeated, now)
+
+    ###################################################################
+    # Reactor: run the given number of single decree proposals
+    #
+    # One poller watches all three receiving sockets. Up to concurrency
+    # proposals are in progress at the same time and every message finds
+    # its proposal by the round id it carries.
+    ###################################################################
+    def run_reactor (self, num_proposals):
+        """ event loop for the single decree proposals """
+
+        try:
+            receivers = {self.rcv4barrier: "acceptor_up", self.rcv4promise: "promise", self.rcv4learn: "learn"}
+            for receiver in receivers:
+                self.poller.register (receiver, zmq.POLLIN)
+
+            started = 0
+            self.finished = 0
+            while (self.finished < num_proposals):
+                while (started < num_proposals and len (self.proposals) < self.concurrency
+                       and (self.workload is None or self.workload.ready (self.clock ()))):
+                    self.new_proposal ()
+                    started += 1
+
+                # sleep in the poller until a message arrives or the next timer is due
+                timeout = None
+                if (self.timers):
+                    timeout = max (0, (self.timers[0][0] - self.clock ()) * 1000)  # msec
+                if (self.workload is not None and started < num_proposals and len (self.proposals) < self.concurrency):
+                    # the next proposal is held back by the rate of the workload
+                    wait = self.workload.wait_time (self.clock ()) * 1000
+                    timeout = wait if timeout is None else min (timeout, wait)
+                events = dict (self.poller.poll (timeout))
+
+                for receiver, op in receivers.items ():
+                    if (receiver in events):
+                        self.drain (receiver, lambda msg, op=op: self.receive (op, msg))
+
+                while (self.timers and self.timers[0][0] <= self.clock ()):
+                    _, _, func, args = heapq.heappop (self.timers)
+                    func (*args)
+
+                self.metrics.tick ()
+
+            for receiver in receivers:
+                self.poller.unregister (receiver)
+
+        except:
+            print("Unexpected error in run_reactor:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # This method sends a message to the named acceptor over a ROUTER socket
+    ###################################################################
+    def send_to (self, sender, name, msg):
+        "route the json object to one acceptor"
+
+        try:
+            sender.send_multipart ([name.encode (), self.wire.encode (msg)])
+        except zmq.ZMQError as e:
+            if (e.errno != zmq.EHOSTUNREACH):
+                raise
+            # the acceptor went away; the deadlines take care of what it does not answer
+            print ("Proposer::send_to: acceptor {} is not connected".format (name))
+
     ###################################################################
     # This method sends propose message to acceptors
     ###################################################################
-    def send_propose_msg (self):
+    def send_propose_msg (self, proposal):
         "create the json object for propose message to be sent to all acceptors"
 
         try:
-            print ("Proposer::send_propose_msg - sending to {} acceptors:".format(self.quorum))
-
-            # create an artificial delay to mimic n/w delay. Earlier, we had this inside the loop but that was
-            # becoming too much.
-            delay = random.randint (0, self.delay)
-            print ("Inserting an artificial delay of {} sec to mimic n/w delay before sending propose msg".format (delay))
-            time.sleep (delay)
-                
-            for i in range (self.quorum):
+            # the acceptors that told us they are up in this round
+            names = [msg['name'] for msg in proposal.msgs['acceptor_up']]
+            print ("Proposer::send_propose_msg - sending to {} acceptors:".format(len (names)))
+            proposal.sent['promise'] = self.clock ()
+
+            for i, name in enumerate (names):
                 propose_msg = {
+                    'round': proposal.round,
                     'id': i,  # this is the id the acceptor gets and must send back
-                    'num': self.prop_num
+                    'num': proposal.prop_num
                 }
 
-                # now send this and one of the acceptors will receive it
-                # according to the PUSH-PULL pattern we are using
-                print ("Proposer::send_propose_msg: sending {} to next acceptor.".format (propose_msg))
-                self.sender4propose.send_json (propose_msg)
+                # now send this to exactly this acceptor
+                print ("Proposer::send_propose_msg: sending {} to acceptor {}.".format (propose_msg, name))
+                self.send_to (self.sender4propose, name, propose_msg)
 
             
         except:
@@ -350,33 +556,27 @@ class Paxos_Proposer ():
     ###################################################################
     # This method sends the accept message to acceptors
     ###################################################################
-    def send_accept_msg (self):
+    def send_accept_msg (self, proposal, names=None):
         "create the json object for accept message to be sent to all acceptors"
 
         try:
-            # technically, we should be sending to only those acceptors who responded to us.
-            # But that logic will become complicated. So we send to all acceptors. The hope is that
-            # an acceptor who was partitioned due to CAP issues is back and gets this, and sees that
-            # it has a higher proposal number will not learn the info, which will be a RED flag for the
-            # system
-            print ("Proposer::send_accept_msg - sending to {} acceptors:".format(self.quorum))
-
-            # create an artificial delay to mimic n/w delay. Earlier, we had this inside the loop but that was
-            # sometimes creating too much delay
-            delay = random.randint (0, self.delay)
-            print ("Inserting an artificial delay of {} sec to mimic n/w delay before sending accept msg".format (delay))
-            time.sleep (delay)
-                
-            for i in range (self.quorum):
+            # we send only to those acceptors who promised to us. An acceptor whose promise
+            # arrives after we moved on to phase 2 gets its accept right then (see dispatch)
+            if (names is None):
+                names = [msg['name'] for msg in proposal.msgs['promise']]
+                proposal.sent['learn'] = self.clock ()
+            print ("Proposer::send_accept_msg - sending to {} acceptors:".format(len (names)))
+
+            for name in names:
                 accept_msg = {
-                    'num': self.prop_num,
-                    'val': self.prop_val
+                    'round': proposal.round,
+                    'num': proposal.prop_num,
+                    'val': proposal.prop_val
                 }
 
-                # now send this and one of the acceptors will receive it
-                # according to the PUSH-PULL pattern we are using
-                print ("Proposer::send_accept_msg: sending {} to next acceptor.".format (accept_msg))
-                self.sender4accept.send_json (accept_msg)
+                # now send this to exactly this acceptor
+                print ("Proposer::send_accept_msg: sending {} to acceptor {}.".format (accept_msg, name))
+                self.send_to (self.sender4accept, name, accept_msg)
 
             
         except:
@@ -392,7 +592,7 @@ class Paxos_Proposer ():
     # if any of the acceptors tells us that they have a higher number, we give up
     #
     ###########################################################
-    def process_promise_msgs (self):
+    def process_promise_msgs (self, proposal):
         """ function to process promise messages """
 
         print ("Proposer::process_promise_msgs")
@@ -401,26 +601,27 @@ class Paxos_Proposer ():
         # is the highest in the system, and that we have received messages from at least a majority
         # if not the entire quorum
 
-        self.num_responders = len (self.msgs['promise'])
-        print ("Proposer::process_promise_msgs - {} number of acceptors out of {} responded".format (self.num_responders, self.quorum))
+        proposal.num_responders = len (proposal.msgs['promise'])
+        print ("Proposer::process_promise_msgs - {} number of acceptors out of {} responded".format (proposal.num_responders, self.quorum))
         
-        if (self.num_responders < self.majority):
-            # we did not receive sufficient number of responses. So cannot proceed
-            print ("==== Proposer::process_promise_msgs: Majority messages not received; Give up :-( =====")
-            self.defeated = True
-            return
-
         # now go thru all the received promises and make sure that the highest promised proposal
-        # number is less than what we have proposed. If any one is higher, we give up
-        for i in range (self.num_responders):
+        # number is less than what we have proposed. If any one is higher, we give up (this is
+        # checked first since a single such promise completes the phase early)
+        for i in range (proposal.num_responders):
             # just for readability, I am using an extra variable here.
-            response = self.msgs['promise'][i]
-            if (response['prop_num'] >= self.prop_num):
+            response = proposal.msgs['promise'][i]
+            if (response['prop_num'] >= proposal.prop_num):
                 # the proposal number reported by this acceptor is equal or higher than ours, give up :-(
                 print ("Proposer::process_promise_msgs: Acceptor {} has higher or equal proposal number = {}; Give up :-(".format (response['id'], response['prop_num']))
-                self.defeated = True
+                proposal.defeated = True
                 return
 
+        if (proposal.num_responders < self.majority):
+            # we did not receive sufficient number of responses. So cannot proceed
+            print ("==== Proposer::process_promise_msgs: Majority messages not received; Give up :-( =====")
+            proposal.defeated = True
+            return
+
         # if we reach here, then we are in great shape :-)
         print ("==== Proposer::process_promise_msgs: Our proposal number was the highest :-). Proceed with Phase 2. ====")
 
@@ -432,7 +633,7 @@ class Paxos_Proposer ():
     # at which point we declare victory
     #
     ###########################################################
-    def process_learn_msgs (self):
+    def process_learn_msgs (self, proposal):
         """ function to process learn messages """
 
         # Note that we are implementing this learn part using our interpretation. The Paxos approach
@@ -443,18 +644,18 @@ class Paxos_Proposer ():
         
         print("Proposer::process_learn_msgs")
 
-        # here we check if all the acceptors who responded have learned the value or not
-        if (len (self.msgs['learn']) < self.num_responders):
+        # here we check if a majority of the acceptors has learned the value or not
+        if (len (proposal.msgs['learn']) < self.majority):
             # we did not receive sufficient number of responses. So cannot proceed
-            print ("==== Proposer::process_learn_msgs: Did not receive learn confirmation from all responders; Give up :-( on proposal num {} with value {} ===".format (self.prop_num, self.prop_val))
-            self.defeated = True
+            print ("==== Proposer::process_learn_msgs: Did not receive learn confirmation from a majority; Give up :-( on proposal num {} with value {} ===".format (proposal.prop_num, proposal.prop_val))
+            proposal.defeated = True
         else:
             # technically, we should make sure that majority of values learned are the same but here we
             # assume they will be.
-            print (":-) :-) :-) Proposer::process_learn_msgs: Proposal num {} with value {} has been learned :-) :-) :-)".format (self.prop_num, self.prop_val))
+            print (":-) :-) :-) Proposer::process_learn_msgs: Proposal num {} with value {} has been learned :-) :-) :-)".format (proposal.prop_num, proposal.prop_val))
 
     #####################################################################
-    # The method starts the single decree Paxos algorithm
+    # The method runs the single decree Paxos algorithm once
     # 
     # This is the main "driver" function for the proposer logic.
     #####################################################################
@@ -462,68 +663,562 @@ class Paxos_Proposer ():
         """ Start the Paxos single decree consensus """
 
         try:
-            print ("^^^^^ Proposer::single_decree_consensus - Start the Process ^^^^^")
-            # obtain some inputs from the user
-            self.prop_num = input ("Select some proposal number between 1 and 10: ")
-            
-            # ask the proposer to decide on a proposal number
-            self.prop_val = input ("Select some value for the proposal: ")
-            
-            # start the paxos thread so we can wait for the acceptors to be up
-            print ("Proposer::single_decree_consensus - start thread for acceptors to join: ")
-            self.start_paxos_thread ("acceptor_up")
-            
-            # wait for thread to exit to ensure all acceptors are up
-            print ("Proposer::single_decree_consensus - wait for thread to exit")
-            self.thr_obj_dict["acceptor_up"].join ()
+            self.run_reactor (1)
+        except:
+            print("Unexpected error in single_decree_consensus method:", sys.exc_info()[0])
+            raise
 
-            # now send propose message
-            print ("Proposer::single_decree_consensus - send_propose_msg")
-            self.send_propose_msg ()
-            
-            # start the paxos thread so we can wait for the acceptors to be up
-            print ("Proposer::single_decree_consensus - start thread for acceptors to send promise msg")
-            self.start_paxos_thread ("promise")
-            
-            # wait for thread to exit. We provide a timeout to join so that replies are expected prior
-            # to that
-            print ("Proposer::single_decree_consensus - wait for promise thread to exit")
-            #self.thr_obj_dict["promise"].join (self.timeout)
-            self.thr_obj_dict["promise"].join ()
-
-            # process the received promise messages
-            print ("Proposer::single_decree_consensus - process_promise_msg")
-            self.process_promise_msgs ()
-            
-            if self.defeated:
-                print ("Proposer with proposal number: {} and value: {} is defeated".format (self.prop_num, self.prop_val))
+    ###################################################################
+    # Multi Paxos: wait until our quorum of acceptors is up
+    #
+    # Unlike the single decree case we do this only once since the sockets
+    # stay up for the whole run
+    ###################################################################
+    def wait_for_acceptors (self):
+        """ wait for the up message of every acceptor """
+
+        try:
+            print ("Proposer::wait_for_acceptors - waiting for {} acceptors".format (self.quorum))
+            while (len (self.acceptors) < self.quorum):
+                msg = self.wire.decode (self.rcv4barrier.recv ())
+                self.acceptors.add (msg['name'])
+                print ("Proposer::wait_for_acceptors - acceptor {} is up".format (msg['name']))
+
+        except:
+            print("Unexpected error in wait_for_acceptors:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Multi Paxos: an acceptor (re)started while we run
+    #
+    # Acceptors repeat their up message while idle, so most of these are
+    # acceptors we know. A new name (e.g., a restarted acceptor without -n)
+    # is addressed by our prepares and retries from now on, and if we are
+    # leader it gets our prepare right away, since accepts only go to the
+    # acceptors that promised our ballot.
+    ###################################################################
+    def handle_acceptor_up (self, msg):
+        """ process an up message after the start """
+
+        try:
+            if (msg['name'] not in self.acceptors):
+                print ("Proposer::handle_acceptor_up - acceptor {} joined".format (msg['name']))
+                self.acceptors.add (msg['name'])
+
+            if (self.leader and msg['name'] not in self.promises):
+                prepare_msg = {
+                    'ballot': self.ballot,
+                    'slot': self.first_undecided
+                }
+                self.send_to (self.sender4propose, msg['name'], prepare_msg)
+
+        except:
+            print("Unexpected error in handle_acceptor_up:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Multi Paxos: values we want the log to hold
+    ###################################################################
+    def gen_values (self):
+        """ values to propose, one per iteration """
+
+        if (self.workload is not None):
+            return [self.workload.value (i) for i in range (self.iters)]
+        return ["{}-{}".format (self.proposer_id, i) for i in range (self.iters)]
+
+    ###################################################################
+    # Multi Paxos: submit a value to be committed to the log
+    #
+    # Can be called from any thread. Values are committed in batches, and
+    # the returned future resolves to the slot of the batch once it is
+    # learned.
+    ###################################################################
+    def submit (self, val):
+        """ queue a value for the log """
+
+        future = Future ()
+        self.submitted.put ((val, future))
+        return future
+
+    ###################################################################
+    # Multi Paxos: move submitted values into batches
+    #
+    # A batch is ready for a slot once it holds batch_size values or its
+    # first value has waited linger secs, whichever comes first.
+    ###################################################################
+    def collect_batches (self):
+        """ fill the batch and queue it when it is ready """
+
+        while True:
+            try:
+                val, future = self.submitted.get_nowait ()
+            except queue.Empty:
+                break
+
+            if (not self.batch):
+                self.batch_start = self.clock ()
+            self.batch.append ((val, future))
+            if (len (self.batch) >= self.batch_size):
+                self.flush_batch ()
+
+        if (self.batch and self.clock () - self.batch_start >= self.linger):
+            self.flush_batch ()
+
+    ###################################################################
+    # Multi Paxos: the batch waits for a slot
+    ###################################################################
+    def flush_batch (self):
+        """ queue the batch for a slot """
+
+        self.pending.append (([val for val, _ in self.batch], [future for _, future in self.batch]))
+        self.batch = []
+
+    ###################################################################
+    # Multi Paxos: phase 1 with a new ballot
+    #
+    # The prepare covers every slot from the first undecided one onwards,
+    # so once it succeeds we are the leader for all future slots and
+    # phase 1 is skipped until some other proposer takes over.
+    ###################################################################
+    def start_phase1 (self, higher=None):
+        """ send prepare for a ballot above ours and above higher """
+
+        try:
+            rnd = self.ballot[0]
+            if (higher is not None):
+                rnd = max (rnd, higher[0])
+            self.ballot = [rnd + 1, self.proposer_id]
+            self.leader = False
+            self.promises = {}
+            self.grants = {}
+            self.phase1_start = self.clock ()
+
+            print ("Proposer::start_phase1 - prepare ballot {} from slot {}".format (self.ballot, self.first_undecided))
+            prepare_msg = {
+                'ballot': self.ballot,
+                'slot': self.first_undecided
+            }
+            for name in self.acceptors:
+                self.send_to (self.sender4propose, name, prepare_msg)
+
+        except:
+            print("Unexpected error in start_phase1:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Multi Paxos: handle one promise (or rejection) of our prepare
+    ###################################################################
+    def handle_promise (self, msg):
+        """ process a promise message """
+
+        if (msg['ballot'] != self.ballot):
+            # a late reply to an older prepare
+            self.metrics.count ("stale")
+            return
+
+        self.metrics.response (msg['name'], self.phase1_start)
+
+        if (self.leader):
+            # we already have our majority, but from now on this acceptor gets our accepts too
+            if (msg['ok']):
+                self.promises[msg['name']] = msg
+                self.grant (msg['name'], self.phase1_start)
+            return
+
+        if (not msg['ok']):
+            # the acceptor promised a higher ballot to someone else; outbid it
+            print ("Proposer::handle_promise - acceptor {} promised higher ballot {}".format (msg['name'], msg['promised']))
+            self.metrics.count ("defeats")
+            self.start_phase1 (msg['promised'])
+            return
+
+        self.promises[msg['name']] = msg
+        self.grant (msg['name'], self.phase1_start)
+        if (len (self.promises) >= self.majority):
+            self.become_leader ()
+
+    ###################################################################
+    # Multi Paxos: a majority promised our ballot
+    #
+    # Any value that might have been chosen under an older ballot must be
+    # proposed again in its slot, so for every slot reported by the promises
+    # we take the value accepted with the highest ballot. Slots left empty
+    # below the highest reported one are filled with a no-op (None).
+    #
+    # Slots below the low-water mark reported by any acceptor were decided
+    # by an earlier leader and may already be dropped by the acceptors, so
+    # we must not take them for empty ones. We skip them; their values are
+    # in the log of that leader, and read as None here.
+    ###################################################################
+    def become_leader (self):
+        """ recover the reported slots and start phase 2 """
+
+        try:
+            print ("Proposer::become_leader - elected with ballot {}".format (self.ballot))
+            self.leader = True
+            self.metrics.phase ("prepare", self.phase1_start)
+
+            low = max (promise['low'] for promise in self.promises.values ())
+            if (low > self.first_undecided):
+                print ("Proposer::become_leader - slots {} to {} were decided by an earlier leader".format (self.first_undecided, low - 1))
+                self.first_undecided = low
+                self.next_slot = max (self.next_slot, low)
+                while (self.first_undecided in self.log):
+                    self.first_undecided += 1
+
+            recovered = {}
+            for promise in self.promises.values ():
+                for slot, ballot, val in promise['accepted']:
+                    if (slot >= low and slot not in self.log and (slot not in recovered or ballot > recovered[slot][0])):
+                        recovered[slot] = (ballot, val)
+
+            # our own in-flight accepts that nobody reported are simply sent again with
+            # the new ballot; if another value took the slot ours goes back in the queue
+            futures = {}
+            for slot in sorted (self.inflight, reverse=True):
+                entry = self.inflight[slot]
+                if (slot < low):
+                    # we cannot tell which value was decided there, so ours is proposed again
+                    self.pending.appendleft ((entry['val'], entry['futures']))
+                    continue
+                if (slot not in recovered):
+                    recovered[slot] = (None, entry['val'])
+                if (recovered[slot][1] == entry['val']):
+                    futures[slot] = entry['futures']
+                else:
+                    self.pending.appendleft ((entry['val'], entry['futures']))
+            self.inflight = {}
+
+            if (recovered):
+                self.next_slot = max (self.next_slot, max (recovered) + 1)
+            # an earlier leader may have told its clients about any of these slots, so we
+            # serve no reads before we know their values too
+            self.read_barrier = self.next_slot
+            for slot in range (self.first_undecided, self.next_slot):
+                if (slot not in self.log):
+                    self.send_accept_slot (slot, recovered.get (slot, (None, None))[1], futures.get (slot, []))
+
+        except:
+            print("Unexpected error in become_leader:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Multi Paxos: send the accept for one slot
+    #
+    # Accepts go to the acceptors that promised our ballot, unless they are
+    # a retry after a timeout, which goes to every acceptor we know.
+    ###################################################################
+    def send_accept_slot (self, slot, val, futures, names=None):
+        """ phase 2 for a single slot """
+
+        try:
+            # a lease granted by an ack counts from our first send, which may be earlier
+            # than the one the acceptor got
+            now = self.clock ()
+            first_sent = now
+            if (slot in self.inflight and self.inflight[slot]['ballot'] == self.ballot):
+                first_sent = self.inflight[slot]['first_sent']
+            self.inflight[slot] = {'val': val, 'futures': futures, 'acks': set (), 'sent': now,
+                                   'first_sent': first_sent, 'ballot': self.ballot}
+            self.last_beat = now
+            accept_msg = {
+                'ballot': self.ballot,
+                'slot': slot,
+                'val': val,
+                'low': self.first_undecided     # every slot below it is decided
+            }
+            if (names is None):
+                names = self.promises
+            for name in names:
+                self.send_to (self.sender4accept, name, accept_msg)
+
+        except:
+            print("Unexpected error in send_accept_slot:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Multi Paxos: keep up to window accepts in flight
+    ###################################################################
+    def fill_window (self):
+        """ assign slots to pending batches """
+
+        while (self.leader and self.pending and len (self.inflight) < self.window):
+            self.send_accept_slot (self.next_slot, *self.pending.popleft ())
+            self.next_slot += 1
+
+    ###################################################################
+    # Multi Paxos: handle one accepted (or rejected) message
+    ###################################################################
+    def handle_accepted (self, msg):
+        """ process a learn message """
+
+        if (not msg['ok']):
+            if (msg['promised'] > self.ballot):
+                # some other proposer took over; we have to run phase 1 again
+                print ("Proposer::handle_accepted - acceptor {} promised higher ballot {}".format (msg['name'], msg['promised']))
+                self.metrics.count ("defeats")
+                self.start_phase1 (msg['promised'])
+            return
+
+        if ('beat' in msg):
+            # the ack of a heartbeat only renews our lease
+            if (msg['ballot'] == self.ballot and msg['beat'] in self.beats):
+                self.metrics.response (msg['name'], self.beats[msg['beat']])
+                self.grant (msg['name'], self.beats[msg['beat']])
+            return
+
+        entry = self.inflight.get (msg['slot'])
+        if (msg['ballot'] != self.ballot or entry is None):
+            # late reply for an older ballot or an already decided slot
+            self.metrics.count ("stale")
+            return
+
+        self.metrics.response (msg['name'], entry['sent'])
+        self.grant (msg['name'], entry['first_sent'])
+        entry['acks'].add (msg['name'])
+        if (len (entry['acks']) >= self.majority):
+            self.decide (msg['slot'])
+
+    ###################################################################
+    # Multi Paxos: a majority accepted the value of the slot
+    ###################################################################
+    def decide (self, slot):
+        """ record the chosen value """
+
+        entry = self.inflight.pop (slot)
+        self.log[slot] = entry['val']
+        self.metrics.phase ("accept", entry['first_sent'])
+        self.metrics.count ("decisions")
+        for future in entry['futures']:
+            future.set_result (slot)
+        self.num_learned += len (entry['futures'])
+
+        while (self.first_undecided in self.log):
+            self.first_undecided += 1
+
+        if (len (self.log) % 100 == 0):
+            print ("Proposer::decide - {} slots decided".format (len (self.log)))
+
+    ###################################################################
+    # Multi Paxos: redo whatever did not complete within the timeout
+    ###################################################################
+    def check_timeouts (self):
+        """ retry phase 1 or the accepts that timed out """
+
+        now = self.clock ()
+        if (not self.leader):
+            if (now - self.phase1_start > self.timeout):
+                print ("Proposer::check_timeouts - prepare for ballot {} timed out".format (self.ballot))
+                self.metrics.count ("timeouts")
+                self.start_phase1 ()
+            return
+
+        for slot in [slot for slot, entry in self.inflight.items () if now - entry['sent'] > self.timeout]:
+            print ("Proposer::check_timeouts - accept for slot {} timed out, resending".format (slot))
+            self.metrics.count ("timeouts")
+            self.send_accept_slot (slot, self.inflight[slot]['val'], self.inflight[slot]['futures'], self.acceptors)
+
+    ###################################################################
+    # Multi Paxos: an acceptor granted us a lease with the request we sent
+    # at the given time
+    ###################################################################
+    def grant (self, name, sent):
+        """ note the lease granted by the acceptor """
+
+        if (self.lease):
+            self.grants[name] = max (self.grants.get (name, 0), sent)
+
+    ###################################################################
+    # Multi Paxos: whether we hold the leader lease
+    #
+    # No other proposer can become leader before the grants of a majority
+    # run out, and until then every value chosen is chosen by us, so our
+    # log (once it is complete up to the read barrier) is the truth.
+    ###################################################################
+    def lease_valid (self, now):
+        """ check our lease """
+
+        if (not self.lease or not self.leader or self.first_undecided < self.read_barrier):
+            return False
+
+        grants = sorted (self.grants.values (), reverse=True)
+        if (len (grants) < self.majority):
+            return False
+        return now < grants[self.majority-1] + self.lease * (1 - Paxos_Proposer.lease_drift)
+
+    ###################################################################
+    # Multi Paxos: renew our lease
+    #
+    # Every accept renews the lease with the acceptors that ack it, so a
+    # heartbeat is only sent when we have had no accepts to send for a
+    # third of the lease.
+    ###################################################################
+    def send_heartbeat (self):
+        """ heartbeat to all acceptors if we have been quiet """
+
+        try:
+            now = self.clock ()
+            if (not self.lease or not self.leader or now - self.last_beat < self.lease / 3):
                 return
-            
-            # now send accept message
-            print ("Proposer::single_decree_consensus - send_accept_msg")
-            self.send_accept_msg ()
-            
-            # start the paxos thread so we can wait for the acceptors to learn
-            print ("Proposer::single_decree_consensus - start thread for acceptors to send learn msg")
-            self.start_paxos_thread ("learn")
-            
-            # wait for thread to exit. We provide a timeout to join so that replies are expected prior
-            # to that
-            print ("Proposer::single_decree_consensus - wait for learn thread to exit")
-            #self.thr_obj_dict["learn"].join (self.timeout)
-            self.thr_obj_dict["learn"].join ()
-
-            # process the received learn messages
-            print ("Proposer::single_decree_consensus - process_learn_msg")
-            self.process_learn_msgs ()
-
-            if self.defeated:
-                print ("Proposer with proposal number: {} and value: {} is defeated".format (self.prop_num, self.prop_val))
+
+            # acks to heartbeats older than a lease are of no use anymore
+            self.beats = {beat: sent for beat, sent in self.beats.items () if now - sent < self.lease}
+            beat = next (self.beat_seq)
+            self.beats[beat] = now
+            self.last_beat = now
+
+            heartbeat_msg = {
+                'ballot': self.ballot,
+                'beat': beat,
+                'low': self.first_undecided
+            }
+            for name in self.acceptors:
+                self.send_to (self.sender4accept, name, heartbeat_msg)
+
+        except:
+            print("Unexpected error in send_heartbeat:", sys.exc_info()[0])
+            raise
+
+    ###################################################################
+    # Multi Paxos: read the value learned in a slot
+    #
+    # Can be called from any thread. While we hold the lease the returned
+    # future is resolved right away from our log, else once we hold it
+    # again. It resolves to None if nothing (or a no-op) was decided in the
+    # slot.
+    ###################################################################
+    def read (self, slot):
+        """ linearizable read of a slot """
+
+        future = Future ()
+        if (self.lease_valid (self.clock ())):
+            future.set_result (self.log.get (slot))
+        else:
+            self.read_requests.put ((slot, future))
+        return future
+
+    ###################################################################
+    # Multi Paxos: serve the reads that waited for our lease
+    ###################################################################
+    def serve_reads (self):
+        """ resolve the waiting reads if we hold the lease """
+
+        while True:
+            try:
+                self.waiting_reads.append (self.read_requests.get_nowait ())
+            except queue.Empty:
+                break
+
+        if (self.waiting_reads and self.lease_valid (self.clock ())):
+            for slot, future in self.waiting_reads:
+                future.set_result (self.log.get (slot))
+            self.waiting_reads = []
+
+    ###################################################################
+    # Receive everything that is queued on a socket
+    ###################################################################
+    def drain (self, receiver, handler):
+        """ hand every queued message to the handler without blocking """
+
+        while True:
+            try:
+                msg = self.wire.decode (receiver.recv (zmq.NOBLOCK))
+            except zmq.Again:
                 return
-            
-            print ("^^^^^ Proposer::single_decree_consensus - End the Process ^^^^^")
+            handler (msg)
+
+    #####################################################################
+    # Multi Paxos: one pass of our event loop
+    #####################################################################
+    def run_once (self):
+        """ handle whatever arrived and whatever is due """
+
+        self.collect_batches ()
+        events = dict (self.poller.poll (10))  # msec; so we get to the batches and timeouts
+        if (self.rcv4barrier in events):
+            self.drain (self.rcv4barrier, self.handle_acceptor_up)
+        if (self.rcv4promise in events):
+            self.drain (self.rcv4promise, self.handle_promise)
+        if (self.rcv4learn in events):
+            self.drain (self.rcv4learn, self.handle_accepted)
+        self.housekeeping ()
+
+    #####################################################################
+    # Multi Paxos: whatever is due after the messages are handled
+    #####################################################################
+    def housekeeping (self):
+        """ retries, new accepts, heartbeats and reads """
+
+        self.check_timeouts ()
+        self.fill_window ()
+        self.send_heartbeat ()
+        self.serve_reads ()
+        self.metrics.tick ()
+
+    #####################################################################
+    # The method runs Multi Paxos until all our values are in the log
+    #
+    # Phase 1 runs once to elect us, after which every batch of values only
+    # needs phase 2. Up to window slots are in flight at the same time. There
+    # are no artificial delays here since they would serialize the pipeline.
+    #####################################################################
+    def multi_paxos_consensus (self):
+        """ Start the Multi Paxos consensus """
+
+        try:
+            print ("^^^^^ Proposer::multi_paxos_consensus - Start the Process ^^^^^")
+            values = self.gen_values ()
+            futures = []
+            start_time = self.clock ()
+
+            self.start_phase1 ()
+            while (len (futures) < len (values) or self.num_learned < len (futures) or self.inflight):
+                # values are submitted all at once, or at the rate of the workload
+                while (len (futures) < len (values) and (self.workload is None or self.workload.ready (self.clock ()))):
+                    futures.append (self.submit (values[len (futures)]))
+                    if (self.workload is not None):
+                        futures[-1].add_done_callback (lambda future, start=self.clock (): self.workload.record (self.clock () - start, True, self.clock ()))
+
+                self.run_once ()
+
+            elapsed_time = self.clock () - start_time
+            print ("^^^^^ Proposer::multi_paxos_consensus - {} values in {} slots decided in {:.3f} sec, {:.1f} values/sec ^^^^^".format (self.num_learned, len (self.log), elapsed_time, self.num_learned / elapsed_time))
+
+            if (self.lease):
+                # read the whole log back; under our lease this needs no messages at all
+                start_time = self.clock ()
+                reads = [self.read (slot) for slot in range (self.first_undecided)]
+                while (not all (future.done () for future in reads) and self.clock () - start_time < self.timeout):
+                    self.run_once ()
+                elapsed_time = self.clock () - start_time
+                num_read = sum (1 for future in reads if future.done ())
+                print ("^^^^^ Proposer::multi_paxos_consensus - {} of {} slots read in {:.3f} msec, {:.2f} usec per read ^^^^^".format (num_read, len (reads), elapsed_time * 1000, elapsed_time * 1e6 / max (1, num_read)))
+
         except:
-            print("Unexpected error in single_decree_consensus method:", sys.exc_info()[0])
+            print("Unexpected error in multi_paxos_consensus method:", sys.exc_info()[0])
+            raise
+
+    ############################################################
+    # Run Multi Paxos over one set of long-lived sockets
+    ############################################################
+    def run_multi_paxos (self):
+        """Run the Multi Paxos consensus"""
+
+        try:
+            print("Proposer::run_multi_paxos - initialize proposer")
+            self.init_proposer ()
+            self.poller.register (self.rcv4promise, zmq.POLLIN)
+            self.poller.register (self.rcv4learn, zmq.POLLIN)
+
+            self.wait_for_acceptors ()
+            # acceptors keep saying they are up, and some may join (or rejoin) later
+            self.poller.register (self.rcv4barrier, zmq.POLLIN)
+            self.multi_paxos_consensus ()
+
+            print("Proposer::run_multi_paxos - cleanup")
+            self.reset_proposer ()
+        except:
+            print("Unexpected error in run_multi_paxos method:", sys.exc_info()[0])
             raise
 
     ############################################################
@@ -535,6 +1230,19 @@ class Paxos_Proposer ():
         try:
             ############  the real work starts now ###########
 
+            # in round reset mode the sockets are created once and outlive all the iterations,
+            # and the reactor runs all of them, up to concurrency at a time
+            if (self.round_reset):
+                print("Proposer::run_paxos_iterations - initialize proposer once")
+                self.init_proposer ()
+
+                print("Proposer::run_paxos_iterations - run all single decree rounds")
+                self.run_reactor (self.iters)
+
+                print("Proposer::run_paxos_iterations - cleanup")
+                self.reset_proposer ()
+                return
+
             for i in range (self.iters):
                 print ("****** Next iteration of Proposer ************")
             
@@ -556,8 +1264,8 @@ class Paxos_Proposer ():
 ##################################
 # Command line parsing
 ##################################
-def parseCmdLineArgs ():
-    # parse the command line
+def parseCmdLineArgs (argv=None):
+    # parse the command line (or the given list of arguments, as the simulator does)
     parser = argparse.ArgumentParser ()
 
     # add optional arguments
@@ -565,10 +1273,27 @@ def parseCmdLineArgs ():
     parser.add_argument ("-q", "--quorum", type=int, default=3, help="Quorum of acceptors, default 3")
     parser.add_argument ("-t", "--timeout", type=int, default=10, help="Timeout to receive responses in sec, default 10 sec")
     parser.add_argument ("-d", "--delay", type=int, default=5, help="Artificial delay to mimic n/w delays, default of max 5 sec")
-    parser.add_argument ("-i", "--iters", type=int, default=5, help="Number of iterations, default 5")
+    parser.add_argument ("-i", "--iters", type=int, default=5, help="Number of iterations (number of values in multi mode), default 5")
+    parser.add_argument ("-r", "--round_reset", action="store_true", help="Keep the sockets between single decree iterations and only reset the per round state")
+    parser.add_argument ("-c", "--concurrency", type=int, default=1, help="Max number of single decree rounds in progress at the same time in round reset mode, default 1")
+    parser.add_argument ("-m", "--mode", choices=["single", "multi"], default="single", help="Single decree Paxos per iteration or Multi Paxos with a stable leader, default single")
+    parser.add_argument ("-w", "--window", type=int, default=10, help="Max number of in-flight accepts in multi mode, default 10")
+    parser.add_argument ("-b", "--batch_size", type=int, default=1, help="Max number of values committed in one slot in multi mode, default 1")
+    parser.add_argument ("-l", "--linger", type=float, default=5, help="Max msec a value waits for its batch to fill up in multi mode, default 5")
+    parser.add_argument ("-g", "--generate", action="store_true", help="Take proposal numbers and values from the workload below instead of asking the user")
+    parser.add_argument ("--rate", type=float, default=0, help="Workload: proposals (values in multi mode) started per sec, default 0 (as fast as possible)")
+    parser.add_argument ("--value_size", type=int, default=16, help="Workload: number of characters per value, default 16")
+    parser.add_argument ("--competitors", type=int, default=0, help="Workload: number of competing proposers, default 0")
+    parser.add_argument ("--seed", type=int, default=1, help="Workload: seed of the random numbers, must match the acceptors, default 1")
+    parser.add_argument ("-o", "--csv_file", default="paxos_latency.csv", help="Workload: CSV file the latency histogram is appended to, default paxos_latency.csv")
+    parser.add_argument ("-n", "--proposer_id", type=int, default=1, help="Id of this proposer, used in the ballots of multi mode, default 1")
+    parser.add_argument ("-f", "--wire_format", choices=["json", "binary"], default="json", help="Encoding of the messages, must match the acceptors, default json")
+    parser.add_argument ("-e", "--lease", type=float, default=0, help="Msec a leader lease lasts in multi mode, must match the acceptors, default 0 (no leases, no local reads)")
+    parser.add_argument ("-x", "--metrics", default=None, help="File the phase timings, response times and counters are appended to, as CSV if it ends in .csv and JSON lines otherwise, default none")
+    parser.add_argument ("--metrics_every", type=float, default=1, help="Secs between snapshots of the metrics, default 1")
     
     # parse the args
-    args = parser.parse_args ()
+    args = parser.parse_args (argv)
 
     return args
     
@@ -590,8 +1315,20 @@ def main ():
     proposer = Paxos_Proposer (parsed_args)
 
     # start the iterations
-    print ("Paxos Proposer Main: run the iterations")
-    proposer.run_paxos_iterations ()
+    if (parsed_args.mode == "multi"):
+        print ("Paxos Proposer Main: run multi paxos")
+        proposer.run_multi_paxos ()
+    else:
+        print ("Paxos Proposer Main: run the iterations")
+        proposer.run_paxos_iterations ()
+
+    # save the measurements of the workload
+    if (proposer.workload is not None):
+        print ("Paxos Proposer Main: save the latency histogram")
+        proposer.workload.write_csv (parsed_args.csv_file)
+
+    # and the final snapshot of the metrics
+    proposer.metrics.close ()
 
 #----------------------------------------------
 if __name__ == '__main__':
@@ -14,16 +14,140 @@
 #
 # Instead of 64, we try 48 and at least the multiple runs of this did not show any collisions with
 # a 48 bit hash. So this may be an attractive hash function to use for PA2 that is going to use Chord.
+#
+# The original "iterative" mode generates one string at a time and remembers it in a dictionary,
+# which becomes very slow and memory hungry for large numbers of iterations. So we also provide
+# a "batch" mode where every id is represented by a single integer (its position in our id space),
+# the ids are generated and hashed in chunks, and collisions are found by sorting a NumPy array
+# of hash values rather than looking them up in a dictionary.
 
 import os
+import math # for the analytical estimate
 import random # random number generation
 import hashlib  # for the secure hash library
 import argparse # argument parsing
 import logging # for logging. Use it in place of print statements.
 
+import multiprocessing # for the process pool used by the sweep
+
+try:
+  import numpy as np  # for the array-based batch, exhaustive, sweep and estimate modes
+except ImportError:
+  np = None  # the iterative mode does not need it
+
+from hash_ring import hash_func # the hash function shared with the generator and our ring
+
+##################################
+#
+# Helper functions used by the batch mode
+#
+# An id like disc3:10.0.0.5:5555 is encoded as a single integer (which we call a code)
+# using mixed radix notation: prefix, entity num, host num and port are its digits.
+# This way duplicates can be eliminated by cheaply sorting integers.
+#
+##################################
+
+#################
+# convert an array of codes to the actual id strings
+#################
+def codes2ids (codes, num_entities, num_hosts, lower_port, num_ports):
+  # peel off the digits starting with the least significant one
+  codes, port = np.divmod (codes, np.uint64 (num_ports))
+  codes, host = np.divmod (codes, np.uint64 (num_hosts))
+  prefix, entity = np.divmod (codes, np.uint64 (num_entities))
+
+  # now build the strings exactly like the iterative mode does
+  return [HashCollisionTester.prefixes[p] + str (e + 1) + ":10.0.0." + str (h + 1) + ":" + str (lower_port + r)
+          for p, e, h, r in zip (prefix.tolist (), entity.tolist (), host.tolist (), port.tolist ())]
+
+#################
+# hash a list of id strings
+#
+# We keep the upper 64 bits of the sha256 digest, i.e., the first 8 bytes in big endian
+# order. Any smaller hash width is then just a right shift of this value.
+#################
+def hash_ids (ids):
+  digests = b"".join ([hashlib.sha256 (bytes (id, "utf-8")).digest ()[:8] for id in ids])
+  return np.frombuffer (digests, dtype=">u8").astype (np.uint64)
+
+#################
+# hash one chunk of codes
+#
+# This is the unit of work handed to our process pool, so it must be a module level
+# function. The task is a tuple of the codes and the configuration needed to build ids.
+#################
+def hash_chunk (task):
+  codes, num_entities, num_hosts, lower_port, num_ports = task
+  return hash_ids (codes2ids (codes, num_entities, num_hosts, lower_port, num_ports))
+
+#################
+# same as above but returns the hash values sorted (a shard of the final sorted array)
+#################
+def hash_sorted_shard (task):
+  return np.sort (hash_chunk (task))
+
+#################
+# hash a contiguous range of codes [start, stop)
+#
+# Used by the exhaustive mode, where the task carries just the bounds so that the
+# codes never need to be materialized in (or shipped from) the parent process.
+# Returns the truncated hash values sorted, along with the codes in the same order.
+#################
+def hash_range (task):
+  start, stop, num_entities, num_hosts, lower_port, num_ports, bits_hash = task
+  codes = np.arange (start, stop, dtype=np.uint64)
+  hashes = truncate (hash_ids (codes2ids (codes, num_entities, num_hosts, lower_port, num_ports)), bits_hash)
+  order = np.argsort (hashes, kind="stable")
+  return hashes[order], codes[order]
+
+#################
+# truncate 64 bit hash values to the desired number of bits
+#################
+def truncate (hashes, bits_hash):
+  return hashes >> np.uint64 (64 - bits_hash)
+
+#################
+# sort an array and drop the duplicates
+#
+# equivalent to np.unique but we do it ourselves with a plain sort, which is
+# considerably faster for large integer arrays
+#################
+def sorted_unique (values):
+  values = np.sort (values)
+  if values.size:
+    keep = np.empty (values.size, dtype=bool)
+    keep[0] = True
+    np.not_equal (values[1:], values[:-1], out=keep[1:])
+    values = values[keep]
+  return values
+
+#################
+# analytical (birthday bound) estimate of the number of collisions
+#
+# When n distinct ids are thrown into m = 2^bits buckets, the expected number of
+# occupied buckets is m (1 - (1 - 1/m)^n), and every other id is a collision the
+# way we count them. When n^2/m is tiny that difference suffers from cancellation,
+# so we use the usual n(n-1)/2m approximation instead.
+#################
+def expected_collisions (n, bits_hash):
+  m = float (2 ** bits_hash)
+  if (n * n / m < 1e-3):
+    return n * (n - 1) / (2 * m)
+  return n + m * math.expm1 (n * math.log1p (-1 / m))
+
+#################
+# count collisions in a sorted array of hash values
+#
+# every entry that is equal to its predecessor is a collision
+#################
+def count_collisions (sorted_hashes):
+  return int (np.count_nonzero (sorted_hashes[1:] == sorted_hashes[:-1]))
+
 class HashCollisionTester ():
   # This is a class variable
   prefixes = ["pub", "sub", "disc"]  # our ids always start with one of these
+  widths = [8, 16, 24, 32, 40, 48, 56, 64]  # hash widths we support
+  bytes_per_id = 40  # peak memory per id when the whole space is held and sorted
 
   #################
   # constructor
@@ -38,6 +162,14 @@ class HashCollisionTester ():
     self.lower_port = None
     self.upper_port = None
     self.bits_hash = None
+    self.mode = None  # iterative, batch or exhaustive
+    self.chunk_size = None  # how many ids are hashed per chunk (all but the iterative mode)
+    self.sweep = None  # test all hash widths in one run
+    self.workers = None  # number of worker processes used for hashing
+    self.estimate = None  # compare against the analytical estimate and stop early
+    self.rel_error = None  # relative confidence interval half width at which we stop
+    self.collision_file = None  # where the exhaustive mode writes the colliding ids
+    self.max_memory = None  # MB the exhaustive mode may use
     self.logger = logger
 
   #################
@@ -53,6 +185,18 @@ class HashCollisionTester ():
     self.lower_port = args.lower_port
     self.upper_port = args.upper_port
     self.bits_hash = args.bits_hash
+    self.mode = args.mode
+    self.chunk_size = args.chunk_size
+    self.sweep = args.sweep
+    self.workers = args.workers
+    self.estimate = args.estimate
+    self.rel_error = args.rel_error
+    self.collision_file = args.collision_file
+    self.max_memory = args.max_memory
+    if (self.estimate and self.mode == "exhaustive"):
+      raise ValueError ("the estimate mode samples the id space, so it cannot be combined with the exhaustive mode")
+    if (self.estimate and self.sweep):
+      raise ValueError ("the estimate mode stops sampling for a single hash width, so it cannot be combined with the sweep")
 
     self.logger.debug ("HashCollisionTester::Dump")
     self.logger.debug ("\tIterations = {}".format (self.iters))
@@ -60,6 +204,134 @@ class HashCollisionTester ():
     self.logger.debug ("\tLower port = {}".format (self.lower_port))
     self.logger.debug ("\tUpper port = {}".format (self.upper_port))
     self.logger.debug ("\tBits in hash = {}".format (self.bits_hash))
+    self.logger.debug ("\tMode = {}".format (self.mode))
+    self.logger.debug ("\tChunk size = {}".format (self.chunk_size))
+    self.logger.debug ("\tSweep = {}".format (self.sweep))
+    self.logger.debug ("\tWorkers = {}".format (self.workers))
+    self.logger.debug ("\tEstimate = {}".format (self.estimate))
+    self.logger.debug ("\tRelative error = {}".format (self.rel_error))
+    self.logger.debug ("\tCollision file = {}".format (self.collision_file))
+    self.logger.debug ("\tMax memory = {} MB".format (self.max_memory))
+
+  #################
+  # size of our id space
+  #################
+  def id_space_size (self):
+    return len (HashCollisionTester.prefixes) * self.num_entities * self.num_hosts * self.num_ports ()
+
+  #################
+  # number of ports (both bounds are inclusive just like randint)
+  #################
+  def num_ports (self):
+    return self.upper_port - self.lower_port + 1
+
+  #################
+  # refuse to enumerate an id space whose arrays would not fit in max_memory
+  #################
+  def check_memory (self):
+    space = self.id_space_size ()
+    needed = space * HashCollisionTester.bytes_per_id / 2**20
+    if (needed > self.max_memory):
+      raise ValueError ("enumerating all {} ids needs about {:.0f} MB, more than the {} MB allowed by -M".format (space, needed, self.max_memory))
+
+  #################
+  # convert codes to id strings with our configuration
+  #################
+  def ids_for (self, codes):
+    return codes2ids (codes, self.num_entities, self.num_hosts, self.lower_port, self.num_ports ())
+
+  #################
+  # Generate the requested number of distinct random codes
+  #
+  # Random generation produces duplicates, which the iterative mode skips one by one.
+  # Here we draw everything we still need in one shot, remove the duplicates and
+  # draw again for whatever is missing. This converges in a handful of rounds.
+  #################
+  def sample_codes (self, count, rng, codes=None):
+    self.logger.debug ("HashCollisionTester::sample_codes")
+
+    space = self.id_space_size ()
+    if count > space:
+      self.logger.debug ("Only {} distinct ids exist; reducing the count from {}".format (space, count))
+      count = space
+
+    if codes is None:
+      codes = np.empty (0, dtype=np.uint64)
+
+    while (codes.size < count):
+      draw = rng.integers (0, space, size=count - codes.size, dtype=np.uint64)
+      codes = sorted_unique (np.concatenate ((codes, draw)))
+      self.logger.debug ("sampled {} distinct ids so far".format (codes.size))
+
+    # note that the codes come back sorted, but the order does not matter to us
+    return codes
+
+  #################
+  # split an array of codes into tasks of chunk size for hash_chunk
+  #################
+  def chunk_tasks (self, codes):
+    for start in range (0, codes.size, self.chunk_size):
+      yield (codes[start:start + self.chunk_size], self.num_entities, self.num_hosts, self.lower_port, self.num_ports ())
+
+  #################
+  # split the entire id space into tasks of chunk size for hash_range
+  #################
+  def range_tasks (self, bits_hash):
+    space = self.id_space_size ()
+    for start in range (0, space, self.chunk_size):
+      yield (start, min (start + self.chunk_size, space), self.num_entities, self.num_hosts, self.lower_port, self.num_ports (), bits_hash)
+
+  #################
+  # apply a chunk function to all the tasks, either in this process or in
+  # our pool of worker processes. The results are yielded in task order as
+  # they become available so the caller can consume them incrementally.
+  #################
+  def map_tasks (self, func, tasks):
+    if (self.workers > 1):
+      with multiprocessing.Pool (self.workers) as pool:
+        yield from pool.imap (func, tasks)
+    else:
+      for task in tasks:
+        yield func (task)
+
+  #################
+  # hash an array of codes chunk by chunk so that only one chunk worth of
+  # strings is alive at any point in time (per worker)
+  #################
+  def hash_codes (self, codes):
+    self.logger.debug ("HashCollisionTester::hash_codes")
+
+    hashes = np.empty (codes.size, dtype=np.uint64)
+    start = 0
+    for chunk in self.map_tasks (hash_chunk, self.chunk_tasks (codes)):
+      hashes[start:start + chunk.size] = chunk
+      start += chunk.size
+
+    self.logger.debug ("hashed {} ids".format (start))
+    return hashes
+
+  #################
+  # hash an array of codes and return all the 64 bit hash values in sorted order
+  #
+  # every worker sorts its own shard, so all that is left to do here is to
+  # merge the sorted shards. A stable sort (timsort for these integers) detects
+  # the already sorted runs and merges them.
+  #################
+  def sorted_hashes (self, codes):
+    self.logger.debug ("HashCollisionTester::sorted_hashes")
+
+    shards = list (self.map_tasks (hash_sorted_shard, self.chunk_tasks (codes)))
+    self.logger.debug ("merging {} sorted shards".format (len (shards)))
+    return np.sort (np.concatenate (shards), kind="stable")
+
+  #################
+  # log the colliding ids, if any. Both arrays must be sorted by truncated hash value
+  #################
+  def report_collisions (self, sorted_hashes, codes):
+    dup = np.flatnonzero (sorted_hashes[1:] == sorted_hashes[:-1]) + 1
+    for i in dup.tolist ():
+      ids = self.ids_for (codes[[i-1, i]])
+      self.logger.debug ("*******Collision occurred for {} bit hash {}, id {} and existing entry {}".format (self.bits_hash, sorted_hashes[i], ids[1], ids[0]))
 
   #################
   # Driver program
@@ -67,6 +339,194 @@ class HashCollisionTester ():
   def driver (self):
     self.logger.debug ("CollisionTester::driver")
 
+    if (np is None and (self.sweep or self.estimate or self.mode != "iterative")):
+      raise ImportError ("NumPy is needed for everything but the iterative mode")
+
+    if (self.sweep):
+      self.sweep_driver ()
+    elif (self.estimate):
+      self.estimate_driver ()
+    elif (self.mode == "batch"):
+      self.batch_driver ()
+    elif (self.mode == "exhaustive"):
+      self.exhaustive_driver ()
+    else:
+      self.iterative_driver ()
+
+  #################
+  # Batch mode driver
+  #
+  # Here iters is the number of distinct ids we hash.
+  #################
+  def batch_driver (self):
+    self.logger.debug ("CollisionTester::batch_driver")
+
+    # First, obtain a random number generator (seeded from the OS like random.seed ())
+    rng = np.random.default_rng ()
+
+    # generate all the distinct ids we need and hash them
+    codes = self.sample_codes (self.iters, rng)
+    hashes = truncate (self.hash_codes (codes), self.bits_hash)
+
+    # sort the hash values (and the codes along with them) so that collisions
+    # end up next to each other
+    order = np.argsort (hashes, kind="stable")
+    hashes = hashes[order]
+
+    num_collisions = count_collisions (hashes)
+    if (num_collisions and self.logger.isEnabledFor (logging.DEBUG)):
+      self.report_collisions (hashes, codes[order])
+
+    self.logger.debug ("\n********\tNumber of collisions found = {} among {} distinct ids **********".format (num_collisions, codes.size))
+
+  #################
+  # Sweep driver
+  #
+  # The ids are generated once and hashed once to 64 bits. Truncating a sorted
+  # array by a right shift keeps it sorted, so the same sorted array gives us the
+  # number of collisions for every hash width.
+  #################
+  def sweep_driver (self):
+    self.logger.debug ("CollisionTester::sweep_driver")
+
+    if (self.mode == "exhaustive"):
+      # every id in our space, streamed as ranges to the workers
+      self.check_memory ()
+      shards = [shard for shard, _ in self.map_tasks (hash_range, self.range_tasks (64))]
+      hashes = np.sort (np.concatenate (shards), kind="stable")
+    else:
+      rng = np.random.default_rng ()
+      hashes = self.sorted_hashes (self.sample_codes (self.iters, rng))
+
+    for bits in HashCollisionTester.widths:
+      num_collisions = count_collisions (truncate (hashes, bits))
+      self.logger.debug ("********\t{} bit hash: number of collisions found = {} (expected {:.4g}) among {} distinct ids".format (bits, num_collisions, expected_collisions (hashes.size, bits), hashes.size))
+
+  #################
+  # Exhaustive mode driver
+  #
+  # Instead of sampling, we enumerate every id in our (finite) space exactly once.
+  # The space is split into ranges of chunk size that the workers hash and sort, so
+  # no iteration is wasted on duplicates. The hash values and codes of the whole space
+  # are held in memory and sorted together, which takes about bytes_per_id bytes per
+  # id at the peak, so we refuse spaces that would need more than max_memory. The
+  # result is the exact set of collisions for the configured hash width.
+  #################
+  def exhaustive_driver (self):
+    self.logger.debug ("CollisionTester::exhaustive_driver")
+
+    self.check_memory ()
+    space = self.id_space_size ()
+    self.logger.debug ("Enumerating all {} ids".format (space))
+
+    # fill the preallocated arrays as the sorted shards come back
+    hashes = np.empty (space, dtype=np.uint64)
+    codes = np.empty (space, dtype=np.uint64)
+    start = 0
+    for shard_hashes, shard_codes in self.map_tasks (hash_range, self.range_tasks (self.bits_hash)):
+      hashes[start:start + shard_hashes.size] = shard_hashes
+      codes[start:start + shard_codes.size] = shard_codes
+      start += shard_hashes.size
+      self.logger.debug ("hashed {} ids".format (start))
+
+    # merge the sorted shards
+    order = np.argsort (hashes, kind="stable")
+    hashes = hashes[order]
+    codes = codes[order]
+    del order
+
+    num_collisions = count_collisions (hashes)
+
+    # every run of equal hash values is one group of colliding ids
+    dup = hashes[1:] == hashes[:-1]
+    num_groups = int (np.count_nonzero (dup[1:] & ~dup[:-1]) + (dup.size > 0 and dup[0]))
+    self.logger.debug ("\n********\tNumber of collisions found = {} in {} groups among all {} ids (expected {:.4g}) **********".format (num_collisions, num_groups, space, expected_collisions (space, self.bits_hash)))
+
+    if (self.collision_file and num_collisions):
+      self.write_collisions (hashes, codes, dup)
+
+  #################
+  # write out the exact collision set, one line per hash value shared by
+  # more than one id
+  #################
+  def write_collisions (self, hashes, codes, dup):
+    self.logger.debug ("HashCollisionTester::write_collisions")
+
+    # positions that belong to some group, i.e., equal to their predecessor or successor
+    member = np.zeros (hashes.size, dtype=bool)
+    member[1:] |= dup
+    member[:-1] |= dup
+    idx = np.flatnonzero (member)
+
+    with open (self.collision_file, "w") as f:
+      for start in range (0, idx.size, self.chunk_size):
+        chunk = idx[start:start + self.chunk_size]
+        for pos, h, id in zip (chunk.tolist (), hashes[chunk].tolist (), self.ids_for (codes[chunk])):
+          if (pos == 0 or not dup[pos-1]):
+            # first member of its group, so start a new line
+            f.write (("\n" if start or pos != idx[0] else "") + str (h) + ":")
+          f.write (" " + id)
+      f.write ("\n")
+
+  #################
+  # Estimate driver
+  #
+  # We sample in rounds that double the number of distinct ids each time. After every
+  # round the empirical collision count c is compared with the analytical estimate for
+  # the same number of ids, and that ratio is used to project the count for the full
+  # iters budget. Treating c as Poisson, the 95% confidence interval of the projection
+  # has a relative half width of 1.96/sqrt(c); once it is below rel_error we stop.
+  #################
+  def estimate_driver (self):
+    self.logger.debug ("CollisionTester::estimate_driver")
+
+    rng = np.random.default_rng ()
+    target = min (self.iters, self.id_space_size ())
+    target_expected = expected_collisions (target, self.bits_hash)
+    self.logger.debug ("Analytical estimate for {} distinct ids and {} bit hash = {:.4g} collisions".format (target, self.bits_hash, target_expected))
+
+    codes = np.empty (0, dtype=np.uint64)
+    hashes = np.empty (0, dtype=np.uint64)  # kept sorted
+    count = min (self.chunk_size, target)
+    stopped_early = False
+    while True:
+      # extend our sample and hash only the newly drawn ids
+      prev = codes
+      codes = self.sample_codes (count, rng, codes)
+      fresh = codes[np.isin (codes, prev, assume_unique=True, invert=True)]
+      fresh_hashes = np.sort (truncate (self.hash_codes (fresh), self.bits_hash))
+      hashes = np.sort (np.concatenate ((hashes, fresh_hashes)), kind="stable")  # merge of two sorted runs
+
+      num_collisions = count_collisions (hashes)
+      expected = expected_collisions (codes.size, self.bits_hash)
+      self.logger.debug ("{} distinct ids: {} collisions found, {:.4g} expected".format (codes.size, num_collisions, expected))
+
+      if (codes.size >= target):
+        break
+
+      if (num_collisions > 0):
+        half_width = 1.96 / math.sqrt (num_collisions)
+        projected = num_collisions / expected * target_expected
+        self.logger.debug ("projected for {} ids = {:.4g} +/- {:.1f}%".format (target, projected, 100 * half_width))
+        if (half_width <= self.rel_error):
+          self.logger.debug ("Confidence interval is tight enough; stopping after {:.2f}% of the budget".format (100 * codes.size / target))
+          stopped_early = True
+          break
+
+      count = min (2 * count, target)
+
+    if (stopped_early):
+      # what we report is the projection for the full budget, not the partial count
+      self.logger.debug ("\n********\tEarly stop after {} of {} distinct ids ({} collisions found, {:.4g} expected): projected number of collisions = {:.4g}, 95% CI [{:.4g}, {:.4g}] (analytical estimate {:.4g}) **********".format (codes.size, target, num_collisions, expected, projected, projected * (1 - half_width), projected * (1 + half_width), target_expected))
+    else:
+      self.logger.debug ("\n********\tNumber of collisions found = {} among {} distinct ids (analytical estimate {:.4g}) **********".format (num_collisions, codes.size, expected))
+
+  #################
+  # Iterative (original) mode driver
+  #################
+  def iterative_driver (self):
+    self.logger.debug ("CollisionTester::iterative_driver")
+
     # First, seed the random number generator
     random.seed ()  
 
@@ -95,12 +555,8 @@ class HashCollisionTester ():
         # running so that we don't panic :-), we print something once in a while
         self.logger.debug ("iteration num {}".format (i))
 
-      # first get the digest from hashlib and then take the desired number of bytes from the
-      # lower end of the 256 bits hash. Big or little endian does not matter.
-      hash_digest = hashlib.sha256 (bytes (id, "utf-8")).digest ()  # this is how we get the digest or hash value
-      # figure out how many bytes to retrieve
-      num_bytes = int(self.bits_hash/8)  # otherwise we get float which we cannot use below
-      hash_val = int.from_bytes (hash_digest[:num_bytes], "big")  # take lower N number of bytes
+      # take the desired number of bits of the sha256 digest (see hash_ring.py)
+      hash_val = hash_func (id, self.bits_hash)
 
       # now check if this hash val exists in our dictionary, which means collision occurred
       # for these generated ids. But note that because we are generating an id using random
@@ -145,6 +601,22 @@ def parseCmdLineArgs ():
 
   parser.add_argument ("-P", "--upper_port", type=int, default=7777, help="upper bound of the port for whoever runs on the host, default 7777")
 
+  parser.add_argument ("-m", "--mode", choices=["iterative", "batch", "exhaustive"], default="iterative", help="iterative hashes one id at a time using a dictionary; batch hashes chunks of ids and uses sorted NumPy arrays; exhaustive enumerates the entire id space instead of sampling it, default iterative")
+
+  parser.add_argument ("-s", "--sweep", action="store_true", help="Test all hash widths from 8 to 64 bits in one run (uses the batch machinery regardless of mode)")
+
+  parser.add_argument ("-w", "--workers", type=int, default=os.cpu_count (), help="Number of worker processes used to hash the ids in batch and sweep mode, default number of CPUs")
+
+  parser.add_argument ("-E", "--estimate", action="store_true", help="Print the analytical (birthday bound) estimate next to the empirical count and stop sampling once the estimate is tight enough")
+
+  parser.add_argument ("-r", "--rel_error", type=float, default=0.1, help="Relative half width of the 95%% confidence interval at which the estimate mode stops sampling, default 0.1")
+
+  parser.add_argument ("-o", "--collision_file", default=None, help="File where the exhaustive mode writes every group of colliding ids, default none")
+
+  parser.add_argument ("-M", "--max_memory", type=int, default=4096, help="MB the exhaustive mode may use; it needs about 40 bytes per id of the space, default 4096")
+
+  parser.add_argument ("-c", "--chunk_size", type=int, default=100000, help="Number of ids hashed per chunk (or per range of the id space in exhaustive mode) in the batch, sweep, exhaustive and estimate modes; the estimate mode also takes its first sample of this size, default 100000")
+
   parser.add_argument ("-l", "--loglevel", type=int, default=logging.DEBUG, choices=[logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL], help="logging level, choices 10,20,30,40,50: default 10=logging.DEBUG")
   
   return parser.parse_args()
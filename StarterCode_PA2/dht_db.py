@@ -0,0 +1,126 @@
+# Author: Aniruddha Gokhale
+# Vanderbilt University
+#
+# Purpose:
+#
+# Compact binary format for the database of DHT nodes produced by exp_generator.py
+#
+# The dht.json file is re-parsed in full by every discovery node, publisher and subscriber
+# that the experiment script launches. With thousands of DHT nodes that is slow and every
+# process ends up with its own copy of the parsed data. Instead, the generator can also write
+# the ring into a file of fixed width records sorted by hash value, which a process simply
+# memory maps (so all processes on a host share the same pages) and binary searches.
+#
+# File layout (all integers little endian):
+#
+#   header:   magic "DHTB", version, bits in hash, 2 unused bytes, number of nodes,
+#             offset of the string table                                    (16 bytes)
+#   records:  one per node in ring order: hash (8 bytes), IPv4 address (4 bytes),
+#             port (2 bytes), length of id (2 bytes), offset of id in the
+#             string table (4 bytes)                                        (20 bytes each)
+#   strings:  the utf-8 encoded ids, back to back
+#
+
+import mmap # memory mapped file
+import socket # IPv4 address conversion
+import struct # packing of binary records
+
+MAGIC = b"DHTB"
+VERSION = 1
+HEADER = struct.Struct ("<4sBBxxII")
+RECORD = struct.Struct ("<Q4sHHI")
+
+##################################
+#
+# Write the binary DHT database
+#
+# The ring must be a list of dictionaries with id, hash, IP and port as produced by
+# ExperimentGenerator.build_ring, i.e., already sorted by hash value.
+#
+##################################
+def write_dht_db (filename, ring, bits_hash):
+  ids = [bytes (node["id"], "utf-8") for node in ring]
+  strtab_offset = HEADER.size + RECORD.size * len (ring)
+
+  with open (filename, "wb") as f:
+    f.write (HEADER.pack (MAGIC, VERSION, bits_hash, len (ring), strtab_offset))
+
+    id_offset = 0
+    for node, id in zip (ring, ids):
+      f.write (RECORD.pack (node["hash"], socket.inet_aton (node["IP"]), node["port"], len (id), id_offset))
+      id_offset += len (id)
+
+    f.write (b"".join (ids))
+
+##################################
+#
+# DHTDatabase class
+#
+# Read only view of a binary DHT database. Nothing is parsed up front; records are
+# decoded on demand straight from the memory mapped file.
+#
+##################################
+class DHTDatabase ():
+
+  #################
+  # constructor
+  #################
+  def __init__ (self, filename):
+    with open (filename, "rb") as f:
+      self.mm = mmap.mmap (f.fileno (), 0, access=mmap.ACCESS_READ)
+
+    magic, version, self.bits_hash, self.size, self.strtab_offset = HEADER.unpack_from (self.mm, 0)
+    if (magic != MAGIC or version != VERSION):
+      self.mm.close ()
+      raise ValueError ("{} is not a version {} DHT database".format (filename, VERSION))
+
+  #################
+  # number of nodes in the ring
+  #################
+  def __len__ (self):
+    return self.size
+
+  #################
+  # release the mapping
+  #################
+  def close (self):
+    self.mm.close ()
+
+  #################
+  # hash value of the node at the given position in the ring
+  #################
+  def hash_at (self, pos):
+    return struct.unpack_from ("<Q", self.mm, HEADER.size + pos * RECORD.size)[0]
+
+  #################
+  # node details at the given position in the ring, in the same form as dht.json
+  #################
+  def node (self, pos):
+    hash_val, ip, port, id_len, id_offset = RECORD.unpack_from (self.mm, HEADER.size + pos * RECORD.size)
+    start = self.strtab_offset + id_offset
+    return {"id": str (self.mm[start:start + id_len], "utf-8"), "hash": hash_val,
+            "IP": socket.inet_ntoa (ip), "port": port}
+
+  #################
+  # position of the successor of a key, i.e., the first node whose hash is
+  # equal or greater than the key, wrapping around the ring (None if there
+  # are no nodes at all)
+  #################
+  def successor_pos (self, key):
+    if not self.size:
+      return None
+    lo, hi = 0, self.size
+    while (lo < hi):
+      mid = (lo + hi) // 2
+      if (self.hash_at (mid) < key):
+        lo = mid + 1
+      else:
+        hi = mid
+    return lo % self.size
+
+  #################
+  # node details of the successor of a key
+  #################
+  def successor (self, key):
+    pos = self.successor_pos (key)
+    return None if pos is None else self.node (pos)
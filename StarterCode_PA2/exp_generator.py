@@ -3,8 +3,8 @@
 #
 # Purpose:
 #
-# Experiment generator where we create scripts that can be run on Mininet
-# for now, and later for cloud Kubernetes.
+# Experiment generator where we create scripts that can be run on Mininet,
+# and optionally the Kubernetes manifests to run the same experiment in the cloud.
 #
 # We ask the user to supply the topology, e.g., single,N or linear,N or
 # tree,fanout=N,depth=M
@@ -18,18 +18,154 @@
 # Since our topic helper has 9 topics, we also have to make sure that the num of topics
 # published or subscribed are 5 or more so that there is some overlap.
 #
-# Note, our script generation logic will place these entities randomly across the nodes of
-# system. We make no effort to load balance or just use round robin allocation (which would
-# have been simpler). But this becomes too deterministic and sort of equally distributed
+# Note, by default our script generation logic will place these entities randomly across the
+# nodes of system. We make no effort to load balance or just use round robin allocation (which
+# would have been simpler). But this becomes too deterministic and sort of equally distributed
 # scenario.
+#
+# Since random placement can pile several publishers and DHT nodes onto the same host (and skew
+# the latency measurements), other placement engines can be selected from the command line:
+# round robin, least loaded, bin packing by expected publish frequency, and anti-affinity
+# between DHT nodes. See the PlacementEngine classes below.
 
 import os
+import bisect # binary search over the sorted ring
 import random # random number generation
-import hashlib  # for the secure hash library
 import argparse # argument parsing
 import json # for JSON
 import logging # for logging. Use it in place of print statements.
 
+from dht_db import write_dht_db # compact binary DHT database
+from hash_ring import hash_func # the hash function shared with our hash ring
+
+##########################
+#
+# Placement engines
+#
+# A placement engine decides on which mininet host the next entity goes. The
+# generator asks the engine to select a host for an entity (identified by its
+# prefix) with some expected load (weight), and once the entity is actually added
+# it commits that choice so the engine can update its bookkeeping.
+#
+# If the generated entry collides with an existing hash, the generator asks again
+# with an incremented attempt number and the engine must then offer a different
+# host (otherwise the same id, IP and port would collide again).
+#
+##########################
+class PlacementEngine ():
+
+  # when set, the generator places the entities in decreasing order of their weight
+  sort_by_weight = False
+
+  #################
+  # constructor
+  #################
+  def __init__ (self, num_hosts):
+    self.num_hosts = num_hosts  # hosts are numbered 1 to num_hosts
+    self.count = [0] * (num_hosts + 1)  # number of entities per host (index 0 unused)
+    self.load = [0.0] * (num_hosts + 1)  # sum of the weights per host
+    self.type_count = {"disc": [0] * (num_hosts + 1), "pub": [0] * (num_hosts + 1), "sub": [0] * (num_hosts + 1)}
+
+  #################
+  # sort key of a host; smallest is preferred. Subclasses override this
+  #################
+  def key (self, prefix, host_num):
+    return host_num
+
+  #################
+  # select a host for the entity
+  #################
+  def select (self, prefix, weight, attempt=0):
+    hosts = range (1, self.num_hosts + 1)
+    if (attempt == 0):
+      return min (hosts, key=lambda h: self.key (prefix, h))
+    return sorted (hosts, key=lambda h: self.key (prefix, h))[attempt % self.num_hosts]
+
+  #################
+  # record that an entity with that weight was placed on the host
+  #################
+  def commit (self, prefix, host_num, weight):
+    self.count[host_num] += 1
+    self.load[host_num] += weight
+    self.type_count[prefix][host_num] += 1
+
+  #################
+  # record that an entity with that weight was removed from the host
+  #################
+  def release (self, prefix, host_num, weight):
+    self.count[host_num] -= 1
+    self.load[host_num] -= weight
+    self.type_count[prefix][host_num] -= 1
+
+#################
+# uniformly random placement (the original behavior)
+#################
+class RandomPlacement (PlacementEngine):
+
+  def select (self, prefix, weight, attempt=0):
+    return random.randint (1, self.num_hosts)
+
+#################
+# round robin over the hosts irrespective of the entity type
+#################
+class RoundRobinPlacement (PlacementEngine):
+
+  def __init__ (self, num_hosts):
+    super ().__init__ (num_hosts)
+    self.next = 0  # zero based position of the next host
+
+  def key (self, prefix, host_num):
+    # distance from the next host in the round robin order
+    return (host_num - 1 - self.next) % self.num_hosts
+
+  def commit (self, prefix, host_num, weight):
+    super ().commit (prefix, host_num, weight)
+    self.next = host_num % self.num_hosts
+
+#################
+# host with the fewest entities of any type
+#################
+class LeastLoadedPlacement (PlacementEngine):
+
+  def key (self, prefix, host_num):
+    return (self.count[host_num], host_num)
+
+#################
+# bin packing by expected load
+#
+# Publishers weigh as much as their publish frequency, the other entities weigh 1.
+# The entities are placed heaviest first, each on the host with the least load so
+# far (the classic longest processing time heuristic).
+#################
+class BinPackPlacement (PlacementEngine):
+
+  sort_by_weight = True
+
+  def key (self, prefix, host_num):
+    return (self.load[host_num], self.count[host_num], host_num)
+
+#################
+# anti-affinity between DHT nodes
+#
+# A DHT node goes to a host with the fewest DHT nodes so that no two share a host
+# until every host has one. Everything else goes to the least loaded host.
+#################
+class AntiAffinityPlacement (PlacementEngine):
+
+  def key (self, prefix, host_num):
+    if (prefix == "disc"):
+      return (self.type_count["disc"][host_num], self.count[host_num], host_num)
+    return (self.count[host_num], host_num)
+
+# the engines that can be selected from the command line
+placement_engines = {
+  "random": RandomPlacement,
+  "roundrobin": RoundRobinPlacement,
+  "leastloaded": LeastLoadedPlacement,
+  "binpack": BinPackPlacement,
+  "antiaffinity": AntiAffinityPlacement
+}
+
 ##########################
 #
 # ExperimentGenerator class.
@@ -40,6 +176,8 @@ import logging # for logging. Use it in place of print statements.
 #
 ##########################
 class ExperimentGenerator ():
+  # This is a class variable
+  k8s_dht_dir = "/etc/dht"  # where the pods find the DHT database of the cluster
 
   #################
   # constructor
@@ -55,8 +193,16 @@ class ExperimentGenerator ():
     self.disc_dict = {} # dictionary of generated discovery DHT instances
     self.pub_dict = {} # dictionary of generated publisher instances
     self.sub_dict = {} # dictionary of generated subscriber instances
+    self.hash_index = {} # per entity type set of hash values in use (for collision checks)
+    self.port_alloc = {} # per entity type, per host offset of the next port to hand out
+    self.placement = None # the placement engine deciding the host of every entity
+    self.incremental = False # start from the previously generated experiment
     self.script_file = None  # for the experiment script
     self.json_file = None # for the database of DHT 
+    self.bin_file = None # for the binary version of the database of DHT (optional)
+    self.k8s_file = None # for the Kubernetes manifests (optional)
+    self.k8s_image = None # container image with our applications
+    self.k8s_namespace = None # namespace in which to deploy (optional)
     self.logger = logger # The logger
 
   #################
@@ -74,6 +220,11 @@ class ExperimentGenerator ():
     self.pub_base_port = args.pub_base_port
     self.script_file = args.script_file
     self.json_file = args.json_file
+    self.bin_file = args.bin_file
+    self.k8s_file = args.k8s_file
+    self.k8s_image = args.k8s_image
+    self.k8s_namespace = args.k8s_namespace
+    self.incremental = args.incremental
     
     # Now let us parse the mininet topo and derive how many nodes
     # we have in mininet topology
@@ -90,6 +241,9 @@ class ExperimentGenerator ():
     else:
       raise ValueError ("Bad mininet topology")
 
+    # obtain our placement engine
+    self.placement = placement_engines[args.placement] (self.num_mn_nodes)
+
     # Now let us initialize the dictionaries. Since the entities can be deployed
     # across any host of the mininet topology, the dictionary is keyed by
     # mininet host name. We assume montonically increasing host names.
@@ -98,6 +252,13 @@ class ExperimentGenerator ():
       self.disc_dict["h"+str(i+1)] = []
       self.pub_dict["h"+str(i+1)] = []
       self.sub_dict["h"+str(i+1)] = []
+
+    # Our collision index and port allocator. Every time an entry is appended to one of
+    # the dictionaries above, its hash goes into the index of that entity type and the
+    # port offset for that host is advanced, so neither requires walking the dictionaries.
+    for prefix in ["disc", "pub", "sub"]:
+      self.hash_index[prefix] = set ()
+      self.port_alloc[prefix] = {"h"+str(i+1): 0 for i in range (self.num_mn_nodes)}
       
   #################
   # debugging output
@@ -112,6 +273,8 @@ class ExperimentGenerator ():
     self.logger.debug ("Base discovery port = {}".format (self.disc_base_port))
     self.logger.debug ("Base pub port = {}".format (self.pub_base_port))
     self.logger.debug ("Num Mininet nodes = {}".format (self.num_mn_nodes))
+    self.logger.debug ("Placement engine = {}".format (type (self.placement).__name__))
+    self.logger.debug ("Incremental = {}".format (self.incremental))
     self.logger.debug ("Discovery dictionary = {}".format (self.disc_dict))
     self.logger.debug ("Publisher dictionary = {}".format (self.pub_dict))
     self.logger.debug ("Subscriber dictionary = {}".format (self.sub_dict))
@@ -123,32 +286,28 @@ class ExperimentGenerator ():
   def hash_func (self, id):
     self.logger.debug ("ExperimentGenerator::hash_func")
 
-    # first get the digest from hashlib and then take the desired number of bytes from the
-    # lower end of the 256 bits hash. Big or little endian does not matter.
-    hash_digest = hashlib.sha256 (bytes (id, "utf-8")).digest ()  # this is how we get the digest or hash value
-    # figure out how many bytes to retrieve
-    num_bytes = int(self.bits_hash/8)  # otherwise we get float which we cannot use below
-    hash_val = int.from_bytes (hash_digest[:num_bytes], "big")  # take lower N number of bytes
-
-    return hash_val
+    # the first bits_hash bits of the sha256 digest, same as our hash ring (see hash_ring.py)
+    return hash_func (id, self.bits_hash)
 
   #################
   # gen dictionary values
   #
   # called by the populate method
   #################
-  def gen_dict_values (self, prefix, index):
+  def gen_dict_values (self, prefix, index, weight=1, attempt=0):
     self.logger.debug ("ExperimentGenerator::gen_dict_values")
 
     # here we generate the dictionary values.
     # prefix, such as pub, sub or disc must be specified
     # index should be monotonically increasing.
+    # weight is the expected load of the entity and attempt counts the
+    # retries after a collision; both are passed on to the placement engine
 
     # generate our id
     id = prefix + str (index)
 
-    # generate a host on which we will deploy this entity
-    mn_host_num = random.randint (1, self.num_mn_nodes)
+    # ask our placement engine for a host on which we will deploy this entity
+    mn_host_num = self.placement.select (prefix, weight, attempt)
     host = "h" + str (mn_host_num)
     ip = "10.0.0." + str(mn_host_num)
 
@@ -156,9 +315,9 @@ class ExperimentGenerator ():
     # then, we cannot reuse that port and so must generate the next
     # port in the sequence
     if prefix == "disc":
-      port = self.disc_base_port + len (self.disc_dict[host])
+      port = self.disc_base_port + self.port_alloc[prefix][host]
     elif prefix == "pub":
-      port = self.pub_base_port - len (self.pub_dict[host])
+      port = self.pub_base_port - self.port_alloc[prefix][host]
     else:
       port = None
 
@@ -169,24 +328,81 @@ class ExperimentGenerator ():
   # check for collision
   #
   #################
-  def check4collision (self, hash_val, dictionary):
+  def check4collision (self, hash_val, prefix):
     self.logger.debug ("ExperimentGenerator::check4collision")
 
-    # check the dictionary if the hash value already exists
-    for i in range (self.num_mn_nodes):
-      host_list = dictionary["h"+str (i+1)]
-      for nested_dict in host_list:
-        if nested_dict["hash"] == hash_val:
-          return True
+    # check our index if the hash value already exists for this entity type
+    return hash_val in self.hash_index[prefix]
+
+  #################
+  # dictionary holding the entities of a given type
+  #################
+  def dict_for (self, prefix):
+    if prefix == "disc":
+      return self.disc_dict
+    elif prefix == "pub":
+      return self.pub_dict
+    elif prefix == "sub":
+      return self.sub_dict
+    else:
+      raise ValueError ("dict_for::unknown prefix: {}".format (prefix))
 
-    return False # otherwise
+  #################
+  # add an entry
+  #
+  # Appends the entry to the host's list and keeps the collision index and
+  # the port allocator up to date. The next port handed out on this host is
+  # always beyond every port in use, even if some entries were removed.
+  #################
+  def add_entry (self, prefix, target_dict, host, entry, weight=1):
+    target_dict[host].append (entry)
+    self.hash_index[prefix].add (entry["hash"])
+    if prefix == "disc":
+      offset = entry["port"] - self.disc_base_port
+    elif prefix == "pub":
+      offset = self.pub_base_port - entry["port"]
+    else:
+      offset = -1  # subscribers do not use a port
+    self.port_alloc[prefix][host] = max (self.port_alloc[prefix][host], offset + 1)
+    self.placement.commit (prefix, int (host[1:]), weight)
+
+  #################
+  # remove an entry
+  #
+  # Reverse of add_entry except that the port is not handed out again within
+  # this run. The allocator is not saved with the experiment though: after an
+  # -I reload it starts again above the highest port still in use, so the port
+  # of a removed entry at the top can be handed out once more.
+  #################
+  def remove_entry (self, prefix, target_dict, host, entry):
+    target_dict[host].remove (entry)
+    self.hash_index[prefix].discard (entry["hash"])
+    self.placement.release (prefix, int (host[1:]), entry.get ("frequency", 1))
   
+  #################
+  # generate the application parameters of an entity
+  #
+  # We keep them in the entry so that an incremental run can reproduce the
+  # command line of an existing entity exactly
+  #################
+  def gen_params (self, prefix):
+    # generate intested in topics in the range of 5 to 9 because
+    # our topic helper currently has 9 topics in it.
+    if prefix == "sub":
+      return {"topics": random.randint (5, 9)}
+    elif prefix != "pub":
+      return {}
+
+    return {"topics": random.randint (5, 9),
+            "frequency": random.choice ([0.25, 0.5, 0.75, 1, 2, 3, 4]),
+            "iterations": random.choice ([1000, 2000, 3000])}
+
   #################
   # populate a given dict.
   #
   # Generic method
   #################
-  def populate_dict (self, prefix, num_entities):
+  def populate_dict (self, prefix, num_entities, first_index=1):
     self.logger.debug ("ExperimentGenerator::populate_dict")
 
     # populate the dictionary corresponding to the entity
@@ -205,20 +421,24 @@ class ExperimentGenerator ():
     # Since we are making this a generic method (exploiting the fact that
     # all dictionaries look very similar), so we must set the handle to
     # point to the correct dictionary
-    if prefix == "disc":
-      target_dict = self.disc_dict
-    elif prefix == "pub":
-      target_dict = self.pub_dict
-    elif prefix == "sub":
-      target_dict = self.sub_dict
-    else:
-      raise ValueError ("populate_dict::unknown prefix: {}".format (prefix))
+    target_dict = self.dict_for (prefix)
       
-    for i in range (num_entities):
+    # Publishers need their publishing parameters decided up front because the
+    # publish frequency is the expected load used by our placement engine.
+    params = [self.gen_params (prefix) for i in range (num_entities)]
+
+    # some placement engines want the heaviest entities placed first
+    order = range (num_entities)
+    if self.placement.sort_by_weight:
+      order = sorted (order, key=lambda i: params[i].get ("frequency", 1), reverse=True)
+
+    for i in order:
+      weight = params[i].get ("frequency", 1)
+      attempt = 0  # number of collisions so far for this entity
       collision = True  # assume there is collision
       while (collision):
         # keep generating values until no collision
-        id, host, ip, port = self.gen_dict_values (prefix, index=i+1)
+        id, host, ip, port = self.gen_dict_values (prefix, index=first_index+i, weight=weight, attempt=attempt)
         if port:
           string = id + ":" + ip + ":" + str (port)  # will be the case for disc and pubs
         else:
@@ -228,13 +448,92 @@ class ExperimentGenerator ():
         hash_val = self.hash_func (string)
         
         # check if this hash value already exists anywhere in our dict
-        collision = self.check4collision (hash_val, target_dict)
+        collision = self.check4collision (hash_val, prefix)
         if collision:
-          self.logger.debug ("ExperimentGenerator::populate_dict -- collision occurred for string {}".format (str))
+          self.logger.debug ("ExperimentGenerator::populate_dict -- collision occurred for string {}".format (string))
+          attempt += 1
 
       # now that we know that the generated values do not cause collision
       # insert it into our dictionary
-      target_dict[host].append ({"id": id, "hash": hash_val, "IP": ip, "port": port})
+      entry = {"id": id, "hash": hash_val, "IP": ip, "port": port}
+      entry.update (params[i])
+      self.add_entry (prefix, target_dict, host, entry, weight)
+
+  #######################
+  # Load the previously generated experiment
+  #
+  # Used in incremental mode. The discovery nodes (with their hash values) come from
+  # the JSON file while the publishers and subscribers, along with their parameters,
+  # are recovered from the command lines in the experiment script. Everything goes
+  # through add_entry so the indices, ports and placement engine see the existing
+  # entities exactly as if we had just generated them.
+  #######################
+  def load_experiment (self):
+    self.logger.debug ("ExperimentGenerator::load_experiment")
+
+    with open (self.json_file, "r") as f:
+      dht_db = json.load (f)
+
+    if dht_db.get ("bits_hash", self.bits_hash) != self.bits_hash:
+      raise ValueError ("load_experiment::{} uses a {} bit hash".format (self.json_file, dht_db["bits_hash"]))
+
+    for node in dht_db["dht"]:
+      if node["host"] not in self.disc_dict:
+        raise ValueError ("load_experiment::host {} is not in the topology".format (node["host"]))
+      self.add_entry ("disc", self.disc_dict, node["host"], \
+                      {"id": node["id"], "hash": node["hash"], "IP": node["IP"], "port": node["port"]})
+
+    with open (self.script_file, "r") as f:
+      for line in f:
+        tokens = line.split ()
+        if len (tokens) < 3:
+          continue
+
+        host = tokens[0]
+        opts = dict (zip (tokens[3::2], tokens[4::2]))  # pairs of option and value
+        if host not in self.pub_dict:
+          raise ValueError ("load_experiment::host {} is not in the topology".format (host))
+
+        if tokens[2] == "PublisherAppln.py":
+          frequency = float (opts["-f"])
+          if frequency.is_integer ():
+            frequency = int (frequency)  # written the way random.choice gave it to us
+          entry = {"id": opts["-n"], "IP": opts["-a"], "port": int (opts["-p"]), "topics": int (opts["-T"]),
+                   "frequency": frequency, "iterations": int (opts["-i"])}
+          entry["hash"] = self.hash_func (entry["id"] + ":" + entry["IP"] + ":" + str (entry["port"]))
+          self.add_entry ("pub", self.pub_dict, host, entry, entry["frequency"])
+        elif tokens[2] == "SubscriberAppln.py":
+          ip = "10.0.0." + host[1:]
+          entry = {"id": opts["-n"], "IP": ip, "port": None, "topics": int (opts["-T"])}
+          entry["hash"] = self.hash_func (entry["id"] + ":" + ip)
+          self.add_entry ("sub", self.sub_dict, host, entry)
+
+    # the JSON file lists the DHT nodes in ring order; restore our usual index order
+    for prefix in ["disc", "pub", "sub"]:
+      for host_list in self.dict_for (prefix).values ():
+        host_list.sort (key=lambda entry: int (entry["id"][len (prefix):]))
+
+  #######################
+  # Resize the entities of a given type
+  #
+  # Used in incremental mode. The existing entities are left untouched; new ones get
+  # the next unused indices and the most recently added (highest index) ones are
+  # removed first. So the cost is proportional to the change in size.
+  #######################
+  def resize_dict (self, prefix, num_entities):
+    self.logger.debug ("ExperimentGenerator::resize_dict")
+
+    target_dict = self.dict_for (prefix)
+    existing = [(int (entry["id"][len (prefix):]), host, entry) \
+                for host, host_list in target_dict.items () for entry in host_list]
+
+    if num_entities > len (existing):
+      first_index = max ([index for index, _, _ in existing], default=0) + 1
+      self.populate_dict (prefix, num_entities - len (existing), first_index)
+    elif num_entities < len (existing):
+      existing.sort (key=lambda item: item[0])
+      for index, host, entry in existing[num_entities:]:
+        self.remove_entry (prefix, target_dict, host, entry)
 
   #######################
   # Generate the experiment script
@@ -277,11 +576,10 @@ class ExperimentGenerator ():
         host = "h" + str (i+1)
         host_list = self.pub_dict[host]
         for nested_dict in host_list:
-          # generate intested in topics in the range of 5 to 9 because
-          # our topic helper currently has 9 topics in it.
-          num_topics = random.randint (5, 9)
-          frequency = random.choice ([0.25, 0.5, 0.75, 1, 2, 3, 4])
-          iterations = random.choice ([1000, 2000, 3000])
+          # the topics, frequency and iterations were generated along with the entry
+          num_topics = nested_dict["topics"]
+          frequency = nested_dict["frequency"]
+          iterations = nested_dict["iterations"]
 
           # build the command line
           cmdline = host + " python3 PublisherAppln.py " + \
@@ -304,9 +602,8 @@ class ExperimentGenerator ():
         host = "h" + str (i+1)
         host_list = self.sub_dict[host]
         for nested_dict in host_list:
-          # generate intested in topics in the range of 5 to 9 because
-          # our topic helper currently has 9 topics in it.
-          num_topics = random.randint (5, 9)
+          # the topics were generated along with the entry
+          num_topics = nested_dict["topics"]
 
           # build the command line
           cmdline = host + " python3 SubscriberAppln.py " + \
@@ -319,6 +616,170 @@ class ExperimentGenerator ():
       
     f.close ()
           
+  #######################
+  # Generate the Kubernetes manifests
+  #
+  # This is the Kubernetes counterpart of gen_exp_script for the very same
+  # disc/pub/sub dictionaries, following the K8s_Example/ZeroMQ examples: every
+  # discovery node and publisher gets its own Deployment and a Service in front
+  # of it (so that it exists on its own and is not load balanced), while the
+  # subscribers only need a Deployment. There are no mininet hosts here; the
+  # scheduler decides where pods run, so the CPU request of every pod is derived
+  # from its expected load, i.e., the publish frequency for publishers.
+  #
+  # The IP addresses in the JSON DB are mininet addresses that do not exist in
+  # the cluster, where a discovery node is reachable via its service name,
+  # <id>-svc. So the pods get their own version of the DHT database, with the
+  # service names as addresses, in a ConfigMap that every Deployment mounts
+  # under k8s_dht_dir, and their -j points there.
+  #######################
+  def gen_k8s_manifests (self):
+    self.logger.debug ("ExperimentGenerator::gen_k8s_manifests")
+
+    json_file = self.k8s_dht_path ()
+    with open (self.k8s_file, "w") as f:
+      f.write ("# Generated by exp_generator.py. Deploy with kubectl apply -f " + self.k8s_file + "\n")
+      f.write (self.k8s_config_map ())
+
+      for i in range (self.num_mn_nodes):
+        for nested_dict in self.disc_dict["h" + str (i+1)]:
+          args = ["DiscoveryAppln.py", "-n", nested_dict["id"], "-j", json_file,
+                  "-p", str (nested_dict["port"]), "-P", str (self.num_pub), "-S", str (self.num_sub)]
+          f.write (self.k8s_deployment (nested_dict["id"], args, nested_dict["port"], cpu=200))
+          f.write (self.k8s_service (nested_dict["id"], nested_dict["port"]))
+
+      for i in range (self.num_mn_nodes):
+        for nested_dict in self.pub_dict["h" + str (i+1)]:
+          # the publisher advertises its pod's IP address, which is only known at runtime
+          args = ["PublisherAppln.py", "-n", nested_dict["id"], "-j", json_file,
+                  "-a", "$(POD_IP)", "-p", str (nested_dict["port"]), "-T", str (nested_dict["topics"]),
+                  "-f", str (nested_dict["frequency"]), "-i", str (nested_dict["iterations"])]
+          # 100 millicores to begin with plus 100 per message per sec published
+          cpu = 100 + int (100 * nested_dict["frequency"])
+          f.write (self.k8s_deployment (nested_dict["id"], args, nested_dict["port"], cpu=cpu))
+          f.write (self.k8s_service (nested_dict["id"], nested_dict["port"]))
+
+      for i in range (self.num_mn_nodes):
+        for nested_dict in self.sub_dict["h" + str (i+1)]:
+          args = ["SubscriberAppln.py", "-n", nested_dict["id"], "-j", json_file,
+                  "-T", str (nested_dict["topics"])]
+          f.write (self.k8s_deployment (nested_dict["id"], args, None, cpu=100))
+
+      f.write ("...\n")
+
+    f.close ()
+
+  #######################
+  # path of the DHT database inside the pods
+  #######################
+  def k8s_dht_path (self):
+    return ExperimentGenerator.k8s_dht_dir + "/" + os.path.basename (self.json_file)
+
+  #######################
+  # ConfigMap holding the DHT database of the cluster
+  #
+  # Same ring as jsonify_dht_db writes (the hash values, and hence the ring order,
+  # stay those of the experiment), but every node's address is its service name
+  #######################
+  def k8s_config_map (self):
+    dht_db = {}
+    dht_db["bits_hash"] = self.bits_hash
+    dht_db["dht"] = self.build_ring ()
+    for node in dht_db["dht"]:
+      node["IP"] = node["id"] + "-svc"
+
+    return "---\n" + \
+      "apiVersion: v1\n" + \
+      "kind: ConfigMap\n" + \
+      self.k8s_metadata ("dht-db") + \
+      "data:\n" + \
+      "  " + os.path.basename (self.json_file) + ": |\n" + \
+      "    " + json.dumps (dht_db) + "\n"
+
+  #######################
+  # metadata lines common to all our manifests
+  #######################
+  def k8s_metadata (self, name):
+    meta = "metadata:\n" + \
+      "  name: " + name + "\n"
+    if self.k8s_namespace:
+      meta += "  namespace: " + self.k8s_namespace + "\n"
+    return meta
+
+  #######################
+  # Deployment manifest for one entity
+  #
+  # cpu is the requested millicores; the limit is twice that
+  #######################
+  def k8s_deployment (self, id, args, port, cpu):
+    app = id + "-App"
+    manifest = "---\n" + \
+      "apiVersion: apps/v1\n" + \
+      "kind: Deployment\n" + \
+      self.k8s_metadata (id + "-deploy") + \
+      "  labels:\n" + \
+      "    app: " + app + "\n" + \
+      "spec:\n" + \
+      "  replicas: 1\n" + \
+      "  selector:\n" + \
+      "    matchLabels:\n" + \
+      "      app: " + app + "\n" + \
+      "  minReadySeconds: 5\n" + \
+      "  template:\n" + \
+      "    metadata:\n" + \
+      "      labels:\n" + \
+      "        app: " + app + "\n" + \
+      "    spec:\n" + \
+      "      hostname: " + id + "-host\n" + \
+      "      containers:\n" + \
+      "        - name: " + id + "-container\n" + \
+      "          image: " + self.k8s_image + "\n" + \
+      "          imagePullPolicy: IfNotPresent\n"
+    if port:
+      manifest += "          ports:\n" + \
+        "            - containerPort: " + str (port) + "\n"
+    manifest += "          env:\n" + \
+      "            - name: POD_IP\n" + \
+      "              valueFrom:\n" + \
+      "                fieldRef:\n" + \
+      "                  fieldPath: status.podIP\n" + \
+      "          resources:\n" + \
+      "            requests:\n" + \
+      "              cpu: " + str (cpu) + "m\n" + \
+      "              memory: 128Mi\n" + \
+      "            limits:\n" + \
+      "              cpu: " + str (2 * cpu) + "m\n" + \
+      "              memory: 256Mi\n" + \
+      "          volumeMounts:\n" + \
+      "            - name: dht-db\n" + \
+      "              mountPath: " + ExperimentGenerator.k8s_dht_dir + "\n" + \
+      "              readOnly: true\n" + \
+      "          command: [\"python3\"]\n" + \
+      "          args: " + json.dumps (args) + "\n" + \
+      "      volumes:\n" + \
+      "        - name: dht-db\n" + \
+      "          configMap:\n" + \
+      "            name: dht-db\n"
+    return manifest
+
+  #######################
+  # Service manifest in front of one entity's deployment
+  #######################
+  def k8s_service (self, id, port):
+    return "---\n" + \
+      "apiVersion: v1\n" + \
+      "kind: Service\n" + \
+      self.k8s_metadata (id + "-svc") + \
+      "spec:\n" + \
+      "  type: ClusterIP\n" + \
+      "  selector:\n" + \
+      "    app: " + id + "-App\n" + \
+      "  ports:\n" + \
+      "    - name: " + id + "-port\n" + \
+      "      protocol: TCP\n" + \
+      "      port: " + str (port) + "\n" + \
+      "      targetPort: " + str (port) + "\n"
+
   #######################
   # Generate the JSONified DB of DHT nodes
   #
@@ -328,15 +789,11 @@ class ExperimentGenerator ():
     self.logger.debug ("ExperimentGenerator::jsonify_dht_db")
 
     # first get an in-memory representation of our DHT DB, which is a
-    # dictionary with key dht
+    # dictionary with key dht. The nodes are listed in ring order (sorted by
+    # hash) along with their precomputed Chord pointers.
     dht_db = {}  # empty dictionary
-    dht_db["dht"] = []
-    for i in range (self.num_mn_nodes):
-      host = "h" + str (i+1)
-      host_list = self.disc_dict[host]
-      for nested_dict in host_list:
-        dht_db["dht"].append ({"id": nested_dict["id"], "hash": nested_dict["hash"], \
-                               "IP": nested_dict["IP"], "port": nested_dict["port"], "host": host})
+    dht_db["bits_hash"] = self.bits_hash
+    dht_db["dht"] = self.build_ring ()
     
     # Here we are going to generate a DB of all the DHT node details and
     # save it as a json file
@@ -344,7 +801,54 @@ class ExperimentGenerator ():
       json.dump (dht_db, f)
       
     f.close ()
+
+  #######################
+  # Build the Chord ring of DHT nodes
+  #
+  # We sort the ring once here so that no discovery node has to do it at startup.
+  # Besides its own details, every node gets the position (index in the returned
+  # list) of its successor, its predecessor and a full finger table of bits_hash
+  # entries, where finger[i] is the successor of (hash + 2^i) mod 2^bits_hash
+  # as in the Chord paper.
+  #######################
+  def build_ring (self, fingers=True):
+    self.logger.debug ("ExperimentGenerator::build_ring")
+
+    ring = []
+    for i in range (self.num_mn_nodes):
+      host = "h" + str (i+1)
+      host_list = self.disc_dict[host]
+      for nested_dict in host_list:
+        ring.append ({"id": nested_dict["id"], "hash": nested_dict["hash"], \
+                      "IP": nested_dict["IP"], "port": nested_dict["port"], "host": host})
+
+    ring.sort (key=lambda node: node["hash"])
+    if not fingers:
+      return ring
+
+    hashes = [node["hash"] for node in ring]
+    size = len (ring)
+    modulus = 2 ** self.bits_hash
+
+    for pos, node in enumerate (ring):
+      node["succ"] = (pos + 1) % size
+      node["pred"] = (pos - 1) % size
+      # the successor of a key is the first node whose hash is >= key (wrapping around)
+      node["finger"] = [bisect.bisect_left (hashes, (node["hash"] + 2 ** i) % modulus) % size \
+                        for i in range (self.bits_hash)]
+
+    return ring
           
+  #######################
+  # Generate the binary DB of DHT nodes
+  #
+  # Same nodes as the JSON file but as sorted fixed width records that the
+  # processes can memory map and binary search (see dht_db.py)
+  #######################
+  def binarize_dht_db (self):
+    self.logger.debug ("ExperimentGenerator::binarize_dht_db")
+
+    write_dht_db (self.bin_file, self.build_ring (fingers=False), self.bits_hash)
 
   #################
   # Driver program
@@ -358,22 +862,37 @@ class ExperimentGenerator ():
     # First, seed the random number generator
     random.seed ()  
 
-    # Now generate the entries for our discovery dht nodes
-    self.populate_dict ("disc", self.num_disc_dht)
+    if self.incremental:
+      # Start from the previous experiment and only add or remove the difference
+      self.load_experiment ()
+      self.resize_dict ("disc", self.num_disc_dht)
+      self.resize_dict ("pub", self.num_pub)
+      self.resize_dict ("sub", self.num_sub)
+    else:
+      # Now generate the entries for our discovery dht nodes
+      self.populate_dict ("disc", self.num_disc_dht)
 
-    # Now generate the entries for our publishers
-    self.populate_dict ("pub", self.num_pub)
+      # Now generate the entries for our publishers
+      self.populate_dict ("pub", self.num_pub)
 
-    # Now generate the entries for our subscribers
-    self.populate_dict ("sub", self.num_sub)
+      # Now generate the entries for our subscribers
+      self.populate_dict ("sub", self.num_sub)
 
     self.dump ()
 
     # Now JSONify the DHT DB
     self.jsonify_dht_db ()
+
+    # and if asked for, write its binary version too
+    if self.bin_file:
+      self.binarize_dht_db ()
     
     # Now generate experiment script
     self.gen_exp_script ()
+
+    # and if asked for, the Kubernetes manifests for the same experiment
+    if self.k8s_file:
+      self.gen_k8s_manifests ()
       
 ###################################
 #
@@ -404,6 +923,18 @@ def parseCmdLineArgs ():
 
   parser.add_argument ("-j", "--json_file", default="dht.json", help="JSON file with the database of all DHT nodes, default dht.json")
 
+  parser.add_argument ("-B", "--bin_file", default=None, help="Also write the database of all DHT nodes in the compact binary format of dht_db.py to this file, default none")
+
+  parser.add_argument ("-k", "--k8s_file", default=None, help="Also write the Kubernetes Deployments and Services for the experiment to this file, default none")
+
+  parser.add_argument ("--k8s_image", default="192.168.2.230:5000/agokhale/pa2_zmq", help="Container image with our applications used in the Kubernetes manifests, default 192.168.2.230:5000/agokhale/pa2_zmq")
+
+  parser.add_argument ("--k8s_namespace", default=None, help="Namespace for the Kubernetes manifests, default none (i.e., kubectl's current namespace)")
+
+  parser.add_argument ("-I", "--incremental", action="store_true", help="Load the experiment previously written to the JSON and script files and only add or remove entities to reach the requested numbers, keeping the existing ones unchanged")
+
+  parser.add_argument ("-s", "--placement", choices=list (placement_engines.keys ()), default="random", help="Placement engine deciding the host of every entity, default random")
+
   parser.add_argument ("-l", "--loglevel", type=int, default=logging.DEBUG, choices=[logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL], help="logging level, choices 10,20,30,40,50: default 10=logging.DEBUG")
   
   return parser.parse_args()
@@ -0,0 +1,205 @@
+# Author: Aniruddha Gokhale
+# Vanderbilt University
+#
+# Purpose:
+#
+# Our own consistent hash ring for the discovery DHT, so that we do not depend on the
+# external uhashring package exercised in hash_ring_test.py.
+#
+# It uses the very same hash function as exp_generator.py and collision_test.py, i.e., the
+# first bits_hash bits of the sha256 digest, so the positions of the nodes on this ring are
+# the hash values that exp_generator.py writes into dht.json. The function lives here now
+# and the other two use it from here.
+#
+# The ring keeps the positions of all the virtual nodes (vnodes) in one sorted contiguous
+# array of 64 bit integers. A key is owned by the first point equal to or after its hash
+# value (wrapping around), which we find by binary search with bisect. For routing many keys
+# at once, lookup_many does the same for all of them in one NumPy searchsorted call. NumPy is
+# only imported there, so the ring and hash_func work without it.
+#
+# Optionally, the ring implements consistent hashing with bounded loads (Mirrokni, Thorup and
+# Zadimoghaddam). With vnodes of 1 the plain ring is wildly uneven, so some discovery nodes
+# get several times the average number of registrations. In bounded mode (epsilon given) the
+# ring remembers which node every key was assigned to, and no node may hold more than
+# (1+epsilon) times its fair share (by weight) of the keys. A key whose owner is full
+# overflows to the next node clockwise that still has room. The number of points we had to
+# visit (probes) is kept to report the extra lookup cost.
+#
+# The interface mirrors the one of uhashring.HashRing that we have been using: the nodes are
+# a dictionary of node name to its configuration, where we use the 'vnodes' and 'weight'
+# entries, and a node gets vnodes * weight points on the ring.
+
+import math # for the capacity in bounded mode
+import bisect # binary search over the sorted points
+import hashlib  # for the secure hash library
+from array import array # contiguous array of the points
+
+#################
+# hash value
+#
+# first get the digest from hashlib and then take the desired number of bytes from the
+# lower end of the 256 bits hash. Big or little endian does not matter.
+#################
+def hash_func (id, bits_hash):
+  hash_digest = hashlib.sha256 (bytes (id, "utf-8")).digest ()  # this is how we get the digest or hash value
+  # figure out how many bytes to retrieve
+  num_bytes = int(bits_hash/8)  # otherwise we get float which we cannot use below
+  return int.from_bytes (hash_digest[:num_bytes], "big")  # take lower N number of bytes
+
+##################################
+#
+# HashRing class
+#
+##################################
+class HashRing ():
+
+  #################
+  # constructor
+  #################
+  def __init__ (self, nodes=None, bits_hash=48, epsilon=None):
+    # below 0 the capacities no longer add up to the number of keys, so assign would never end
+    if epsilon is not None and epsilon < 0:
+      raise ValueError ("HashRing::epsilon must not be negative, got {}".format (epsilon))
+
+    self.bits_hash = bits_hash  # number of bits in hash value
+    self.epsilon = epsilon  # None for plain consistent hashing, else the load bound
+    self.assigned = {}  # bounded mode: key to the node it was assigned to (in order of assignment)
+    self.loads = {}  # bounded mode: number of keys assigned per node
+    self.probes = 0  # bounded mode: number of points visited by all assignments
+    self.total_weight = 0  # sum of the weights of all nodes
+    self.nodes = {}  # node name to its configuration
+    self.points = array ("Q")  # sorted positions of all the vnodes
+    self.owners = []  # node name owning the point at the same index
+    self.points_np = None  # NumPy view of the points for lookup_many
+
+    for name, conf in dict (nodes or {}).items ():
+      self.check_conf (name, conf)
+      self.nodes[name] = conf
+    self.regenerate ()
+
+  #################
+  # weight and vnodes must be positive integers, else node_points cannot count the points
+  #################
+  def check_conf (self, name, conf):
+    for field in ('weight', 'vnodes'):
+      value = conf.get (field, 1)
+      if not isinstance (value, int) or isinstance (value, bool) or value < 1:
+        raise ValueError ("HashRing::{} of node {} must be a positive integer, got {!r}".format (field, name, value))
+
+  #################
+  # positions of the vnodes of one node
+  #################
+  def node_points (self, name):
+    conf = self.nodes[name]
+    count = conf.get ('vnodes', 1) * conf.get ('weight', 1)
+    return [hash_func (name + "-" + str (i), self.bits_hash) for i in range (count)]
+
+  #################
+  # rebuild the sorted array of points
+  #################
+  def regenerate (self):
+    ring = sorted ((point, name) for name in self.nodes for point in self.node_points (name))
+    self.points = array ("Q", [point for point, _ in ring])
+    self.owners = [name for _, name in ring]
+    self.points_np = None  # made again by the next lookup_many
+    self.total_weight = sum (conf.get ('weight', 1) for conf in self.nodes.values ())
+
+    # in bounded mode the membership changed, so all the keys are assigned again
+    # in their original order (unless there is no node left to assign them to)
+    if self.epsilon is not None:
+      keys = list (self.assigned) if ring else []
+      self.assigned = {}
+      self.loads = {name: 0 for name in self.nodes}
+      self.probes = 0
+      for key in keys:
+        self.assign (key)
+
+  #################
+  # add a node
+  #################
+  def add_node (self, name, conf=None):
+    if conf is None:
+      conf = {'weight': 1}
+    self.check_conf (name, conf)
+    self.nodes[name] = conf
+    self.regenerate ()
+
+  #################
+  # remove a node
+  #################
+  def remove_node (self, name):
+    del self.nodes[name]
+    self.regenerate ()
+
+  #################
+  # number of points on the ring
+  #################
+  @property
+  def size (self):
+    return len (self.points)
+
+  #################
+  # index of the point owning the given hash value
+  #################
+  def get_pos (self, hash_val):
+    return bisect.bisect_left (self.points, hash_val) % len (self.points)
+
+  #################
+  # node owning the key
+  #
+  # in bounded mode this assigns the key if it is not assigned yet
+  #################
+  def get_node (self, key):
+    if not self.points:
+      return None
+    if self.epsilon is not None:
+      return self.assign (key)
+    return self.owners[self.get_pos (hash_func (key, self.bits_hash))]
+
+  #################
+  # bounded mode: max number of keys the node may hold once one more key is added
+  #################
+  def capacity (self, name):
+    share = (len (self.assigned) + 1) * self.nodes[name].get ('weight', 1) / self.total_weight
+    return math.ceil ((1 + self.epsilon) * share)
+
+  #################
+  # bounded mode: assign a key to the first node clockwise from its hash value
+  # that is below its capacity
+  #################
+  def assign (self, key):
+    if key in self.assigned:
+      return self.assigned[key]
+
+    pos = self.get_pos (hash_func (key, self.bits_hash))
+    while True:
+      self.probes += 1
+      name = self.owners[pos]
+      if self.loads[name] < self.capacity (name):
+        break
+      pos = (pos + 1) % len (self.points)
+
+    self.assigned[key] = name
+    self.loads[name] += 1
+    return name
+
+  #################
+  # nodes owning each of the keys, in the same order
+  #################
+  def lookup_many (self, keys):
+    if not self.points:
+      return [None] * len (keys)
+    if self.epsilon is not None:
+      # the assignments depend on each other, so there is no batch shortcut
+      return [self.assign (key) for key in keys]
+
+    import numpy as np  # only the batch lookups need it
+
+    if self.points_np is None:
+      self.points_np = np.frombuffer (self.points, dtype=np.uint64)
+    num_bytes = int(self.bits_hash/8)
+    digests = b"".join ([hashlib.sha256 (bytes (key, "utf-8")).digest ()[:8] for key in keys])
+    hashes = np.frombuffer (digests, dtype=">u8").astype (np.uint64) >> np.uint64 (64 - 8 * num_bytes)
+    pos = np.searchsorted (self.points_np, hashes, side="left") % len (self.points)
+    owners = self.owners
+    return [owners[i] for i in pos.tolist ()]
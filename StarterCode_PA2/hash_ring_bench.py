@@ -0,0 +1,293 @@
+# Author: Aniruddha Gokhale
+# Vanderbilt University
+#
+# Purpose:
+#
+# Benchmark harness for the consistent hash ring of hash_ring_test.py
+#
+# hash_ring_test.py just prints the distribution of 10 static nodes with a single virtual
+# node each. Here we sweep the number of nodes, the number of virtual nodes (vnodes) per node
+# and the node weights, and for every combination we measure
+#
+#   - how evenly the keys are spread, as max/mean and stddev/mean of the per node load
+#     (normalized by the node's weight, so 1.0 everywhere means perfectly balanced)
+#   - lookup throughput in keys per second
+#   - the fraction of keys that move to another node when a node joins or leaves the
+#     ring (ideally just that node's share, e.g., 1/(N+1) and 1/N with equal weights)
+#
+# Either the uhashring package (as in hash_ring_test.py) or our own ring in hash_ring.py can be
+# benchmarked. For our own ring we also measure the throughput of the batch lookup_many, and
+# we can turn on its bounded load mode (-e epsilon), in which case we also report the average
+# number of ring points probed per key, i.e., the extra lookup cost of the bound.
+#
+# Every combination becomes one row of a CSV file so that we can pick the vnode settings for
+# our discovery ring from data.
+#
+# The keys are strings that look like the registrations our DHT will hash, e.g.,
+# pub3:10.0.0.5:7777
+
+import os
+import csv # for the results
+import time # for timing the lookups
+import random # random number generation
+import argparse # argument parsing
+import logging # for logging. Use it in place of print statements.
+
+import hash_ring # our own consistent hash ring
+
+##################################
+#
+# RingBenchmark class
+#
+##################################
+class RingBenchmark ():
+  # This is a class variable
+  prefixes = ["pub", "sub", "disc"]  # our keys always start with one of these
+
+  # columns of our CSV file
+  fields = ["nodes", "vnodes", "max_weight", "epsilon", "keys", "max_mean", "stddev_mean",
+            "avg_probes", "lookups_per_sec", "batch_lookups_per_sec", "join_remapped", "join_ideal", "leave_remapped", "leave_ideal"]
+
+  #################
+  # constructor
+  #################
+  def __init__ (self, logger):
+    self.node_counts = None  # list of number of nodes to sweep over
+    self.vnode_counts = None  # list of number of vnodes per node to sweep over
+    self.max_weights = None  # list of max weights; node weights are drawn between 1 and this
+    self.num_keys = None  # number of keys we look up
+    self.csv_file = None  # where the results go
+    self.seed = None  # seed for the random number generator so runs are repeatable
+    self.ring = None  # which ring implementation to benchmark
+    self.bits_hash = None  # number of bits in hash value for our own ring
+    self.epsilon = None  # load bound of our own ring (None for plain consistent hashing)
+    self.logger = logger
+
+  #################
+  # configuration
+  #################
+  def configure (self, args):
+    # Here we initialize any internal variables
+    self.logger.debug ("RingBenchmark::configure")
+
+    self.node_counts = [int (n) for n in args.nodes.split (",")]
+    self.vnode_counts = [int (v) for v in args.vnodes.split (",")]
+    self.max_weights = [int (w) for w in args.weights.split (",")]
+    self.num_keys = args.num_keys
+    self.csv_file = args.csv_file
+    self.seed = args.seed
+    self.ring = args.ring
+    self.bits_hash = args.bits_hash
+    self.epsilon = args.epsilon
+    if (self.epsilon is not None and self.ring != "native"):
+      raise ValueError ("bounded loads are only supported by the native ring")
+    if (self.epsilon is not None and self.epsilon < 0):
+      raise ValueError ("epsilon must not be negative, got {}".format (self.epsilon))
+
+    self.logger.debug ("RingBenchmark::Dump")
+    self.logger.debug ("\tNode counts = {}".format (self.node_counts))
+    self.logger.debug ("\tVnode counts = {}".format (self.vnode_counts))
+    self.logger.debug ("\tMax weights = {}".format (self.max_weights))
+    self.logger.debug ("\tNum keys = {}".format (self.num_keys))
+    self.logger.debug ("\tCSV file = {}".format (self.csv_file))
+    self.logger.debug ("\tSeed = {}".format (self.seed))
+    self.logger.debug ("\tRing = {}".format (self.ring))
+    self.logger.debug ("\tBits in hash = {}".format (self.bits_hash))
+    self.logger.debug ("\tEpsilon = {}".format (self.epsilon))
+
+  #################
+  # generate the keys we look up
+  #################
+  def gen_keys (self, rng):
+    return [rng.choice (RingBenchmark.prefixes) + str (rng.randint (1, 100)) \
+            + ":10.0.0." + str (rng.randint (1, 255)) + ":" + str (rng.randint (5555, 7777)) \
+            for i in range (self.num_keys)]
+
+  #################
+  # node configuration in the same form as hash_ring_test.py
+  #################
+  def node_conf (self, num, vnodes, weight):
+    return {'hostname': '10.0.0.' + str (num), 'instance': None, 'port': 5555, 'vnodes': vnodes, 'weight': weight}
+
+  #################
+  # build a ring out of a dictionary of node configurations
+  #################
+  def make_ring (self, nodes):
+    if (self.ring == "native"):
+      return hash_ring.HashRing (nodes, self.bits_hash, self.epsilon)
+
+    import uhashring # the external consistent hash ring, only needed when we benchmark it
+    return uhashring.HashRing (nodes)
+
+  #################
+  # look up all the keys and time it
+  #################
+  def lookup_all (self, ring, keys):
+    start = time.perf_counter ()
+    owners = [ring.get_node (key) for key in keys]
+    elapsed = time.perf_counter () - start
+    return owners, elapsed
+
+  #################
+  # fraction of keys whose owner differs between two lookups
+  #################
+  def remapped (self, before, after):
+    return sum (1 for b, a in zip (before, after) if b != a) / len (before)
+
+  #################
+  # measure one combination of our parameters
+  #################
+  def measure (self, num_nodes, vnodes, max_weight, keys, rng):
+    self.logger.debug ("RingBenchmark::measure - {} nodes, {} vnodes, max weight {}".format (num_nodes, vnodes, max_weight))
+
+    nodes = {}
+    for i in range (num_nodes):
+      nodes['node' + str (i+1)] = self.node_conf (i+1, vnodes, rng.randint (1, max_weight))
+
+    ring = self.make_ring (nodes)
+    owners, elapsed = self.lookup_all (ring, keys)
+
+    # in bounded mode the first lookup of every key assigned it; see how far it had to walk
+    avg_probes = 1
+    if (self.epsilon is not None):
+      avg_probes = round (ring.probes / len (keys), 4)
+
+    # batch lookups are only offered by our own ring (and are not a shortcut in bounded mode)
+    batch_rate = None
+    if (self.ring == "native" and self.epsilon is None):
+      # the first call imports numpy and builds the sorted points; keep that out of the timing
+      ring.lookup_many (keys[:1])
+      start = time.perf_counter ()
+      batch_owners = ring.lookup_many (keys)
+      batch_rate = round (len (keys) / (time.perf_counter () - start))
+      assert (batch_owners == owners)
+
+    # per node load normalized by the load the node should get based on its weight
+    total_weight = sum (conf['weight'] for conf in nodes.values ())
+    load = {name: 0 for name in nodes}
+    for owner in owners:
+      load[owner] += 1
+    norm = [load[name] * total_weight / (len (keys) * conf['weight']) for name, conf in nodes.items ()]
+    mean = sum (norm) / len (norm)
+    stddev = (sum ((x - mean) ** 2 for x in norm) / len (norm)) ** 0.5
+
+    # a node joins the ring
+    name = 'node' + str (num_nodes + 1)
+    join_weight = rng.randint (1, max_weight)
+    ring.add_node (name, self.node_conf (num_nodes + 1, vnodes, join_weight))
+    join_owners, _ = self.lookup_all (ring, keys)
+    ring.remove_node (name)
+
+    # a node leaves the ring
+    ring.remove_node ('node1')
+    leave_owners, _ = self.lookup_all (ring, keys)
+
+    return {"nodes": num_nodes, "vnodes": vnodes, "max_weight": max_weight, "epsilon": self.epsilon, "keys": len (keys),
+            "max_mean": round (max (norm) / mean, 4), "stddev_mean": round (stddev / mean, 4), "avg_probes": avg_probes,
+            "lookups_per_sec": round (len (keys) / elapsed), "batch_lookups_per_sec": batch_rate,
+            "join_remapped": round (self.remapped (owners, join_owners), 4), "join_ideal": round (join_weight / (total_weight + join_weight), 4),
+            "leave_remapped": round (self.remapped (owners, leave_owners), 4), "leave_ideal": round (nodes['node1']['weight'] / total_weight, 4)}
+
+  #################
+  # Driver program
+  #################
+  def driver (self):
+    self.logger.debug ("RingBenchmark::driver")
+
+    rng = random.Random (self.seed)
+    keys = self.gen_keys (rng)
+
+    with open (self.csv_file, "w", newline="") as f:
+      writer = csv.DictWriter (f, fieldnames=RingBenchmark.fields)
+      writer.writeheader ()
+      for num_nodes in self.node_counts:
+        for vnodes in self.vnode_counts:
+          for max_weight in self.max_weights:
+            row = self.measure (num_nodes, vnodes, max_weight, keys, rng)
+            self.logger.info ("{}".format (row))
+            writer.writerow (row)
+
+###################################
+#
+# Parse command line arguments
+#
+###################################
+def parseCmdLineArgs ():
+  # instantiate a ArgumentParser object
+  parser = argparse.ArgumentParser (description="HashRingBenchmark")
+
+  # Now specify all the optional arguments we support
+  #
+  parser.add_argument ("-n", "--nodes", default="10,20,50", help="Comma separated numbers of nodes in the ring to sweep over, default 10,20,50")
+
+  parser.add_argument ("-v", "--vnodes", default="1,10,40,160", help="Comma separated numbers of vnodes per node to sweep over, default 1,10,40,160")
+
+  parser.add_argument ("-w", "--weights", default="1,4", help="Comma separated max node weights to sweep over; every node gets a random weight between 1 and this, default 1,4")
+
+  parser.add_argument ("-k", "--num_keys", type=int, default=100000, help="Number of keys to look up, default 100000")
+
+  parser.add_argument ("-o", "--csv_file", default="ring_bench.csv", help="CSV file for the results, default ring_bench.csv")
+
+  parser.add_argument ("-r", "--ring", choices=["uhashring", "native"], default="uhashring", help="Ring to benchmark: the uhashring package or our own ring in hash_ring.py, default uhashring")
+
+  parser.add_argument ("-b", "--bits_hash", type=int, choices=[8,16,24,32,40,48,56,64], default=48, help="Number of bits of hash value used by our own ring, default 48")
+
+  parser.add_argument ("-e", "--epsilon", type=float, default=None, help="Use the bounded load mode of the native ring where no node gets more than (1+epsilon) times its share of keys, default none (plain consistent hashing)")
+
+  parser.add_argument ("-s", "--seed", type=int, default=1, help="Seed for the random number generator, default 1")
+
+  parser.add_argument ("-l", "--loglevel", type=int, default=logging.DEBUG, choices=[logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL], help="logging level, choices 10,20,30,40,50: default 10=logging.DEBUG")
+
+  return parser.parse_args()
+
+
+###################################
+#
+# Main program
+#
+###################################
+def main ():
+  try:
+    # obtain a system wide logger and initialize it to debug level to begin with
+    logging.info ("Main - acquire a child logger and then log messages in the child")
+    logger = logging.getLogger ("HashRingBenchmark")
+
+    # first parse the arguments
+    logger.debug ("Main: parse command line arguments")
+    args = parseCmdLineArgs ()
+
+    # reset the log level to as specified
+    logger.debug ("Main: resetting log level to {}".format (args.loglevel))
+    logger.setLevel (args.loglevel)
+    logger.debug ("Main: effective log level is {}".format (logger.getEffectiveLevel ()))
+
+    # Obtain the benchmark object
+    logger.debug ("Main: obtain the RingBenchmark object")
+    bench_obj = RingBenchmark (logger)
+
+    # configure the object
+    logger.debug ("Main: configure the benchmark object")
+    bench_obj.configure (args)
+
+    # now invoke the driver program
+    logger.debug ("Main: invoke the benchmark driver")
+    bench_obj.driver ()
+
+  except Exception as e:
+    logger.error ("Exception caught in main - {}".format (e))
+    return
+
+
+###################################
+#
+# Main entry point
+#
+###################################
+if __name__ == "__main__":
+
+  # set underlying default logging capabilities
+  logging.basicConfig (level=logging.DEBUG,
+                       format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+  main ()